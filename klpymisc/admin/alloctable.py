@@ -0,0 +1,350 @@
+"""
+Dense storage of the allocations.
+
+The hours of every resource in every period are kept in one flat
+resource x period matrix.  The resource names are interned to row
+numbers, the periods are counted from a fixed epoch so that a date maps
+to its column with a little arithmetic, and the span of the allocations
+is tracked as the cells are filled.  Writing the table out is a walk
+over contiguous rows.
+
+The names are also encoded once, when the exports are parsed, to dense
+integer ids in the RESOURCES dictionary, shared by all the tables.  The
+allocation then works on the ids, a list lookup to the row of a table,
+and the names only come back when the table is written out.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+from array import array
+from datetime import date
+
+GRANULARITIES = ('week', 'month', 'quarter')
+
+# Extra columns added when the matrix grows, at least.
+MIN_GROWTH = 16
+
+
+def period_index(day, granularity='month'):
+    """
+    Number of the week, month or quarter the day falls in, counted from
+    an epoch common to all the tables of that granularity.
+    """
+    if granularity == 'month':
+        return day.year * 12 + day.month - 1
+    if granularity == 'week':
+        # Ordinal 1 is a Monday.
+        return (day.toordinal() - 1) // 7
+    if granularity == 'quarter':
+        return day.year * 4 + (day.month - 1) // 3
+    raise ValueError('Unknown granularity: %s' % granularity)
+
+
+def period_date(index, granularity='month'):
+    """
+    First day of the period number index.  Inverse of period_index().
+    """
+    if granularity == 'month':
+        (year, month) = divmod(index, 12)
+        return date(year, month + 1, 1)
+    if granularity == 'week':
+        return date.fromordinal(7 * index + 1)
+    if granularity == 'quarter':
+        (year, quarter) = divmod(index, 4)
+        return date(year, 3 * quarter + 1, 1)
+    raise ValueError('Unknown granularity: %s' % granularity)
+
+
+class ResourceDictionary(object):
+    """
+    Dense integer id of each distinct resource name.
+
+    Attributes
+    ----------
+    names : list of str
+        Name of each id.
+    ids : dict
+        Id of each name.
+
+    Methods
+    -------
+    intern(name)
+        Id of a name, added if new.
+    encode(assigned)
+        The (name, fraction) assignments as (id, fraction).
+
+    Notes
+    -----
+    Ids are never reused nor removed: a plan has a few hundred resources
+    at most, for hundreds of thousands of assignments.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """
+        Id of a resource name, added if new.
+        """
+        try:
+            return self.ids[name]
+        except KeyError:
+            resource = self.ids[name] = len(self.names)
+            self.names.append(name)
+            return resource
+
+    def encode(self, assigned):
+        """
+        Tuple of (id, fraction) of a tuple of (name, fraction).
+        """
+        return tuple((self.intern(name), fraction)
+                     for (name, fraction) in assigned)
+
+
+# The dictionary of the resource names parsed from the exports.
+RESOURCES = ResourceDictionary()
+
+
+class AllocationTable(object):
+    """
+    Hours of each resource in each period.
+
+    Parameters
+    ----------
+    granularity : str
+        'week', 'month' or 'quarter'.
+
+    Attributes
+    ----------
+    resources : list of str
+        Resource name of each row.
+    resource_ids : dict
+        Row of each resource name.
+    origin : int
+        Period number of column 0.
+    ncolumns : int
+        Number of columns allocated, used or not.
+    hours : array
+        The row-major resource x period matrix of hours.
+    assigned : array
+        1 where a task contributed to the cell, even zero hours.
+    first, last : int
+        Period numbers of the first and last cells filled, None when
+        the table is empty.
+
+    Methods
+    -------
+    resource_id(name)
+        Row of a resource, added if new.
+    dictionary_row(resource)
+        Row of a resource by its id in RESOURCES, added if new.
+    add(resource_id, index, hours)
+        Add hours to a resource in the period number index.
+    add_effort(resource_id, day, hours)
+        Add hours to a resource in the period of the date.
+    span()
+        First day of the first and last periods.
+    allocation(name)
+        The hours of a resource, keyed on the first day of the periods.
+    merge(other)
+        Add the hours of another table.
+
+    Notes
+    -----
+    The matrix grows in both directions as needed, doubling the number of
+    columns on the side that needs it, so the span does not have to be
+    known in advance.  Iterating over the table, or `in`, works on the
+    resource names.
+    """
+
+    def __init__(self, granularity='month'):
+        if granularity not in GRANULARITIES:
+            raise ValueError('Unknown granularity: %s' % granularity)
+        self.granularity = granularity
+        self.resources = []
+        self.resource_ids = {}
+        # Row of each RESOURCES id, -1 if not in the table.
+        self._dictionary_rows = []
+        self.origin = 0
+        self.ncolumns = 0
+        self.hours = array('d')
+        self.assigned = array('b')
+        self.first = None
+        self.last = None
+
+    def __getstate__(self):
+        # The RESOURCES ids are those of this process.
+        state = self.__dict__.copy()
+        state['_dictionary_rows'] = []
+        return state
+
+    def __len__(self):
+        return len(self.resources)
+
+    def __iter__(self):
+        return iter(self.resources)
+
+    def __contains__(self, name):
+        return name in self.resource_ids
+
+    def resource_id(self, name):
+        """
+        Row of a resource, added if new.
+        """
+        try:
+            return self.resource_ids[name]
+        except KeyError:
+            resource_id = len(self.resources)
+            self.resources.append(name)
+            self.resource_ids[name] = resource_id
+            self.hours.extend(array('d', [0.]) * self.ncolumns)
+            self.assigned.extend(array('b', [0]) * self.ncolumns)
+            return resource_id
+
+    def dictionary_row(self, resource):
+        """
+        Row of a resource by its id in RESOURCES, added if new.
+        """
+        try:
+            row = self._dictionary_rows[resource]
+        except IndexError:
+            self._dictionary_rows.extend(
+                [-1] * (len(RESOURCES) - len(self._dictionary_rows)))
+            row = self._dictionary_rows[resource]
+        if row < 0:
+            row = self._dictionary_rows[resource] = \
+                self.resource_id(RESOURCES.names[resource])
+        return row
+
+    def add(self, resource_id, index, hours):
+        """
+        Add hours to the resource in the period number index.
+        """
+        column = index - self.origin
+        if column < 0 or column >= self.ncolumns:
+            self._grow(index)
+            column = index - self.origin
+        cell = resource_id * self.ncolumns + column
+        self.hours[cell] += hours
+        self.assigned[cell] = 1
+        if self.first is None:
+            self.first = self.last = index
+        elif index < self.first:
+            self.first = index
+        elif index > self.last:
+            self.last = index
+
+    def add_effort(self, resource_id, day, hours):
+        """
+        Add hours to the resource in the period the date falls in.
+        """
+        self.add(resource_id, period_index(day, self.granularity), hours)
+
+    def add_rows(self, names, first_index, hours_rows, assigned_rows):
+        """
+        Add whole rows of hours, eg. from a NumPy allocation matrix.
+
+        Parameters
+        ----------
+        names : list of str
+            Resource of each row.
+        first_index : int
+            Period number of the first column of the rows.
+        hours_rows : sequence of sequence of float
+        assigned_rows : sequence of sequence of bool
+            The cells of the rows that are filled.
+        """
+        for (name, hours, assigned) in zip(names, hours_rows, assigned_rows):
+            resource_id = self.resource_id(name)
+            for (column, filled) in enumerate(assigned):
+                if filled:
+                    self.add(resource_id, first_index + column,
+                             float(hours[column]))
+
+    def _grow(self, index):
+        # Re-layout the matrix with room for index, and as many extra
+        # columns as there are already on the side it is added to.
+        extra = max(self.ncolumns, MIN_GROWTH)
+        if not self.ncolumns:
+            origin = index
+            ncolumns = extra
+        elif index < self.origin:
+            origin = min(index, self.origin - extra)
+            ncolumns = self.origin + self.ncolumns - origin
+        else:
+            origin = self.origin
+            ncolumns = max(index + 1, self.origin + self.ncolumns + extra) - \
+                origin
+        offset = self.origin - origin
+        hours = array('d', [0.]) * (len(self.resources) * ncolumns)
+        assigned = array('b', [0]) * (len(self.resources) * ncolumns)
+        for row in range(len(self.resources)):
+            old = row * self.ncolumns
+            new = row * ncolumns + offset
+            hours[new:new + self.ncolumns] = \
+                self.hours[old:old + self.ncolumns]
+            assigned[new:new + self.ncolumns] = \
+                self.assigned[old:old + self.ncolumns]
+        self.origin = origin
+        self.ncolumns = ncolumns
+        self.hours = hours
+        self.assigned = assigned
+
+    def span(self):
+        """
+        First day of the first and of the last periods filled, or None.
+        """
+        if self.first is None:
+            return None
+        return (period_date(self.first, self.granularity),
+                period_date(self.last, self.granularity))
+
+    def periods(self):
+        """
+        First day of each period of the span, in order.
+        """
+        if self.first is None:
+            return []
+        return [period_date(index, self.granularity)
+                for index in range(self.first, self.last + 1)]
+
+    def row(self, name):
+        """
+        Hours and assigned flags of a resource over the span.
+        """
+        if self.first is None:
+            return (array('d'), array('b'))
+        start = self.resource_ids[name] * self.ncolumns + \
+            self.first - self.origin
+        stop = start + self.last - self.first + 1
+        return (self.hours[start:stop], self.assigned[start:stop])
+
+    def allocation(self, name):
+        """
+        The hours of a resource, keyed on the first day of the periods.
+        Only the periods a task contributed to are present.
+        """
+        (hours, assigned) = self.row(name)
+        return dict((period_date(self.first + column, self.granularity),
+                     hours[column])
+                    for column in range(len(hours)) if assigned[column])
+
+    def merge(self, other):
+        """
+        Add the hours of another table of the same granularity.
+        """
+        if other.granularity != self.granularity:
+            raise ValueError('Cannot merge %s allocations into %s ones' %
+                             (other.granularity, self.granularity))
+        for name in other:
+            resource_id = self.resource_id(name)
+            (hours, assigned) = other.row(name)
+            for column in range(len(hours)):
+                if assigned[column]:
+                    self.add(resource_id, other.first + column, hours[column])
+        return self
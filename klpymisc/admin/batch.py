@@ -0,0 +1,152 @@
+"""
+Allocations of many OmniPlan exports at once.
+
+Each export is allocated in its own worker process and the results are
+reduced into a single resource x month table.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import glob
+import os
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import AllocationTable
+
+# concurrent.futures, which pulls in multiprocessing, and the OmniPlan
+# document reader are imported when used: the command line tools import
+# this module on every run, most of the time for a single export.
+
+
+def expand_inputs(inputs):
+    """
+    Expand directories and glob patterns into a list of export files.
+
+    Parameters
+    ----------
+    inputs : list of str
+        Files, directories (all the '*.csv' and '*.oplx' inside) or glob
+        patterns.  An .oplx bundle is a file, not a directory of exports.
+
+    Returns
+    -------
+    list of str
+        The export files, in order, without duplicates.
+    """
+    from klpymisc.admin import oplx
+    inputfiles = []
+    for name in inputs:
+        if os.path.isdir(name) and not oplx.is_document(name):
+            matches = sorted(glob.glob(os.path.join(name, '*.csv')) +
+                             glob.glob(os.path.join(name, '*.oplx')))
+        elif glob.has_magic(name):
+            matches = sorted(glob.glob(name))
+        else:
+            matches = [name]
+        for match in matches:
+            if match not in inputfiles:
+                inputfiles.append(match)
+    return inputfiles
+
+
+def allocate_file(inputfile, engine='python', holidays=None):
+    """
+    Allocations of a single export.  Runs in the worker processes.
+
+    Parameters
+    ----------
+    inputfile : str
+        CSV export or OmniPlan document.
+    engine : str
+        'python' or 'numpy'.
+    holidays : list of datetime.date, optional
+        Holiday calendar.  Passed explicitly since the workers do not
+        necessarily inherit the parent's module state.
+
+    Returns
+    -------
+    AllocationTable
+    """
+    if holidays is not None:
+        omniplan.set_holidays(holidays)
+    records = omniplan.iter_export(inputfile)
+    if engine == 'numpy':
+        from klpymisc.admin import numpyengine
+        return numpyengine.calculate_allocation(records)
+    return omniplan.calculate_allocation(records)
+
+
+def batch_allocation(inputfiles, engine='python', holidays=None,
+                     max_workers=None):
+    """
+    Allocate the exports in a process pool and merge the results.
+
+    Parameters
+    ----------
+    inputfiles : list of str
+        CSV exports, one per project.
+    engine : str
+        'python' or 'numpy'.
+    holidays : list of datetime.date, optional
+        Holiday calendar.
+    max_workers : int, optional
+        Number of worker processes.  Default is the number of CPUs.
+
+    Returns
+    -------
+    allocations : AllocationTable
+        The merged allocations.
+    per_project : dict
+        AllocationTable of each export, keyed on the export file name.
+    """
+    allocations = AllocationTable()
+    per_project = {}
+    if not inputfiles:
+        return (allocations, per_project)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(allocate_file, inputfiles,
+                               [engine] * len(inputfiles),
+                               [holidays] * len(inputfiles))
+        for (inputfile, result) in zip(inputfiles, results):
+            per_project[inputfile] = result
+            omniplan.merge_allocations(allocations, result)
+    return (allocations, per_project)
+
+
+def project_outputfile(outputfile, inputfile):
+    """
+    Name of the per-project output, eg. 'alloc_ProjectA.csv' for
+    outputfile 'alloc.csv' and inputfile 'exports/ProjectA.csv'.
+    """
+    (root, ext) = os.path.splitext(outputfile)
+    project = os.path.splitext(os.path.basename(inputfile))[0]
+    return '%s_%s%s' % (root, project, ext or '.csv')
+
+
+def project_outputfiles(outputfile, inputfiles):
+    """
+    Names of the per-project outputs of the exports, keyed on the export.
+
+    As project_outputfile(), the exports with the same name in different
+    directories told apart by the name of their directory, eg.
+    'alloc_2017_ProjectA.csv', and any name still shared by an index,
+    eg. 'alloc_ProjectA_2.csv'.
+    """
+    (root, ext) = os.path.splitext(outputfile)
+    projects = [os.path.splitext(os.path.basename(inputfile))[0]
+                for inputfile in inputfiles]
+    names = []
+    for (inputfile, project) in zip(inputfiles, projects):
+        if projects.count(project) > 1:
+            parent = os.path.basename(os.path.dirname(
+                os.path.abspath(inputfile)))
+            project = '%s_%s' % (parent, project)
+        names.append(project)
+    outputfiles = {}
+    for (index, (inputfile, name)) in enumerate(zip(inputfiles, names)):
+        if names.count(name) > 1:
+            name = '%s_%d' % (name, names[:index].count(name) + 1)
+        outputfiles[inputfile] = '%s_%s%s' % (root, name, ext or '.csv')
+    return outputfiles
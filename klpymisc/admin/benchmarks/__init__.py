@@ -0,0 +1,4 @@
+"""
+Benchmarks of the OmniPlan allocation, on synthetic exports.
+"""
+__author__ = "Kathleen Labrie"
@@ -0,0 +1,180 @@
+"""
+Seeded generator of synthetic OmniPlan 3 CSV exports.
+
+The exports look like the real ones: the OmniPlan 3 header, group tasks
+and milestones, multi-assignee '{x% out of y%}' assignments, efforts in
+mixed units like '3w 4d 6h 35m 54s', spans crossing years and partial
+completion.  The same seed and size always give the same file.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import random
+from datetime import date, timedelta
+from io import open
+
+from klpymisc.admin.bizdays import add_business_days
+
+HEADER = ['WBS Number', 'Title', 'Start', 'End', 'Time', 'Effort', '%Done',
+          'Cost', 'Assigned', 'Planned Start', 'Start Variance',
+          'Planned End', 'End Variance', 'Constraint Start',
+          'Constraint End', 'Prerequisites', 'NoteContents', 'Priority',
+          'Resources Cost', 'Total Task Cost', 'Actual effort']
+
+# Effort units, in seconds, as OmniPlan writes them.
+EFFORT_UNITS = [('mo', 160 * 3600), ('w', 40 * 3600), ('d', 8 * 3600),
+                ('h', 3600), ('m', 60), ('s', 1)]
+
+# Tasks per group task, and share of milestones.
+GROUP_SIZE = 20
+MILESTONE_RATE = 0.05
+
+
+def format_date(day, hour, minute):
+    """
+    OmniPlan 3 date, eg. '6/5/17, 08:00'.
+    """
+    return '%d/%d/%02d, %02d:%02d' % (day.month, day.day, day.year % 100,
+                                      hour, minute)
+
+
+def format_effort(seconds, rng):
+    """
+    Effort in mixed units, eg. '3w 4d 6h 35m 54s'.  Months are used
+    for some of the long efforts only, as OmniPlan does depending on
+    the project settings.
+    """
+    units = EFFORT_UNITS if rng.random() < 0.3 else EFFORT_UNITS[1:]
+    tokens = []
+    for (unit, size) in units:
+        (count, seconds) = divmod(seconds, size)
+        if count:
+            tokens.append('%d%s' % (count, unit))
+    return ' '.join(tokens) or '0h'
+
+
+def format_assigned(names, rng):
+    """
+    'Name {x% out of y%}' for each resource, '; ' separated.  Some
+    resources are given without units, as when fully assigned.
+    """
+    assignees = []
+    for name in names:
+        if rng.random() < 0.2:
+            assignees.append(name)
+            continue
+        available = rng.choice((50, 60, 80, 90, 100))
+        units = 5 * rng.randint(1, available // 5)
+        assignees.append('%s {%d%% out of %d%%}' % (name, units, available))
+    return '; '.join(assignees)
+
+
+def task_duration(rng):
+    """
+    Duration in business days: mostly short tasks, some lasting months,
+    a few lasting more than a year.
+    """
+    draw = rng.random()
+    if draw < 0.6:
+        return rng.randint(1, 10)
+    if draw < 0.9:
+        return rng.randint(10, 60)
+    return rng.randint(60, 400)
+
+
+def task_completion(rng):
+    """
+    Not started, done, or partially done.
+    """
+    draw = rng.random()
+    if draw < 0.4:
+        return 0
+    if draw < 0.6:
+        return 100
+    return rng.randint(1, 99)
+
+
+def iter_rows(ntasks, seed=0, nresources=None, first_day=date(2016, 1, 4),
+              years=4):
+    """
+    Generate the rows of a synthetic export, header excluded.
+
+    Parameters
+    ----------
+    ntasks : int
+        Number of tasks, group tasks not included.
+    seed : int
+        Seed of the random generator.
+    nresources : int, optional
+        Size of the resource pool.  Default grows with the number of
+        tasks, one resource per 50 tasks, between 5 and 5000.
+    first_day : datetime.date
+        Earliest task start.
+    years : int
+        Task starts are spread over that many years.
+
+    Returns
+    -------
+    generator of list of str
+    """
+    rng = random.Random(seed)
+    if nresources is None:
+        nresources = min(max(5, ntasks // 50), 5000)
+    resources = ['Resource%04d' % number for number in range(nresources)]
+    ndays = 365 * years
+    group = 0
+    for task in range(ntasks):
+        if task % GROUP_SIZE == 0:
+            group += 1
+            yield [str(group), 'Group %d' % group] + [''] * (len(HEADER) - 2)
+
+        start = first_day + timedelta(rng.randrange(ndays))
+        start = add_business_days(start, 0)
+        names = rng.sample(resources, min(rng.choice((1, 1, 1, 2, 3)),
+                                          nresources))
+        if rng.random() < MILESTONE_RATE:
+            (end, effort, duration) = (start, '', '')
+            names = names[:1]
+        else:
+            days = task_duration(rng)
+            end = add_business_days(start, days - 1)
+            seconds = int(days * 8 * 3600 * rng.uniform(0.2, 1.))
+            effort = format_effort(seconds, rng)
+            duration = format_effort(days * 8 * 3600, rng)
+        start_cell = format_date(start, 8, 0)
+        end_cell = format_date(end, rng.randint(9, 16), rng.randrange(60))
+        completion = task_completion(rng)
+
+        row = [''] * len(HEADER)
+        row[0] = '%d.%d' % (group, task % GROUP_SIZE + 1)
+        row[1] = 'Task %d' % task
+        row[2] = row[9] = start_cell
+        row[3] = row[11] = end_cell
+        row[4] = duration
+        row[5] = effort
+        row[6] = '%d%%' % completion
+        row[8] = format_assigned(names, rng)
+        row[10] = row[12] = '0s'
+        yield row
+
+
+def generate_export(outputfile, ntasks, seed=0, **kwargs):
+    """
+    Write a synthetic OmniPlan 3 CSV export.
+
+    Parameters
+    ----------
+    outputfile : str
+    ntasks : int
+        Number of tasks, group tasks not included.
+    seed : int
+        Seed of the random generator.
+    kwargs
+        Passed to iter_rows().
+    """
+    with open(outputfile, mode='w', encoding='utf-8') as filehandle:
+        writer = csv.writer(filehandle)
+        writer.writerow(HEADER)
+        writer.writerows(iter_rows(ntasks, seed, **kwargs))
@@ -0,0 +1,218 @@
+"""
+Startup benchmark of the command line tools.
+
+Each entry point is run with `python -X importtime ... --help`, which
+imports everything the tool imports at start, and parses its arguments.
+The import times of the modules imported by the tool itself, after the
+interpreter start up, are added up.  The run fails if a tool imports
+one of the modules it must load lazily, or, given a baseline, if its
+import time regressed.
+
+To run:
+    python -m klpymisc.admin.benchmarks.startup --save baseline.json
+    python -m klpymisc.admin.benchmarks.startup --baseline baseline.json
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from io import open
+
+import klpymisc
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(klpymisc.__file__))
+
+ENTRY_POINTS = {
+    'omniplan2alloc': os.path.join('admin', 'scripts', 'omniplan2alloc.py'),
+    'allocserver': os.path.join('admin', 'scripts', 'allocserver.py'),
+    'towebtimesheet': os.path.join('admin', 'scripts', 'towebtimesheet.py'),
+    'getdocs': 'getdocs.py',
+}
+
+# Slow to import, and not needed to start.  The server needs the HTTP
+# and threading modules, not the others.
+LAZY_MODULES = ('pkg_resources', 'numpy', 'dateutil', 'concurrent.futures',
+                'multiprocessing', 'xml.etree.ElementTree', 'http.server')
+
+ALLOWED = {'allocserver': ('http.server',)}
+
+# A regression is a time over the baseline times TOLERANCE, plus SLACK
+# microseconds for the noise of short times.
+TOLERANCE = 1.5
+SLACK = 5000
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of -X importtime.
+
+    Returns
+    -------
+    list of (str, int, int)
+        Module name, nesting level and cumulative microseconds, in
+        import order.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # The header line.
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        level = (len(name) - len(stripped) - 1) // 2
+        imports.append((stripped, level, int(fields[1])))
+    return imports
+
+
+def tool_imports(imports):
+    """
+    The top level imports done by the tool, ie. after 'site'.
+    """
+    names = [name for (name, level, _) in imports if level == 0]
+    start = names.index('site') + 1 if 'site' in names else 0
+    return [(name, cumulative) for (name, level, cumulative) in imports
+            if level == 0][start:]
+
+
+def measure(entry, repeat=5):
+    """
+    Import time of an entry point, best of repeat runs.
+
+    Returns
+    -------
+    microseconds : int
+        Sum of the cumulative times of the tool's top level imports.
+    modules : set of str
+        All the modules imported, at any level.
+
+    Raises
+    ------
+    RuntimeError
+        If the entry point fails, eg. on an import error: its imports
+        would be cut short, and its time too.
+    """
+    script = os.path.join(PACKAGE_PATH, ENTRY_POINTS[entry])
+    best = None
+    modules = set()
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', script, '--help'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True, check=False)
+        if process.returncode:
+            errors = [line for line in process.stderr.splitlines()
+                      if not line.startswith('import time:')]
+            raise RuntimeError('%s exited with status %d: %s' %
+                               (entry, process.returncode,
+                                errors[-1] if errors else ''))
+        imports = parse_importtime(process.stderr)
+        total = sum(cumulative for (_, cumulative) in tool_imports(imports))
+        best = total if best is None else min(best, total)
+        modules.update(name for (name, _, _) in imports)
+    return (best, modules)
+
+
+def lazy_violations(entry, modules):
+    """
+    The modules that entry point should not have imported.
+    """
+    allowed = ALLOWED.get(entry, ())
+    return sorted(name for name in LAZY_MODULES
+                  if name in modules and name not in allowed)
+
+
+def regressions(results, baseline, tolerance=TOLERANCE, slack=SLACK):
+    """
+    The entry points slower than their baseline.
+
+    Returns
+    -------
+    dict
+        {entry: (baseline microseconds, microseconds)}
+    """
+    return dict((entry, (baseline[entry], microseconds))
+                for (entry, microseconds) in results.items()
+                if entry in baseline and
+                microseconds > baseline[entry] * tolerance + slack)
+
+
+def run(entries=None, repeat=5, baseline=None, verbose=True):
+    """
+    Measure the entry points and check them.
+
+    Returns
+    -------
+    results : dict
+        Microseconds of each entry point.
+    failures : list of str
+        What went wrong, empty if nothing did.
+    """
+    results = {}
+    failures = []
+    for entry in entries or sorted(ENTRY_POINTS):
+        try:
+            (microseconds, modules) = measure(entry, repeat)
+        except RuntimeError as err:
+            if verbose:
+                print('%-16s   failed' % entry)
+            failures.append(str(err))
+            continue
+        results[entry] = microseconds
+        if verbose:
+            print('%-16s %8.1f ms' % (entry, microseconds / 1000.))
+        for name in lazy_violations(entry, modules):
+            failures.append('%s imports %s at start' % (entry, name))
+    for (entry, (before, after)) in \
+            sorted(regressions(results, baseline or {}).items()):
+        failures.append('%s import time regressed: %.1f ms, was %.1f ms' %
+                        (entry, after / 1000., before / 1000.))
+    return (results, failures)
+
+
+def parse_args(command_line_args):
+    parser = argparse.ArgumentParser(
+        description='Import time of the command line tools')
+    parser.add_argument('entries', type=str, nargs='*',
+                        help='Entry points [default: all of %s]' %
+                        ', '.join(sorted(ENTRY_POINTS)))
+    parser.add_argument('--repeat', dest='repeat', type=int, default=5,
+                        help='Runs per entry point, the best is kept')
+    parser.add_argument('--baseline', dest='baseline', type=str,
+                        default=None,
+                        help='JSON results to compare to; fail on regression')
+    parser.add_argument('--save', dest='save', type=str, default=None,
+                        help='Write the results as JSON')
+    args = parser.parse_args(command_line_args)
+    for entry in args.entries:
+        if entry not in ENTRY_POINTS:
+            parser.error('unknown entry point: %s' % entry)
+    return args
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as filehandle:
+            baseline = json.load(filehandle)
+    (results, failures) = run(args.entries, args.repeat, baseline)
+    if args.save:
+        with open(args.save, mode='w', encoding='utf-8') as filehandle:
+            filehandle.write(json.dumps(results, indent=1, sort_keys=True))
+    for failure in failures:
+        print('FAIL', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Benchmark suite of the OmniPlan allocation.
+
+For each export size, a synthetic export is generated once, then the
+load, allocate and write phases are timed separately, for each engine.
+The peak memory of each phase is measured with tracemalloc, in a second
+run so that the tracing does not weigh on the timings.  The results are
+saved as JSON, to be compared across commits with compare().
+
+To run:
+    python -m klpymisc.admin.benchmarks.suite --sizes 1000,10000 \\
+        --output results.json
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+from io import open
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.benchmarks import generator
+from klpymisc.swdevel.timer import Timer
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+ENGINES = ('python', 'numpy')
+
+RESULTS_VERSION = 1
+
+
+def export_file(workdir, ntasks, seed):
+    """
+    The synthetic export of that size, generated if not there yet.
+    """
+    inputfile = os.path.join(workdir, 'omniplan3_%d_seed%d.csv' %
+                             (ntasks, seed))
+    if not os.path.exists(inputfile):
+        generator.generate_export(inputfile, ntasks, seed)
+    return inputfile
+
+
+def allocate(records, engine):
+    """
+    Allocations of the records with the engine.
+    """
+    if engine == 'numpy':
+        from klpymisc.admin import numpyengine
+        return numpyengine.calculate_allocation(records)
+    return omniplan.calculate_allocation(records)
+
+
+def run_phases(inputfile, outputfile, engine):
+    """
+    Run load, allocate and write once.
+
+    Returns
+    -------
+    generator
+        Yields the name of each phase once it is done; the caller
+        measures between the yields.
+    """
+    omniplan.clear_parser_caches()
+    records = omniplan.load_records(inputfile)
+    yield 'load'
+    allocations = allocate(records, engine)
+    yield 'allocate'
+    omniplan.write_allocations(allocations, outputfile)
+    yield 'write'
+
+
+def time_phases(inputfile, outputfile, engine):
+    """
+    Seconds spent in each phase.
+    """
+    seconds = {}
+    phases = run_phases(inputfile, outputfile, engine)
+    while True:
+        with Timer() as timer:
+            phase = next(phases, None)
+        if phase is None:
+            return seconds
+        seconds[phase] = timer.secs
+
+
+def peak_memory(inputfile, outputfile, engine):
+    """
+    Peak of the memory allocated by Python in each phase, in bytes.
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for phase in run_phases(inputfile, outputfile, engine):
+            peaks[phase] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run(sizes=SIZES, engines=ENGINES, workdir='.', seed=0, memory=True,
+        verbose=False):
+    """
+    Run the suite.
+
+    Parameters
+    ----------
+    sizes : sequence of int
+        Number of tasks of the exports.
+    engines : sequence of str
+        'python' and/or 'numpy'.
+    workdir : str
+        Where the exports are generated, and the outputs written.
+    seed : int
+        Seed of the export generator.
+    memory : bool
+        Measure the peak memory too.
+    verbose : bool
+        Print each result as it comes.
+
+    Returns
+    -------
+    dict
+        The environment and one result per size, engine and phase.
+    """
+    results = []
+    for ntasks in sizes:
+        inputfile = export_file(workdir, ntasks, seed)
+        outputfile = os.path.join(workdir, 'alloc_%d.csv' % ntasks)
+        for engine in engines:
+            try:
+                seconds = time_phases(inputfile, outputfile, engine)
+                peaks = peak_memory(inputfile, outputfile, engine) \
+                    if memory else {}
+            except Exception as err:   # pylint: disable=broad-except
+                # An engine failing on the export is a result too; the
+                # other engines and sizes still run.
+                result = {'tasks': ntasks, 'engine': engine,
+                          'error': '%s: %s' % (type(err).__name__, err)}
+                if verbose:
+                    print('%8d %-7s %s' % (ntasks, engine, result['error']))
+                results.append(result)
+                continue
+            for phase in ('load', 'allocate', 'write'):
+                result = {'tasks': ntasks, 'engine': engine, 'phase': phase,
+                          'seconds': seconds[phase],
+                          'peak_bytes': peaks.get(phase)}
+                if verbose:
+                    print_result(result)
+                results.append(result)
+    return {'version': RESULTS_VERSION,
+            'date': datetime.now().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'results': results}
+
+
+def git_commit():
+    """
+    Commit of the working tree, None outside of a git checkout.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result):
+    peak = result['peak_bytes']
+    print('%8d %-7s %-9s %10.4f s %s' % (
+        result['tasks'], result['engine'], result['phase'],
+        result['seconds'],
+        '' if peak is None else '%10.1f MiB' % (peak / 2.**20)))
+
+
+def save(content, outputfile):
+    """
+    Write the results to a JSON file.
+    """
+    with open(outputfile, mode='w', encoding='utf-8') as filehandle:
+        filehandle.write(json.dumps(content, indent=1))
+
+
+def load(inputfile):
+    """
+    Read the results from a JSON file.
+    """
+    with open(inputfile, encoding='utf-8') as filehandle:
+        return json.load(filehandle)
+
+
+def compare(baseline, current):
+    """
+    Time ratios, current over baseline, of the runs found in both.
+
+    Returns
+    -------
+    dict
+        {(tasks, engine, phase): ratio}
+    """
+    def key(result):
+        return (result['tasks'], result['engine'], result['phase'])
+    before = dict((key(result), result['seconds'])
+                  for result in baseline['results'] if 'error' not in result)
+    ratios = {}
+    for result in current['results']:
+        if 'error' not in result and before.get(key(result)):
+            ratios[key(result)] = result['seconds'] / before[key(result)]
+    return ratios
+
+
+def parse_args(command_line_args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the OmniPlan allocation on synthetic exports')
+    parser.add_argument('--sizes', dest='sizes', type=str,
+                        default=','.join(str(size) for size in SIZES),
+                        help='Comma-separated numbers of tasks')
+    parser.add_argument('--engines', dest='engines', type=str,
+                        default=','.join(ENGINES),
+                        help='Comma-separated engines [default: all]')
+    parser.add_argument('--workdir', dest='workdir', type=str, default='.',
+                        help='Directory for the generated exports')
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        default=True, help='Skip the peak memory runs')
+    parser.add_argument('--output', dest='output', type=str, default=None,
+                        help='JSON results file')
+    parser.add_argument('--compare', dest='compare', type=str, default=None,
+                        help='JSON results of a previous run to compare to')
+    args = parser.parse_args(command_line_args)
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+    args.engines = args.engines.split(',')
+    for engine in args.engines:
+        if engine not in ENGINES:
+            parser.error('unknown engine: %s' % engine)
+    return args
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    content = run(args.sizes, args.engines, args.workdir, args.seed,
+                  args.memory, verbose=True)
+    if args.output:
+        save(content, args.output)
+    if args.compare:
+        ratios = compare(load(args.compare), content)
+        for ((ntasks, engine, phase), ratio) in sorted(ratios.items()):
+            print('%8d %-7s %-9s x%.2f' % (ntasks, engine, phase, ratio))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
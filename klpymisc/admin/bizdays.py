@@ -0,0 +1,217 @@
+"""
+Business day arithmetic.
+
+Counting the business days between two dates is done with plain weekday
+arithmetic on the date ordinals instead of enumerating every calendar day.
+Holidays, if any, are kept as a sorted array of ordinals and are looked up
+with `bisect`.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import bisect
+from datetime import date, datetime, timedelta
+from io import open
+
+# The proleptic Gregorian ordinal 1 (0001-01-01) is a Monday.
+_ORDINAL_MONDAY = 1
+
+# Memoized (start_date, end_date) pairs kept by a BusinessCalendar.  A
+# long-running server sees new pairs every day; the oldest are dropped.
+CALENDAR_CACHE_SIZE = 4096
+
+
+def business_days_between(start_date, end_date):
+    """
+    Count the weekdays (Monday to Friday) from start_date to end_date,
+    both dates included.  O(1).
+
+    Parameters
+    ----------
+    start_date : datetime.date or datetime.datetime
+    end_date : datetime.date or datetime.datetime
+
+    Returns
+    -------
+    int
+        Number of business days.  Zero if end_date is before start_date.
+    """
+    start = start_date.toordinal() - _ORDINAL_MONDAY
+    end = end_date.toordinal() - _ORDINAL_MONDAY + 1
+    if end <= start:
+        return 0
+    return _weekdays_before(end) - _weekdays_before(start)
+
+
+def add_business_days(start_date, ndays):
+    """
+    The date ndays business days after start_date.  O(1).
+
+    A start_date falling on a weekend is first moved to the next Monday.
+    Holidays are not considered.
+
+    Parameters
+    ----------
+    start_date : datetime.date
+    ndays : int
+        Number of business days to add, zero or more.
+
+    Returns
+    -------
+    datetime.date
+    """
+    weekday = min(start_date.weekday(), 5)
+    monday = start_date - timedelta(start_date.weekday())
+    if weekday == 5:
+        monday += timedelta(7)
+        weekday = 0
+    (weeks, days) = divmod(weekday + ndays, 5)
+    return monday + timedelta(7 * weeks + days)
+
+
+def business_day_index(day):
+    """
+    Number of the business day, counted from 0001-01-01.  O(1).
+
+    Dates a number of business days apart have numbers that many apart.
+    A weekend date gets the number of the next Monday.  Holidays are not
+    considered.
+
+    Parameters
+    ----------
+    day : datetime.date
+
+    Returns
+    -------
+    int
+    """
+    return _weekdays_before(day.toordinal() - _ORDINAL_MONDAY)
+
+
+def business_day_date(index):
+    """
+    The date of a business day number, the inverse of business_day_index.
+    """
+    (weeks, days) = divmod(index, 5)
+    return date.fromordinal(_ORDINAL_MONDAY + 7 * weeks + days)
+
+
+def _weekdays_before(day_index):
+    # Number of weekdays in [0, day_index), index 0 being a Monday.
+    weeks, days = divmod(day_index, 7)
+    return weeks * 5 + min(days, 5)
+
+
+class BusinessCalendar(object):
+    """
+    Business day counter with an optional holiday calendar.
+
+    Parameters
+    ----------
+    holidays : iterable of datetime.date, optional
+        Non-working days.  Holidays falling on a weekend are ignored since
+        they are not business days to begin with.
+
+    Attributes
+    ----------
+    holidays : list of int
+        Sorted ordinals of the weekday holidays.
+
+    Methods
+    -------
+    business_days(start_date, end_date)
+        Number of business days, both limits included.
+    add_holidays(holidays)
+        Add dates to the holiday calendar.
+
+    Notes
+    -----
+    Results are memoized on (start_date, end_date), up to
+    CALENDAR_CACHE_SIZE pairs, the oldest dropped first.  The cache is
+    reset when the holiday calendar changes.
+
+    Examples
+    --------
+    >>> cal = BusinessCalendar([date(2017, 7, 4)])
+    >>> cal.business_days(date(2017, 7, 3), date(2017, 7, 7))
+    4
+    """
+
+    def __init__(self, holidays=None):
+        self.holidays = []
+        self._cache = {}
+        if holidays is not None:
+            self.add_holidays(holidays)
+
+    def add_holidays(self, holidays):
+        """
+        Add dates to the holiday calendar.
+
+        Parameters
+        ----------
+        holidays : iterable of datetime.date
+        """
+        ordinals = set(self.holidays)
+        for holiday in holidays:
+            if holiday.weekday() < 5:
+                ordinals.add(holiday.toordinal())
+        self.holidays = sorted(ordinals)
+        self._cache.clear()
+
+    def business_days(self, start_date, end_date):
+        """
+        Count the business days from start_date to end_date, both included.
+
+        Parameters
+        ----------
+        start_date : datetime.date
+        end_date : datetime.date
+
+        Returns
+        -------
+        int
+            Number of business days.
+        """
+        key = (start_date, end_date)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        nbizdays = business_days_between(start_date, end_date)
+        if nbizdays and self.holidays:
+            nbizdays -= (bisect.bisect_right(self.holidays,
+                                             end_date.toordinal()) -
+                         bisect.bisect_left(self.holidays,
+                                            start_date.toordinal()))
+        if len(self._cache) >= CALENDAR_CACHE_SIZE:
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = nbizdays
+        return nbizdays
+
+
+def read_holidays(filename):
+    """
+    Read a holiday calendar from a text file.
+
+    One date per line, in ISO format (YYYY-MM-DD).  Blank lines and lines
+    starting with '#' are ignored.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the holiday file.
+
+    Returns
+    -------
+    list of datetime.date
+    """
+    holidays = []
+    with open(filename, encoding='utf-8') as filehandle:
+        for line in filehandle:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            holidays.append(datetime.strptime(line, '%Y-%m-%d').date())
+    return holidays
@@ -0,0 +1,213 @@
+"""
+Parallel allocation of one large CSV export.
+
+The export is split into byte ranges that end on record boundaries, each
+range is read from a memory map with `mapped.iter_range`, which decodes
+only the columns used, and allocated in its own worker process, and the
+resource x month tables of the ranges are merged.  Only the tables, not
+the records, come back from the workers.
+
+A newline is a record boundary only if it is outside of any quoted
+field: the Start and End cells, eg. "6/5/17, 08:00", contain commas and
+the notes can contain newlines.  Since a quote inside a quoted field is
+doubled, a newline is outside of the quoted fields when the number of
+quotes before it is even.
+
+That assumes every quote is a CSV quote.  csv.reader also accepts a
+stray quote inside a field that is not quoted, eg. 5" screen, which
+throws the count off: a boundary can then fall inside a quoted field.
+The range before such a boundary ends on an unterminated field and does
+not parse, and the export is then allocated in one pass instead.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import open
+
+from klpymisc.admin import mapped, omniplan
+from klpymisc.admin.alloctable import AllocationTable
+
+QUOTE = b'"'
+NEWLINE = b'\n'
+
+# Bytes counted at a time, to bound the copies out of a mmap.
+BLOCK_SIZE = 1 << 22
+
+
+def count_quotes(data, start, end):
+    """
+    Number of quotes in data[start:end].
+    """
+    count = 0
+    for low in range(start, end, BLOCK_SIZE):
+        count += data[low:min(low + BLOCK_SIZE, end)].count(QUOTE)
+    return count
+
+
+def record_end(data, position, quotes_before):
+    """
+    Offset just after the first record boundary at or after position.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The whole file, eg. a mmap.
+    position : int
+        Where to start looking.
+    quotes_before : int
+        Number of quotes in data before position.
+
+    Returns
+    -------
+    offset : int
+        After the newline ending the record, or the end of the data.
+    quotes : int
+        Number of quotes in data before offset.
+    """
+    while True:
+        newline = data.find(NEWLINE, position)
+        if newline < 0:
+            return (len(data),
+                    quotes_before + count_quotes(data, position, len(data)))
+        quotes_before += count_quotes(data, position, newline)
+        position = newline + 1
+        if quotes_before % 2 == 0:
+            return (position, quotes_before)
+
+
+def chunk_ranges(data, nchunks):
+    """
+    Split the records of a CSV file into about nchunks byte ranges.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The whole file.
+    nchunks : int
+
+    Returns
+    -------
+    header : (int, int)
+        Byte range of the header record.
+    ranges : list of (int, int)
+        Byte ranges of the other records, each ending on a record
+        boundary, empty ones left out.
+    """
+    (header_end, quotes) = record_end(data, 0, 0)
+    size = len(data) - header_end
+    ranges = []
+    start = header_end
+    for chunk in range(1, nchunks + 1):
+        target = header_end + size * chunk // nchunks
+        if target <= start:
+            continue
+        quotes += count_quotes(data, start, target)
+        (end, quotes) = record_end(data, target, quotes) \
+            if chunk < nchunks else (len(data), quotes)
+        ranges.append((start, end))
+        start = end
+    return ((0, header_end), [(low, high) for (low, high) in ranges
+                              if high > low])
+
+
+def allocate_range(inputfile, start, end, columns, engine='python',
+                   holidays=None):
+    """
+    Parse and allocate the records of a byte range.  Runs in the worker
+    processes.
+
+    Parameters
+    ----------
+    inputfile : str
+    start, end : int
+        Byte range, on record boundaries.
+    columns : tuple of int
+        From omniplan.resolve_columns() on the header.
+    engine : str
+        'python' or 'numpy'.
+    holidays : list of datetime.date, optional
+        Holiday calendar.
+
+    Returns
+    -------
+    AllocationTable
+
+    Raises
+    ------
+    ValueError
+        If a record cannot be parsed, with its byte offset.
+    """
+    if holidays is not None:
+        omniplan.set_holidays(holidays)
+    with open(inputfile, mode='rb') as filehandle:
+        with mmap.mmap(filehandle.fileno(), 0,
+                       access=mmap.ACCESS_READ) as data:
+            records = mapped.iter_range(data, start, end, columns)
+            try:
+                if engine == 'numpy':
+                    from klpymisc.admin import numpyengine
+                    return numpyengine.calculate_allocation(records)
+                return omniplan.calculate_allocation(records)
+            except ValueError as err:
+                raise ValueError('File %s: %s' % (inputfile, err))
+
+
+def parallel_allocation(inputfile, engine='python', holidays=None,
+                        max_workers=None, nchunks=None):
+    """
+    Allocate a CSV export, parsed in parallel in byte ranges.
+
+    Parameters
+    ----------
+    inputfile : str
+        CSV export.
+    engine : str
+        'python' or 'numpy'.
+    holidays : list of datetime.date, optional
+        Holiday calendar.
+    max_workers : int, optional
+        Number of worker processes.  Default is the number of CPUs.
+    nchunks : int, optional
+        Number of byte ranges.  Default is four per worker, to even out
+        the ranges that take longer.
+
+    Returns
+    -------
+    AllocationTable
+    """
+    workers = max_workers or os.cpu_count() or 1
+    with open(inputfile, mode='rb') as filehandle:
+        if os.fstat(filehandle.fileno()).st_size == 0:
+            raise ValueError('File %s is empty' % inputfile)
+        with mmap.mmap(filehandle.fileno(), 0,
+                       access=mmap.ACCESS_READ) as data:
+            (_, ranges) = chunk_ranges(data, nchunks or 4 * workers)
+            (columns, header_end) = mapped.read_header(data)
+            size = len(data)
+
+    allocations = AllocationTable()
+    if not ranges:
+        return allocations
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(allocate_range,
+                                   [inputfile] * len(ranges),
+                                   [start for (start, _) in ranges],
+                                   [end for (_, end) in ranges],
+                                   [columns] * len(ranges),
+                                   [engine] * len(ranges),
+                                   [holidays] * len(ranges))
+            for result in results:
+                allocations.merge(result)
+    except ValueError:
+        if len(ranges) == 1:
+            raise
+        # A bad record, or a boundary misplaced by a stray quote.  In one
+        # range, only a bad record raises, where it is.
+        return allocate_range(inputfile, header_end, size, columns, engine,
+                              holidays)
+    return allocations
@@ -0,0 +1,161 @@
+"""
+Memory-mapped reading of the CSV exports.
+
+`omniplan.iter_records` decodes the whole file and csv.reader makes a
+string of every field of every row, when the allocation only needs five
+columns: Assigned, Effort, Start, End and %Done or Completed.  Here the
+export is memory-mapped and scanned as bytes for the record and field
+boundaries, by a regular expression matching whole records, run in
+place on the mmap.  Only the fields of those columns are captured,
+sliced out and decoded; the others are stepped over without being
+copied.
+
+The quoting is that of csv.reader with the default dialect: a field
+starting with a quote ends at the next lone quote, a doubled quote
+inside it stands for one quote, and it can contain commas and newlines.
+Records end with LF or CRLF.  Empty lines are skipped.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import mmap
+import os
+import re
+from io import open
+
+from klpymisc.admin import omniplan
+
+QUOTE = b'"'
+
+# A projected field: quoted, a doubled quote standing for one quote
+# inside, or not quoted, and then not starting with a quote so that it
+# only matches one way.  The groups keep the inside of the quotes.
+_CAPTURED_QUOTED = b'"([^"]*(?:""[^"]*)*)"'
+_CAPTURED_PLAIN = b'((?:[^",\\r\\n][^,\\r\\n]*)?)'
+
+# A field that is not projected, stepped over: quoted, and then anything
+# up to the comma, which csv.reader appends, or not quoted, a quote
+# inside it, eg. 5" screen, being just a byte.  The fields after the
+# last projected one, any number of those.
+_SKIPPED = (b'(?:"[^"]*(?:""[^"]*)*"(?:[^",\\r\\n][^,\\r\\n]*)?'
+            b'|[^",\\r\\n][^,\\r\\n]*)?')
+_FIELDS = _SKIPPED + b'(?:,' + _SKIPPED + b')*'
+_END = b'(?:\\r?\\n|\\Z)'
+
+# The header, any record.
+_HEADER = re.compile(_FIELDS + _END)
+
+# What may follow the last record.
+_TRAILING = re.compile(b'[\\r\\n]*\\Z')
+
+# The columns of the fields once projected, in the TaskRecord order.
+PROJECTED_COLUMNS = tuple(range(5))
+
+
+def record_pattern(columns):
+    """
+    Regular expression of a record, capturing the projected fields.
+
+    Parameters
+    ----------
+    columns : tuple of int
+        Column index of each projected field.
+
+    Returns
+    -------
+    re.Pattern
+        Matches a whole record, the empty lines before it and its
+        newline included.  Each projected column, in column order, has
+        two groups: the inside of the field if quoted, the field if not.
+    """
+    fields = [b'(?:' + _CAPTURED_QUOTED + b'|' + _CAPTURED_PLAIN + b')'
+              if column in columns else _SKIPPED
+              for column in range(max(columns) + 1)]
+    return re.compile(b'(?:\\r?\\n)*' + b','.join(fields) +
+                      b'(?:,' + _FIELDS + b')?' + _END)
+
+
+def iter_range(data, start, end, columns):
+    """
+    Stream the TaskRecords of a byte range of records.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The file, eg. a mmap.
+    start, end : int
+        Byte range, on record boundaries.
+    columns : tuple of int
+        From omniplan.resolve_columns() on the header.
+
+    Raises
+    ------
+    ValueError
+        If a record cannot be parsed, with its byte offset.
+    """
+    # The groups come in column order, the TaskRecord wants its order.
+    order = sorted(range(len(columns)), key=columns.__getitem__)
+    groups = [(2 * order.index(rank), 2 * order.index(rank) + 1)
+              for rank in range(len(columns))]
+    match = record_pattern(columns).match
+    position = start
+    while position < end:
+        record = match(data, position, end)
+        if record is None:
+            break
+        fields = record.groups()
+        values = [fields[plain].decode('utf-8') if fields[quoted] is None
+                  else fields[quoted].replace(QUOTE + QUOTE,
+                                              QUOTE).decode('utf-8')
+                  for (quoted, plain) in groups]
+        try:
+            yield omniplan.TaskRecord.from_row(values, PROJECTED_COLUMNS)
+        except ValueError as err:
+            raise ValueError('Record at byte %d: %s' % (position, err))
+        position = record.end()
+    if _TRAILING.match(data, position, end) is None:
+        raise ValueError('Record at byte %d: unterminated quoted field or '
+                         'fewer than %d fields' % (position, max(columns) + 1))
+
+
+def read_header(data):
+    """
+    Columns of the header of the export, and the offset of the first
+    record.
+    """
+    header_end = _HEADER.match(data).end()
+    header = data[:header_end].decode('utf-8')
+    return (omniplan.resolve_columns(next(csv.reader([header]))),
+            header_end)
+
+
+def iter_records(inputfile):
+    """
+    Stream the TaskRecords from a CSV export, memory-mapped.
+
+    Same records as `omniplan.iter_records`.
+
+    Raises
+    ------
+    ValueError
+        If the file is empty, its header unknown, or a record cannot be
+        parsed.
+    """
+    with open(inputfile, mode='rb') as filehandle:
+        if os.fstat(filehandle.fileno()).st_size == 0:
+            raise ValueError('File %s is empty' % inputfile)
+        with mmap.mmap(filehandle.fileno(), 0,
+                       access=mmap.ACCESS_READ) as data:
+            (columns, header_end) = read_header(data)
+            try:
+                for record in iter_range(data, header_end, len(data),
+                                         columns):
+                    yield record
+            except ValueError as err:
+                raise ValueError('File %s: %s' % (inputfile, err))
+
+
+def load_records(inputfile):
+    return list(iter_records(inputfile))
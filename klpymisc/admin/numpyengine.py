@@ -0,0 +1,218 @@
+"""
+Vectorized allocation engine.
+
+Same calculation as `omniplan.calculate_allocation`, but the tasks are
+first turned into columnar arrays and the resource x month allocation
+matrix is filled with a handful of NumPy operations instead of walking the
+tasks, months and resources one at a time.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+from datetime import date
+
+import numpy as np
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import AllocationTable, RESOURCES, period_index
+
+
+class TaskColumns(object):
+    """
+    Columnar representation of the assigned, not completed, tasks.
+
+    Attributes
+    ----------
+    start : numpy.ndarray of datetime64[D]
+        Start date of each task.
+    end : numpy.ndarray of datetime64[D]
+        End date of each task.
+    effort : numpy.ndarray of float
+        Total effort of each task, in hours.
+    completion : numpy.ndarray of float
+        Fraction of each task already completed.
+    resources : list of str
+        Resource names.  The resource ids index this list.
+    assign_task : numpy.ndarray of int
+        Task index of each assignment.
+    assign_resource : numpy.ndarray of int
+        Resource id of each assignment.
+    assign_fraction : numpy.ndarray of float
+        Fraction of the task's effort going to the resource.
+    """
+
+    def __init__(self, records):
+        starts = []
+        ends = []
+        efforts = []
+        completions = []
+        # Local id of each RESOURCES id, in order of appearance.
+        resource_ids = {}
+        assign_task = []
+        assign_resource = []
+        assign_fraction = []
+        for record in omniplan.active_records(records):
+            task = len(starts)
+            for (resource, frac) in record.resources:
+                if resource not in resource_ids:
+                    resource_ids[resource] = len(resource_ids)
+                assign_task.append(task)
+                assign_resource.append(resource_ids[resource])
+                assign_fraction.append(frac)
+            starts.append(record.start)
+            ends.append(record.end)
+            efforts.append(record.effort)
+            completions.append(record.completion)
+
+        self.start = np.array(starts, dtype='datetime64[D]')
+        self.end = np.array(ends, dtype='datetime64[D]')
+        self.effort = np.array(efforts, dtype=float)
+        self.completion = np.array(completions, dtype=float)
+        self.resources = [RESOURCES.names[resource] for resource in
+                          sorted(resource_ids, key=resource_ids.get)]
+        self.assign_task = np.array(assign_task, dtype=np.intp)
+        self.assign_resource = np.array(assign_resource, dtype=np.intp)
+        self.assign_fraction = np.array(assign_fraction, dtype=float)
+
+    @classmethod
+    def from_arrays(cls, start, end, effort, completion, resources,
+                    assign_task, assign_resource, assign_fraction):
+        """
+        Columns built from arrays already, eg. perturbed copies of the
+        columns of a plan.  The arguments are the attributes.
+        """
+        columns = cls(())
+        columns.start = np.asarray(start, dtype='datetime64[D]')
+        columns.end = np.asarray(end, dtype='datetime64[D]')
+        columns.effort = np.asarray(effort, dtype=float)
+        columns.completion = np.asarray(completion, dtype=float)
+        columns.resources = list(resources)
+        columns.assign_task = np.asarray(assign_task, dtype=np.intp)
+        columns.assign_resource = np.asarray(assign_resource, dtype=np.intp)
+        columns.assign_fraction = np.asarray(assign_fraction, dtype=float)
+        return columns
+
+    def __len__(self):
+        return len(self.start)
+
+
+def allocate(columns, busdaycal=None):
+    """
+    Fill the resource x month allocation matrix.
+
+    Parameters
+    ----------
+    columns : TaskColumns
+        The tasks to allocate.
+    busdaycal : numpy.busdaycalendar, optional
+        Business day calendar.  Default is the holiday calendar
+        currently set in the omniplan module.
+
+    Returns
+    -------
+    months : numpy.ndarray of datetime64[M]
+        The months, the columns of the matrices.
+    allocation : numpy.ndarray of float
+        Effort left, in hours, for each resource and month.
+    assigned : numpy.ndarray of bool
+        Whether any task of the resource spans the month.
+    """
+    if busdaycal is None:
+        busdaycal = business_day_calendar(omniplan.BUSINESS_CALENDAR)
+    nresources = len(columns.resources)
+    if not len(columns) or not len(columns.assign_task):
+        empty = np.zeros((nresources, 0))
+        return (np.array([], dtype='datetime64[M]'), empty,
+                empty.astype(bool))
+
+    start_month = columns.start.astype('datetime64[M]')
+    end_month = columns.end.astype('datetime64[M]')
+    origin = start_month.min()
+    nmonths = int((end_month.max() - origin).astype(int)) + 1
+
+    # One row per (task, month spanned by the task).
+    span = (end_month - start_month).astype(int) + 1
+    pair_task = np.repeat(np.arange(len(columns)), span)
+    first_pair = np.cumsum(span) - span
+    pair_rank = np.arange(len(pair_task)) - np.repeat(first_pair, span)
+    pair_month = start_month[pair_task] + pair_rank
+
+    # Business days of the task falling in each month.
+    month_first = pair_month.astype('datetime64[D]')
+    month_next = (pair_month + 1).astype('datetime64[D]')
+    days = np.busday_count(np.maximum(month_first, columns.start[pair_task]),
+                           np.minimum(month_next,
+                                      columns.end[pair_task] + 1),
+                           busdaycal=busdaycal)
+    days_cumul = np.cumsum(days)
+    days_after = days_cumul - np.repeat(days_cumul[first_pair] -
+                                        days[first_pair], span)
+    ndays = days_after[first_pair + span - 1]
+
+    # The effort left is what remains once the completed hours are
+    # taken from the start of the task, month by month.
+    effort = columns.effort[pair_task]
+    hours_completed = (columns.completion * columns.effort)[pair_task]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        effort_per_day = effort / ndays[pair_task]
+        hours_left = np.clip(effort_per_day * days_after - hours_completed,
+                             0., effort_per_day * days)
+
+    # Tasks within a single month, or without a single business day,
+    # have all their effort left in their first month.
+    lump = (span == 1) | (ndays == 0)
+    lump_pairs = lump[pair_task]
+    hours_left[lump_pairs] = np.where(pair_rank[lump_pairs] == 0,
+                                      (1 - columns.completion[pair_task]
+                                       [lump_pairs]) * effort[lump_pairs],
+                                      0.)
+
+    # Spread over the assignments.
+    asg_span = span[columns.assign_task]
+    asg_pair = np.repeat(first_pair[columns.assign_task], asg_span) + \
+        (np.arange(asg_span.sum()) -
+         np.repeat(np.cumsum(asg_span) - asg_span, asg_span))
+    cell = np.repeat(columns.assign_resource, asg_span) * nmonths + \
+        (pair_month[asg_pair] - origin).astype(int)
+    weights = hours_left[asg_pair] * np.repeat(columns.assign_fraction,
+                                               asg_span)
+    size = nresources * nmonths
+    allocation = np.bincount(cell, weights=weights, minlength=size)
+    assigned = np.bincount(cell, minlength=size) > 0
+
+    months = origin + np.arange(nmonths)
+    return (months, allocation.reshape(nresources, nmonths),
+            assigned.reshape(nresources, nmonths))
+
+
+def business_day_calendar(business_calendar):
+    """
+    Convert a `bizdays.BusinessCalendar` to a `numpy.busdaycalendar`.
+    """
+    holidays = [date.fromordinal(ordinal)
+                for ordinal in business_calendar.holidays]
+    return np.busdaycalendar(holidays=np.array(holidays,
+                                               dtype='datetime64[D]'))
+
+
+def calculate_allocation(records):
+    """
+    Drop-in replacement for `omniplan.calculate_allocation`.
+
+    Parameters
+    ----------
+    records : iterable of TaskRecord
+
+    Returns
+    -------
+    AllocationTable
+    """
+    columns = TaskColumns(records)
+    (months, allocation, assigned) = allocate(columns)
+    allocations = AllocationTable()
+    if len(months):
+        allocations.add_rows(columns.resources,
+                             period_index(months[0].astype(date)),
+                             allocation, assigned)
+    return allocations
@@ -0,0 +1,466 @@
+"""
+Monthly resource allocation from OmniPlan CSV exports.
+
+The records are loaded from the CSV export, the effort left on each task
+is spread over the months the task spans, pro-rated on business days, and
+split between the assigned resources.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import sys
+from io import open
+
+import csv
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+import calendar
+from functools import lru_cache
+
+from klpymisc.admin.alloctable import AllocationTable, RESOURCES, period_index
+from klpymisc.admin.bizdays import BusinessCalendar
+
+# Allocations per ISO week or per quarter are calculated by the periods
+# module.
+
+def iter_records(inputfile):
+    """
+    Stream the TaskRecords from a CSV export, one row at a time.
+    """
+    #with open(inputfile, 'rb') as filehandle:
+    with open(inputfile, encoding='utf-8') as filehandle:
+        reader = csv.reader(filehandle)
+        try:
+            firstrow = True
+            for row in reader:
+                if firstrow:
+                    columns = resolve_columns(row)
+                    firstrow = False
+                else:
+                    yield TaskRecord.from_row(row, columns)
+        except csv.Error as err:
+            sys.exit('File %s, line %d: %s' % (inputfile, reader.line_num, err))
+        except ValueError as err:
+            sys.exit('File %s, line %d: %s' % (inputfile, reader.line_num, err))
+
+def iter_export(inputfile):
+    """
+    Stream the TaskRecords from a CSV export or from an OmniPlan document.
+    """
+    from klpymisc.admin import oplx
+    if oplx.is_document(inputfile):
+        return oplx.iter_document_records(inputfile)
+    return iter_records(inputfile)
+
+def load_records(inputfile):
+    return list(iter_records(inputfile))
+
+def active_records(records):
+    """
+    Filter out the records that do not contribute to the allocations.
+    """
+    for record in records:
+        if record.completion >= 1.:
+            continue
+        if not record.assigned:
+            # If the task is not assigned, skip.  eg. milestones, group tasks.
+            continue
+        yield record
+
+def calculate_allocation(records, allocations=None):
+    """
+    Fold the records into the allocations.
+
+    The records can be any iterable, a generator from iter_records() for
+    example, in which case only the allocations are kept in memory.
+    """
+    if allocations is None:
+        allocations = AllocationTable()
+    for record in active_records(records):
+        add_task_allocation(allocations, record)
+
+    return allocations
+
+def merge_allocations(allocations, other):
+    """
+    Add the efforts of the other allocations into allocations.
+    """
+    return allocations.merge(other)
+
+def add_task_allocation(allocations, record):
+    """
+    Add the effort left on one task to the allocations.
+    """
+    # The values obtained from the CSV were parsed at load time, the
+    # resources encoded to their ids.  The ids are looked up once, by row
+    # in the allocation table.
+    resources = [(allocations.dictionary_row(resource), frac)
+                 for (resource, frac) in record.resources]
+    granularity = allocations.granularity
+
+    # Now, if there are multiple assignee to this task, the effort
+    # must be split between the assigned based on the fractional
+    # assignment.
+
+    effort_hours = record.effort
+    start_date = record.start
+    end_date = record.end
+
+    # Now, calculate the effort left per month
+    # Key here is "left".  If a task is already completed, the
+    # effort looking ahead is clearly no longer needed.  It shouldn't
+    # be added to the tally.
+
+    completion = record.completion
+
+    if (start_date.month == end_date.month) and \
+            (start_date.year == end_date.year):
+        # Effort contained within one month.
+        index = period_index(start_date, granularity)
+        for (resource_id, frac) in resources:
+            effort_left = (1 - completion) * effort_hours * frac
+            allocations.add(resource_id, index, effort_left)
+        return
+
+    # Effort spreaded over multiple months.  All 'number of days' are
+    # business days.
+    #
+    # cumulative[i] is the number of days of the task up to the end of
+    # month i, the last one being the total.  The completed hours are
+    # taken from the start of the task: the crossover month, where the
+    # current completion level falls, is found by bisection.  Every month
+    # before has zero effort left, every month after its full share.
+    (months, cumulative) = cumulative_business_days(start_date, end_date)
+    ndays = cumulative[-1]
+    if ndays == 0:
+        # Nothing to pro-rate on, eg. a weekend.  All in the first month.
+        index = period_index(months[0], granularity)
+        for (resource_id, frac) in resources:
+            effort_left = (1 - completion) * effort_hours * frac
+            allocations.add(resource_id, index, effort_left)
+        return
+
+    effort_per_day = effort_hours / ndays
+    hours_completed = completion * effort_hours
+    # The days completed, from the completion itself: the effort can be
+    # zero.
+    the_month = min(bisect_right(cumulative, completion * ndays),
+                    len(months) - 1)
+
+    for (index, month) in enumerate(months):
+        if index < the_month:
+            # work for this month is done.
+            hours_left = 0.
+        elif index == the_month:
+            hours_left = effort_per_day * cumulative[index] - hours_completed
+        else:
+            hours_left = effort_per_day * (cumulative[index] -
+                                           cumulative[index - 1])
+        # The period of the month is computed once for all the resources.
+        period = period_index(month, granularity)
+        for (resource_id, frac) in resources:
+            allocations.add(resource_id, period, hours_left * frac)
+
+def write_allocations(allocations, outputfile):
+    """
+    Write the AllocationTable as CSV, one row per resource, one column
+    per period of the span of the allocations.
+    """
+    granularity = allocations.granularity
+    list_of_periods = allocations.periods()
+
+    # Create header: Resource Month1 Month2 MonthN
+    header = ['Resource']
+    if granularity == 'month':
+        for month in list_of_periods:
+            header.append(month.strftime("%B%Y"))
+    else:
+        from klpymisc.admin import periods
+        for period in list_of_periods:
+            header.append(periods.period_label(period, granularity))
+
+    # The rows are read straight from the table, over the span.
+    alloc_rows = []
+    for resource in sorted(allocations):
+        (hours, assigned) = allocations.row(resource)
+        row = [resource]
+        row.extend(['%f' % effort if filled else '0.'
+                    for (effort, filled) in zip(hours, assigned)])
+        alloc_rows.append(row)
+
+    with open(outputfile, mode='w', encoding='utf-8') as filehandle:
+        writer = csv.writer(filehandle)
+        writer.writerow(header)
+        writer.writerows(alloc_rows)
+    return
+
+#------------------------------------------------------------------
+# Classes
+
+class TaskRecord(object):
+    """
+    The columns of a task used by the allocation, already parsed.
+
+    assigned is the tuple of (name, fraction) from parse_assigned(), effort
+    is in hours, start and end are datetime.date, completion is the
+    fraction of the task already done.  resources is assigned with the
+    names encoded to their ids in alloctable.RESOURCES, the form the
+    allocation works on; it is encoded from assigned if not given.
+    """
+    __slots__ = ('assigned', 'effort', 'start', 'end', 'completion',
+                 'resources')
+
+    def __init__(self, assigned, effort, start, end, completion,
+                 resources=None):
+        self.assigned = assigned
+        self.effort = effort
+        self.start = start
+        self.end = end
+        self.completion = completion
+        if resources is None:
+            resources = RESOURCES.encode(assigned)
+        self.resources = resources
+
+    def __reduce__(self):
+        # The resources are re-encoded in the process unpickling, the ids
+        # are those of this one.
+        return (self.__class__, (self.assigned, self.effort, self.start,
+                                 self.end, self.completion))
+
+    @classmethod
+    def from_row(cls, row, columns):
+        """
+        Parse a CSV row.  columns are the indices from resolve_columns().
+
+        Raises
+        ------
+        ValueError
+            If a cell cannot be parsed, or if an assigned, incomplete
+            task has no Start or End date.
+        """
+        (assigned, effort, start, end, completion) = \
+            [row[index] for index in columns]
+        if assigned:
+            (assigned, resources) = parse_assigned_ids(assigned)
+        else:
+            (assigned, resources) = ((), ())
+        completion = percent_to_float(completion) if completion else 0.
+        if assigned and completion < 1. and not (start and end):
+            raise ValueError('Assigned task without Start or End date')
+        return cls(assigned,
+                   parse_effort(effort),
+                   parse_date(start) if start else None,
+                   parse_date(end) if end else None,
+                   completion,
+                   resources)
+
+#------------------------------------------------------------------
+# Utility functions
+
+# Header of the columns used by the allocation, in the TaskRecord order,
+# for each version of the OmniPlan CSV export.  OmniPlan 2 and 3 use the
+# same names; they differ in the format of the dates and assignments,
+# which the parsers take care of.
+HEADER_MAPS = [
+    ('OmniPlan 2/3', ('Assigned', 'Effort', 'Start', 'End', '%Done')),
+    ('OmniPlan 3.13', ('Assigned', 'Effort', 'Start', 'End', 'Completed')),
+]
+
+def resolve_columns(header):
+    """
+    Find the index of the TaskRecord columns in the header of an export.
+    """
+    for (_, names) in HEADER_MAPS:
+        if all(name in header for name in names):
+            return tuple(header.index(name) for name in names)
+    raise ValueError('Unrecognized header, not an OmniPlan export: %s' %
+                     ','.join(header))
+
+# Business days are counted against this calendar.  Holidays can be
+# plugged in with set_holidays().
+BUSINESS_CALENDAR = BusinessCalendar()
+
+def set_holidays(holidays):
+    """
+    Replace the holiday calendar used to count business days.
+    """
+    global BUSINESS_CALENDAR
+    BUSINESS_CALENDAR = BusinessCalendar(holidays)
+
+def get_business_days(start_date, end_date):
+    """
+    inputs in date objects
+    """
+    return BUSINESS_CALENDAR.business_days(start_date, end_date)
+
+def cumulative_business_days(start_date, end_date):
+    """
+    Business days of a task, cumulated month by month.
+
+    Returns
+    -------
+    months : list of datetime.date
+        First day of each month from the one of start_date to the one
+        of end_date.
+    cumulative : list of int
+        Business days from start_date to the end of each month, or to
+        end_date for the last one.
+    """
+    months = []
+    cumulative = []
+    total = 0
+    (year, month) = (start_date.year, start_date.month)
+    while (year, month) <= (end_date.year, end_date.month):
+        first = date(year, month, 1)
+        last = date(year, month, calendar.monthrange(year, month)[1])
+        total += get_business_days(max(first, start_date),
+                                   min(last, end_date))
+        months.append(first)
+        cumulative.append(total)
+        (year, month) = (year + month // 12, month % 12 + 1)
+    return (months, cumulative)
+
+# The same cells come back over and over in an export: the assignment
+# strings, the effort strings, the dates.  The parsers are memoized on the
+# raw cell string.  PARSER_CACHE_SIZE bounds each LRU cache.
+PARSER_CACHE_SIZE = 4096
+
+_ASSIGNED_FRACTION = re.compile(r'(\d+)% (?:out )?of (\d+)%')
+_EFFORT_TOKEN = re.compile(r'([0-9.]+)([a-z]+)')
+
+_EFFORT_MULTIPLICATOR = {'mo' : 160.,
+                         'w'  : 40.,
+                         'd'  : 8.,
+                         'h'  : 1.,
+                         'm'  : 1 / 60.,
+                         's'  : 1 / 3600.
+                        }
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_assigned(assigned_string):
+    """
+    Parse the Assigned cell into a tuple of (name, fraction).
+
+    The fractions are the share of the task for each resource.  The result
+    is cached, hence immutable.
+
+    Raises
+    ------
+    ValueError
+        If a fraction cannot be parsed, or if they add up to zero.
+    """
+    # There might be multiple assignee.  Those are separated with ';'
+    assigned_resources = assigned_string.split(';')
+
+    # separate the allocation fraction information from the name.
+    resources = []
+    total_fraction = 0.
+    for assignee in assigned_resources:
+        if '{' in assignee:
+            (name, fracstring) = assignee.split('{', 1)
+            match = _ASSIGNED_FRACTION.search(fracstring)
+            if match is None:
+                raise ValueError('Invalid assignment: %s' % assignee)
+            f_of_f = match.groups()
+            # OmniPlan 2 says '80% of 80%', OmniPlan 3 '80% out of 80%'.
+            # the omniplan string says eg. 80% out of 80% but it means 80% FTE
+            #  not 80% out of 0.8 FTE, or 64%.  The proof is that one cannot say
+            #  in omniplan to assign 100% out of 80%.
+            #
+            # TODO why am I dividing by 10000?
+            fraction = float(f_of_f[0]) / 10000.
+        else:
+            name = assignee
+            fraction = float(100.) / 10000.
+        total_fraction += fraction
+        name = name.strip()
+        resources.append((name, fraction))
+    if total_fraction <= 0.:
+        raise ValueError('Assignment without effort: %s' % assigned_string)
+    # fraction is global, but we want fraction of this task only
+    return tuple((name, fraction / total_fraction)
+                 for (name, fraction) in resources)
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_assigned_ids(assigned_string):
+    """
+    Parse the Assigned cell into the tuple of (name, fraction) and the
+    same with the names encoded to their ids in alloctable.RESOURCES.
+
+    Each distinct cell is parsed and encoded once: the rows assigned the
+    same way share the same tuples.  The cell is parsed bypassing the
+    parse_assigned cache, this one holds the result already.
+    """
+    assigned = parse_assigned.__wrapped__(assigned_string)
+    return (assigned, RESOURCES.encode(assigned))
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_effort(effort_string):
+    """
+    Parse an effort string, eg. '3w 4d 6h 35m 54s', into hours.
+
+    Raises
+    ------
+    ValueError
+        If a token is not a number and a unit, or if a unit is unknown.
+    """
+    effort = 0.
+    for token in effort_string.split():
+        match = _EFFORT_TOKEN.fullmatch(token)
+        if match is None:
+            raise ValueError('Invalid effort: %s' % effort_string)
+        (effort_str, mult_id) = match.groups()
+        try:
+            effort += float(effort_str) * _EFFORT_MULTIPLICATOR[mult_id]
+        except KeyError:
+            raise ValueError('Unknown effort unit %s: %s' %
+                             (mult_id, effort_string))
+        except ValueError:
+            raise ValueError('Invalid effort: %s' % effort_string)
+    return effort
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_date(date_string):
+    """
+    Parse the date part of a Start or End cell.
+    """
+    # OmniPlan 3: '6/5/17, 08:00', OmniPlan 2: '12/5/14 8:00 AM'
+    date_only = date_string.split(',')[0].split()[0]
+    # Fast path for m/d/yy, strptime for anything else.
+    try:
+        (month, day, year) = date_only.split('/')
+        if len(year) == 2:
+            # Same pivot as strptime's %y.
+            year = int(year)
+            year += 2000 if year < 69 else 1900
+            return date(year, int(month), int(day))
+    except ValueError:
+        pass
+    the_date = datetime.strptime(date_only, "%m/%d/%y").date()
+    return the_date
+
+def parser_cache_info():
+    """
+    Hits and misses of the parser caches, for tuning PARSER_CACHE_SIZE.
+
+    Returns
+    -------
+    dict
+        functools CacheInfo of each parser, keyed on the parser name.
+    """
+    return dict((parser.__name__, parser.cache_info())
+                for parser in (parse_assigned, parse_assigned_ids,
+                               parse_effort, parse_date))
+
+def clear_parser_caches():
+    """
+    Empty the parser caches and reset their counters.
+    """
+    for parser in (parse_assigned, parse_assigned_ids, parse_effort,
+                   parse_date):
+        parser.cache_clear()
+
+def percent_to_float(s):
+    return float(s.strip('%'))/100.
@@ -0,0 +1,243 @@
+"""
+Streaming reader for OmniPlan documents.
+
+The tasks and resource assignments are read straight from the
+'Actual.xml' of an .oplx bundle with `xml.etree.ElementTree.iterparse`,
+without building the whole document tree nor exporting to CSV.  Elements
+are cleared as soon as they are processed.
+
+The document does not store the scheduled dates, only the project start,
+the efforts, the assignments and the prerequisites.  The dates are
+therefore computed here: a task lasts its effort divided by its assigned
+units, in 8-hour business days, and starts at the project start or as
+its prerequisites allow (FS, SS, FF, SF).  Holidays, lags and constraints
+are not considered.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import os
+from datetime import datetime
+import xml.etree.ElementTree as ElementTree
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.bizdays import add_business_days
+
+HOURS_PER_DAY = 8.
+
+SCENARIO_FILE = 'Actual.xml'
+
+
+def is_document(inputfile):
+    """
+    Whether inputfile is an OmniPlan document rather than a CSV export.
+    """
+    return inputfile.rstrip(os.sep).endswith('.oplx') or \
+        inputfile.endswith('.xml')
+
+
+def scenario_file(inputfile):
+    """
+    The XML file holding the tasks, given the .oplx bundle or the XML file.
+    """
+    if os.path.isdir(inputfile):
+        return os.path.join(inputfile, SCENARIO_FILE)
+    return inputfile
+
+
+def _localname(tag):
+    # Drop the OmniPlan namespace, eg. '{http://...OmniPlan/v2}task'.
+    return tag.rsplit('}', 1)[-1]
+
+
+class _Task(object):
+    """
+    What is needed of a task element to schedule and allocate it.
+    """
+    __slots__ = ('id', 'group', 'effort', 'assignments', 'prerequisites',
+                 'children', 'completion')
+
+    def __init__(self, elem):
+        self.id = elem.get('id')
+        self.group = False
+        self.effort = 0.
+        self.assignments = []
+        self.prerequisites = []
+        self.children = []
+        self.completion = 0.
+        for child in elem:
+            tag = _localname(child.tag)
+            if tag == 'type':
+                self.group = child.text == 'group'
+            elif tag == 'effort':
+                self.effort = float(child.text) / 3600.
+            elif tag == 'assignment':
+                self.assignments.append((child.get('idref'),
+                                         float(child.get('units', 1.))))
+            elif tag == 'prerequisite-task':
+                self.prerequisites.append((child.get('idref'),
+                                           child.get('kind', 'FS')))
+            elif tag == 'child-task':
+                self.children.append(child.get('idref'))
+            elif tag == 'percent-complete':
+                # Optional, as a fraction.  Absent tasks are not started.
+                self.completion = float(child.text)
+
+    def dependencies(self):
+        """
+        Ids of the tasks that must be scheduled first.
+        """
+        return [idref for (idref, _) in self.prerequisites] + self.children
+
+    def duration(self):
+        """
+        Duration in work hours.
+        """
+        units = sum(units for (_, units) in self.assignments)
+        if units > 0:
+            return self.effort / units
+        return self.effort
+
+
+class _Scheduler(object):
+    """
+    Forward pass scheduling, in work hours from the project start.
+
+    Tasks are added as they are read.  Those whose dependencies are not
+    scheduled yet wait, and are released when the dependencies are.
+    """
+
+    def __init__(self):
+        self.times = {}      # task id: (start, finish)
+        self.waiting = {}    # task id: tasks waiting on it
+        self.missing = {}    # task: number of unscheduled dependencies
+
+    def add(self, task):
+        """
+        Schedule the task if possible.
+
+        Returns
+        -------
+        list of _Task
+            The tasks scheduled, the task itself and the ones it released.
+        """
+        missing = [idref for idref in task.dependencies()
+                   if idref not in self.times]
+        if missing:
+            self.missing[task] = len(missing)
+            for idref in missing:
+                self.waiting.setdefault(idref, []).append(task)
+            return []
+
+        scheduled = []
+        ready = [task]
+        while ready:
+            task = ready.pop()
+            self.times[task.id] = self._times(task)
+            scheduled.append(task)
+            for waiting in self.waiting.pop(task.id, []):
+                self.missing[waiting] -= 1
+                if not self.missing[waiting]:
+                    del self.missing[waiting]
+                    ready.append(waiting)
+        return scheduled
+
+    def _times(self, task):
+        if task.group:
+            if not task.children:
+                return (0., 0.)
+            return (min(self.times[idref][0] for idref in task.children),
+                    max(self.times[idref][1] for idref in task.children))
+        duration = task.duration()
+        start = 0.
+        for (idref, kind) in task.prerequisites:
+            (pre_start, pre_finish) = self.times[idref]
+            if kind == 'SS':
+                start = max(start, pre_start)
+            elif kind == 'FF':
+                start = max(start, pre_finish - duration)
+            elif kind == 'SF':
+                start = max(start, pre_start - duration)
+            else:
+                start = max(start, pre_finish)
+        return (start, start + duration)
+
+
+def _work_hours_to_dates(start_date, start, finish):
+    # Business day of the start and of the finish of a task.  A finish
+    # right at the end of a day belongs to that day.
+    start_day = int(start // HOURS_PER_DAY)
+    finish_day = max(int(-(-finish // HOURS_PER_DAY)) - 1, start_day)
+    return (add_business_days(start_date, start_day),
+            add_business_days(start_date, finish_day))
+
+
+def iter_document_records(inputfile):
+    """
+    Stream the TaskRecords of an OmniPlan document.
+
+    Parameters
+    ----------
+    inputfile : str
+        The .oplx bundle, or its Actual.xml.
+
+    Returns
+    -------
+    generator of TaskRecord
+        One per task, group tasks excluded, in scheduling order.
+
+    Raises
+    ------
+    ValueError
+        If some prerequisites cannot be resolved.
+    """
+    resources = {}
+    scheduler = _Scheduler()
+    start_date = None
+    depth = 0
+    root = None
+    for (event, elem) in ElementTree.iterparse(scenario_file(inputfile),
+                                               events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            # Inside a top-level element, eg. the prototype tasks; it will
+            # be processed, or ignored, as a whole.
+            continue
+
+        tag = _localname(elem.tag)
+        if tag == 'start-date':
+            start_date = datetime.strptime(elem.text[:10], '%Y-%m-%d').date()
+        elif tag == 'resource':
+            for child in elem:
+                if _localname(child.tag) == 'name':
+                    resources[elem.get('id')] = child.text
+        elif tag == 'task':
+            for task in scheduler.add(_Task(elem)):
+                if task.group:
+                    continue
+                (start, finish) = scheduler.times[task.id]
+                (task_start, task_end) = _work_hours_to_dates(start_date,
+                                                              start, finish)
+                total_units = sum(units for (_, units) in task.assignments)
+                if total_units <= 0:
+                    # Unspecified units, split evenly.
+                    total_units = len(task.assignments)
+                    task.assignments = [(idref, 1.)
+                                        for (idref, _) in task.assignments]
+                assigned = tuple((resources.get(idref, idref),
+                                  units / total_units)
+                                 for (idref, units) in task.assignments)
+                yield omniplan.TaskRecord(assigned, task.effort, task_start,
+                                          task_end, task.completion)
+        root.clear()
+
+    if scheduler.missing:
+        raise ValueError('Unresolved prerequisites in %s: %s' %
+                         (inputfile, ', '.join(sorted(
+                             task.id for task in scheduler.missing))))
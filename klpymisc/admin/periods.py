@@ -0,0 +1,252 @@
+"""
+Allocation over weeks, months and quarters in a single pass.
+
+A PeriodIndex maps each day of the plan span to its week, month and
+quarter bucket, and keeps a running count of the business days.  The
+business days of any task within any bucket are then two lookups away,
+and one pass over the tasks fills the allocations at every requested
+granularity.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+from array import array
+from datetime import date, timedelta
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import GRANULARITIES, AllocationTable, \
+    period_index
+
+
+def period_start(day, granularity):
+    """
+    First day of the week (Monday), month or quarter the day falls in.
+    """
+    if granularity == 'week':
+        return day - timedelta(day.weekday())
+    if granularity == 'month':
+        return date(day.year, day.month, 1)
+    if granularity == 'quarter':
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    raise ValueError('Unknown granularity: %s' % granularity)
+
+
+def next_period_start(day, granularity):
+    """
+    First day of the period following the one starting on day.
+    """
+    if granularity == 'week':
+        return day + timedelta(7)
+    months = 1 if granularity == 'month' else 3
+    (year, month) = divmod(day.month - 1 + months, 12)
+    return date(day.year + year, month + 1, 1)
+
+
+def period_starts(earliest, latest, granularity):
+    """
+    The periods from the one of earliest to the one of latest, included.
+    """
+    periods = []
+    day = period_start(earliest, granularity)
+    while day <= latest:
+        periods.append(day)
+        day = next_period_start(day, granularity)
+    return periods
+
+
+def period_label(day, granularity):
+    """
+    Column header of a period, eg. '2018-W06', 'February2018', '2018Q1'.
+    """
+    if granularity == 'week':
+        (year, week, _) = day.isocalendar()
+        return '%d-W%02d' % (year, week)
+    if granularity == 'quarter':
+        return '%dQ%d' % (day.year, (day.month - 1) // 3 + 1)
+    return day.strftime("%B%Y")
+
+
+class PeriodIndex(object):
+    """
+    Day to period bucket mapping over the plan span.
+
+    Parameters
+    ----------
+    granularities : sequence of str
+        Any of 'week', 'month', 'quarter'.
+    calendar : bizdays.BusinessCalendar, optional
+        Default is the calendar of the omniplan module.
+
+    Attributes
+    ----------
+    origin : int
+        Ordinal of day 0 of the index.
+    bizdays : array
+        Number of business days before each day; one more entry than
+        there are days.
+    buckets : dict
+        For each granularity, the bucket id of each day.
+    bucket_first : dict
+        For each granularity, the day index where each bucket starts,
+        plus the end of the index.
+    bucket_dates : dict
+        For each granularity, the first date of each bucket.
+    bucket_periods : dict
+        For each granularity, the AllocationTable column of each bucket.
+
+    Methods
+    -------
+    cover(first_day, last_day)
+        Extend the index to include the dates.
+
+    Notes
+    -----
+    The index grows as needed, a year at a time on the side that needs
+    it, so the span does not have to be known in advance.
+    """
+
+    def __init__(self, granularities=GRANULARITIES, calendar=None):
+        self.granularities = tuple(granularities)
+        for granularity in self.granularities:
+            if granularity not in GRANULARITIES:
+                raise ValueError('Unknown granularity: %s' % granularity)
+        self.calendar = calendar
+        self.origin = None
+        self.ndays = 0
+        self.bizdays = array('l')
+        self.buckets = {}
+        self.bucket_first = {}
+        self.bucket_dates = {}
+        self.bucket_periods = {}
+
+    def cover(self, first_day, last_day):
+        """
+        Extend the index, if needed, to include first_day to last_day.
+        """
+        first = first_day.toordinal()
+        last = last_day.toordinal()
+        if self.origin is not None and first >= self.origin and \
+                last < self.origin + self.ndays:
+            return
+        if self.origin is not None:
+            first = min(first, self.origin)
+            last = max(last, self.origin + self.ndays - 1)
+        # Pad, and start on a Monday at a quarter start or before, so that
+        # the first bucket of every granularity is complete.
+        start = period_start(date.fromordinal(first - 365), 'quarter')
+        start = period_start(start, 'week')
+        self._build(start, date.fromordinal(last + 365))
+
+    def _build(self, start, end):
+        calendar = self.calendar or omniplan.BUSINESS_CALENDAR
+        holidays = set(calendar.holidays)
+        self.origin = start.toordinal()
+        self.ndays = end.toordinal() - self.origin + 1
+
+        bizdays = array('l', [0])
+        count = 0
+        for ordinal in range(self.origin, self.origin + self.ndays):
+            # Ordinal 1 is a Monday.
+            if (ordinal - 1) % 7 < 5 and ordinal not in holidays:
+                count += 1
+            bizdays.append(count)
+        self.bizdays = bizdays
+
+        for granularity in self.granularities:
+            buckets = array('l')
+            firsts = []
+            dates = []
+            day = start
+            while day <= end:
+                following = next_period_start(period_start(day, granularity),
+                                              granularity)
+                nbucket_days = min(following, end + timedelta(1)) - day
+                firsts.append(day.toordinal() - self.origin)
+                dates.append(period_start(day, granularity))
+                buckets.extend([len(dates) - 1] * nbucket_days.days)
+                day = following
+            firsts.append(self.ndays)
+            self.buckets[granularity] = buckets
+            self.bucket_first[granularity] = firsts
+            self.bucket_dates[granularity] = dates
+            self.bucket_periods[granularity] = \
+                [period_index(day, granularity) for day in dates]
+
+    def add_task(self, allocations, record):
+        """
+        Add the effort left on one task to the allocations of every
+        granularity.
+
+        Parameters
+        ----------
+        allocations : dict
+            The AllocationTable of each granularity.
+        record : TaskRecord
+        """
+        self.cover(record.start, record.end)
+        start = record.start.toordinal() - self.origin
+        end = record.end.toordinal() - self.origin
+        bizdays = self.bizdays
+        ndays = bizdays[end + 1] - bizdays[start]
+        effort_left = (1 - record.completion) * record.effort
+
+        for granularity in self.granularities:
+            table = allocations.get(granularity)
+            if table is None:
+                table = allocations[granularity] = \
+                    AllocationTable(granularity)
+            resources = [(table.dictionary_row(resource), frac)
+                         for (resource, frac) in record.resources]
+            buckets = self.buckets[granularity]
+            periods = self.bucket_periods[granularity]
+            first_bucket = buckets[start]
+            last_bucket = buckets[end]
+
+            if first_bucket == last_bucket or ndays == 0:
+                # Effort contained within one period, or nothing to
+                # pro-rate on.
+                for (resource_id, frac) in resources:
+                    table.add(resource_id, periods[first_bucket],
+                              effort_left * frac)
+                continue
+
+            # The completed hours are taken from the start of the task,
+            # the effort left is what remains in each period.
+            effort_per_day = record.effort / ndays
+            hours_completed = record.completion * record.effort
+            firsts = self.bucket_first[granularity]
+            for bucket in range(first_bucket, last_bucket + 1):
+                low = max(start, firsts[bucket])
+                high = min(end, firsts[bucket + 1] - 1)
+                days = bizdays[high + 1] - bizdays[low]
+                days_after = bizdays[high + 1] - bizdays[start]
+                hours_left = min(max(effort_per_day * days_after -
+                                     hours_completed, 0.),
+                                 effort_per_day * days)
+                for (resource_id, frac) in resources:
+                    table.add(resource_id, periods[bucket],
+                              hours_left * frac)
+
+
+def calculate_period_allocation(records, granularities=GRANULARITIES):
+    """
+    Allocations at several granularities in one pass over the records.
+
+    Parameters
+    ----------
+    records : iterable of TaskRecord
+    granularities : sequence of str
+        Any of 'week', 'month', 'quarter'.
+
+    Returns
+    -------
+    dict
+        The AllocationTable of each granularity.
+    """
+    index = PeriodIndex(granularities)
+    allocations = dict((granularity, AllocationTable(granularity))
+                       for granularity in granularities)
+    for record in omniplan.active_records(records):
+        index.add_task(allocations, record)
+    return allocations
@@ -0,0 +1,313 @@
+"""
+What-if scenarios over the allocations of a plan.
+
+A batch of scenarios perturbs the tasks of the plan: their dates are
+shifted, their effort scaled, their completion overridden.  Rather than
+allocating every scenario with `omniplan.calculate_allocation`, each
+(scenario, task) is made a task of its own, and each (scenario,
+resource) a resource of its own, so that the whole batch is allocated in
+a single vectorized pass of `numpyengine.allocate`.  The result is a
+scenarios x resources x months cube, summarized with percentile bands
+for each resource.
+
+For example, every task slipping two weeks, or being 20% less complete:
+
+    columns = numpyengine.TaskColumns(records)
+    batch = Perturbations(len(columns), shift=[0, 14, 0],
+                          completion=[np.nan, np.nan, np.nan])
+    batch.completion[2] = 0.8 * columns.completion
+    cube = evaluate(columns, batch)
+
+or a Monte Carlo spread of the monthly load:
+
+    cube = evaluate(columns, monte_carlo(len(columns), 500, shift_sd=10,
+                                         multiplier_sd=0.2, seed=1))
+    cube.write_bands('bands.csv')
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+from datetime import date
+from io import open
+
+import numpy as np
+
+from klpymisc.admin import numpyengine
+from klpymisc.admin.alloctable import AllocationTable, period_index
+
+# Default percentiles of the bands.
+BANDS = (10, 50, 90)
+
+
+def _per_task(values, dtype, name):
+    # Scalar: all the scenarios and tasks.  1-D: one value per scenario.
+    # 2-D: scenarios x tasks.
+    values = np.asarray(values, dtype=dtype)
+    if values.ndim > 2:
+        raise ValueError('%s: expected at most 2 dimensions, got %d' %
+                         (name, values.ndim))
+    return values.reshape(values.shape + (1,) * (2 - values.ndim)) \
+        if values.ndim < 2 else values
+
+
+class Perturbations(object):
+    """
+    A batch of scenarios, each perturbing every task of a plan.
+
+    Parameters
+    ----------
+    ntasks : int
+        Number of tasks of the plan, as in `numpyengine.TaskColumns`.
+    shift : array-like of int
+        Days the start and end of the tasks are moved by.
+    multiplier : array-like of float
+        Factor applied to the effort of the tasks.
+    completion : array-like of float, optional
+        Completion fraction replacing the one of the tasks; NaN keeps
+        the task's own.  Default is to keep them all.
+    names : list of str, optional
+        Names of the scenarios.  Default is their number.
+
+    Each perturbation is a scalar, the same for all scenarios and tasks;
+    1-D, one value per scenario; or 2-D, scenarios x tasks.  The number
+    of scenarios is the one of the perturbations that are not scalars,
+    one if they all are.
+
+    Attributes
+    ----------
+    shift : numpy.ndarray of int, scenarios x tasks
+    multiplier : numpy.ndarray of float, scenarios x tasks
+    completion : numpy.ndarray of float, scenarios x tasks
+    names : list of str
+
+    Raises
+    ------
+    ValueError
+        If the shapes do not match the tasks or one another.
+    """
+
+    def __init__(self, ntasks, shift=0, multiplier=1., completion=None,
+                 names=None):
+        if completion is None:
+            completion = np.nan
+        arrays = (_per_task(shift, np.int64, 'shift'),
+                  _per_task(multiplier, float, 'multiplier'),
+                  _per_task(completion, float, 'completion'),
+                  np.empty((1, ntasks)))
+        try:
+            (self.shift, self.multiplier, self.completion, _) = \
+                [np.array(array) for array in np.broadcast_arrays(*arrays)]
+        except ValueError:
+            raise ValueError('Perturbations of shapes %s do not match %d '
+                             'tasks' % (', '.join(str(array.shape)
+                                                  for array in arrays[:3]),
+                                        ntasks))
+        if names is None:
+            names = [str(number) for number in range(len(self))]
+        if len(names) != len(self):
+            raise ValueError('%d names for %d scenarios' %
+                             (len(names), len(self)))
+        self.names = list(names)
+
+    def __len__(self):
+        return self.shift.shape[0]
+
+
+def monte_carlo(ntasks, nscenarios, shift_sd=0., multiplier_sd=0.,
+                seed=None):
+    """
+    Random perturbations of every task, independent from task to task.
+
+    Parameters
+    ----------
+    ntasks : int
+    nscenarios : int
+    shift_sd : float
+        Standard deviation of the shifts, in days.  The shifts are
+        normal, rounded to the day.
+    multiplier_sd : float
+        Standard deviation of the log of the effort multipliers, which
+        are log-normal, so that the effort stays positive.
+    seed : int, optional
+        Seed of the generator, for repeatable batches.
+
+    Returns
+    -------
+    Perturbations
+    """
+    rng = np.random.default_rng(seed)
+    shape = (nscenarios, ntasks)
+    return Perturbations(
+        ntasks,
+        shift=np.rint(rng.normal(0., shift_sd, shape)).astype(np.int64),
+        multiplier=np.exp(rng.normal(0., multiplier_sd, shape)))
+
+
+def stack_scenarios(columns, perturbations):
+    """
+    The perturbed tasks of all the scenarios as one set of columns.
+
+    Task t of scenario s is task s * ntasks + t, resource r of scenario
+    s is resource s * nresources + r.
+
+    Parameters
+    ----------
+    columns : numpyengine.TaskColumns
+    perturbations : Perturbations
+
+    Returns
+    -------
+    numpyengine.TaskColumns
+    """
+    nscenarios = len(perturbations)
+    ntasks = len(columns)
+    nresources = len(columns.resources)
+    shift = perturbations.shift.astype('timedelta64[D]')
+    completion = np.where(np.isnan(perturbations.completion),
+                          columns.completion, perturbations.completion)
+    scenario = np.arange(nscenarios)[:, np.newaxis]
+    return numpyengine.TaskColumns.from_arrays(
+        (columns.start + shift).ravel(),
+        (columns.end + shift).ravel(),
+        (columns.effort * perturbations.multiplier).ravel(),
+        np.clip(completion, 0., 1.).ravel(),
+        columns.resources * nscenarios,
+        (scenario * ntasks + columns.assign_task).ravel(),
+        (scenario * nresources + columns.assign_resource).ravel(),
+        np.tile(columns.assign_fraction, nscenarios))
+
+
+def evaluate(columns, perturbations, busdaycal=None):
+    """
+    Allocate all the scenarios in one pass.
+
+    Parameters
+    ----------
+    columns : numpyengine.TaskColumns
+        The tasks of the plan.  Tasks already completed or not assigned
+        are not in the columns, and not in the scenarios either.
+    perturbations : Perturbations
+    busdaycal : numpy.busdaycalendar, optional
+        Business day calendar.  Default is the holiday calendar
+        currently set in the omniplan module.
+
+    Returns
+    -------
+    ScenarioCube
+    """
+    if perturbations.shift.shape[1] != len(columns):
+        raise ValueError('Perturbations of %d tasks for a plan of %d' %
+                         (perturbations.shift.shape[1], len(columns)))
+    (months, allocation, assigned) = numpyengine.allocate(
+        stack_scenarios(columns, perturbations), busdaycal)
+    shape = (len(perturbations), len(columns.resources), len(months))
+    return ScenarioCube(perturbations.names, columns.resources, months,
+                        allocation.reshape(shape), assigned.reshape(shape))
+
+
+def what_if(records, shift=0, multiplier=1., completion=None, names=None):
+    """
+    Allocate the records under a batch of scenarios.
+
+    The perturbations are those of `Perturbations`, over the active
+    records, in order.
+
+    Returns
+    -------
+    ScenarioCube
+    """
+    columns = numpyengine.TaskColumns(records)
+    return evaluate(columns, Perturbations(len(columns), shift, multiplier,
+                                           completion, names))
+
+
+class ScenarioCube(object):
+    """
+    Allocations of a batch of scenarios.
+
+    Attributes
+    ----------
+    names : list of str
+        Names of the scenarios.
+    resources : list of str
+        Resource names, in the order of the columns.
+    months : numpy.ndarray of datetime64[M]
+        The months spanned by any of the scenarios.
+    hours : numpy.ndarray of float, scenarios x resources x months
+        Effort left of each resource in each month of each scenario.
+    assigned : numpy.ndarray of bool, scenarios x resources x months
+        Whether any task of the resource spans the month.
+
+    Methods
+    -------
+    scenario(index)
+        Allocations of one scenario.
+    totals()
+        Hours of each resource over all the months, in each scenario.
+    percentiles(q)
+        Percentiles of the monthly hours across the scenarios.
+    write_bands(outputfile, q)
+        Write the percentile bands of each resource as CSV.
+    """
+
+    def __init__(self, names, resources, months, hours, assigned):
+        self.names = names
+        self.resources = resources
+        self.months = months
+        self.hours = hours
+        self.assigned = assigned
+
+    def __len__(self):
+        return len(self.names)
+
+    def scenario(self, index):
+        """
+        The AllocationTable of one scenario, by number or name.
+        """
+        if not isinstance(index, (int, np.integer)):
+            index = self.names.index(index)
+        allocations = AllocationTable()
+        if len(self.months):
+            allocations.add_rows(self.resources,
+                                 period_index(self.months[0].astype(date)),
+                                 self.hours[index], self.assigned[index])
+        return allocations
+
+    def totals(self):
+        """
+        Hours of each resource, scenarios x resources.
+        """
+        return self.hours.sum(axis=2)
+
+    def percentiles(self, q=BANDS):
+        """
+        Percentiles of the hours of each resource and month across the
+        scenarios.
+
+        Returns
+        -------
+        numpy.ndarray of float, percentiles x resources x months
+        """
+        return np.percentile(self.hours, q, axis=0)
+
+    def write_bands(self, outputfile, q=BANDS):
+        """
+        Write the percentile bands as CSV, one row per resource and
+        percentile, one column per month, as `omniplan.write_allocations`.
+        """
+        bands = self.percentiles(q)
+        header = ['Resource', 'Percentile']
+        header.extend(month.astype(date).strftime('%B%Y')
+                      for month in self.months)
+        rows = []
+        for (row, resource) in sorted(enumerate(self.resources),
+                                      key=lambda item: item[1]):
+            for (band, percentile) in enumerate(q):
+                rows.append([resource, '%g' % percentile] +
+                            ['%f' % hours for hours in bands[band, row]])
+        with open(outputfile, mode='w', encoding='utf-8') as filehandle:
+            writer = csv.writer(filehandle)
+            writer.writerow(header)
+            writer.writerows(rows)
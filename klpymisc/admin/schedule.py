@@ -0,0 +1,384 @@
+"""
+Schedule propagation along the task dependencies of an export.
+
+The Prerequisites column of the exports, eg. "1.3SF, 1.1", lists the
+tasks, by WBS number, a task depends on, with the kind of dependency:
+finish-to-start, the default, start-to-start, finish-to-finish or
+start-to-finish, and an optional lag, eg. "2.1FS+2d".  The Schedule
+builds the task graph once, in topological order, and moves the tasks
+when others slip or take longer, without a re-export:
+
+    plan = read_schedule('plan.csv')
+    plan.update(slips={'2.2.1': 10})
+    allocations = omniplan.calculate_allocation(plan.records())
+
+A full propagation visits every task and dependency once, in
+topological order.  An update only visits the tasks downstream of the
+ones changed, in topological order, and stops where the dates do not
+move.
+
+The dates are counted in business days, `bizdays.business_day_index`,
+holidays not considered, and at the granularity of the day: a task can
+start the day its finish-to-start prerequisite ends, as the milestones
+of the exports do.  The exported dates are the earliest: the
+dependencies only ever push a task later, so that the plan as exported
+is left as it is.  A split task, several rows with the same WBS number,
+moves as a whole.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import heapq
+import re
+from io import open
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.bizdays import business_day_date, business_day_index
+
+DEPENDENCY_KINDS = ('FS', 'SS', 'FF', 'SF')
+
+# Working hours in a day, to convert the lags to business days.
+HOURS_PER_DAY = 8.
+
+_PREREQUISITE = re.compile(r'^(\S+?)(FS|SS|FF|SF)?(?:\s*([+-])\s*(\S.*))?$')
+
+
+def parse_prerequisites(prerequisites_string):
+    """
+    Parse the Prerequisites cell.
+
+    Returns
+    -------
+    tuple of (str, str, int)
+        WBS number, kind of dependency and lag in business days of each
+        prerequisite.
+
+    Raises
+    ------
+    ValueError
+        If a prerequisite cannot be parsed.
+    """
+    prerequisites = []
+    for prerequisite in prerequisites_string.split(','):
+        prerequisite = prerequisite.strip()
+        if not prerequisite:
+            continue
+        match = _PREREQUISITE.match(prerequisite)
+        if match is None:
+            raise ValueError('Invalid prerequisite: %s' % prerequisite)
+        (wbs, kind, sign, lag) = match.groups()
+        days = 0
+        if lag:
+            days = int(round(omniplan.parse_effort(lag) / HOURS_PER_DAY))
+            if sign == '-':
+                days = -days
+        prerequisites.append((wbs, kind or 'FS', days))
+    return tuple(prerequisites)
+
+
+def iter_schedule_rows(inputfile):
+    """
+    Stream the WBS number, the prerequisites and the TaskRecord of each
+    row of a CSV export.
+
+    Raises
+    ------
+    ValueError
+        If the export has no WBS Number or Prerequisites column.
+    """
+    with open(inputfile, encoding='utf-8') as filehandle:
+        reader = csv.reader(filehandle)
+        header = next(reader)
+        columns = omniplan.resolve_columns(header)
+        for name in ('WBS Number', 'Prerequisites'):
+            if name not in header:
+                raise ValueError('File %s has no %s column' %
+                                 (inputfile, name))
+        wbs_column = header.index('WBS Number')
+        prerequisites_column = header.index('Prerequisites')
+        for row in reader:
+            yield (row[wbs_column], row[prerequisites_column],
+                   omniplan.TaskRecord.from_row(row, columns))
+
+
+def read_schedule(inputfile):
+    """
+    The Schedule of a CSV export.
+    """
+    return Schedule(iter_schedule_rows(inputfile))
+
+
+class Schedule(object):
+    """
+    Task graph of a plan, and the dates of its tasks.
+
+    Parameters
+    ----------
+    rows : iterable of (str, str, TaskRecord)
+        WBS number, Prerequisites cell and record of each row, as from
+        iter_schedule_rows().
+
+    Attributes
+    ----------
+    tasks : list of str
+        WBS number of each task, the nodes of the graph.  Rows without
+        dates, eg. group tasks, are not tasks.
+    predecessors : list of list of (int, str, int)
+        The prerequisites of each task: task, kind of dependency, lag.
+    successors : list of list of int
+        The tasks depending on each task.
+    order : list of int
+        The tasks in topological order.
+    slips : list of int
+        Business days each task is delayed by on its own.
+    extensions : list of int
+        Business days added to the duration of each task.
+    shifts : list of int
+        Business days each task is moved by, slip and dependencies
+        included.
+    missing : list of (str, str)
+        The prerequisites, (task, prerequisite), not found in the export.
+    visited : int
+        Number of tasks visited by the last propagation.
+
+    Methods
+    -------
+    update(slips, extensions)
+        Change tasks and move the tasks depending on them.
+    dates(wbs)
+        Start and end of a task.
+    records()
+        TaskRecords of the rows, with the dates propagated.
+
+    Raises
+    ------
+    ValueError
+        If the dependencies have a cycle.
+    """
+
+    def __init__(self, rows):
+        self._records = []
+        self._segments = []
+        self._start = []
+        self._end = []
+        self.tasks = []
+        task_ids = {}
+        prerequisites = []
+        for (wbs, prerequisites_string, record) in rows:
+            self._records.append(record)
+            if record.start is None or record.end is None:
+                continue
+            task = task_ids.get(wbs) if wbs else None
+            if task is None:
+                task = len(self.tasks)
+                if wbs:
+                    task_ids[wbs] = task
+                self.tasks.append(wbs)
+                self._segments.append([])
+                self._start.append(business_day_index(record.start))
+                self._end.append(business_day_index(record.end))
+                prerequisites.append(prerequisites_string)
+            self._segments[task].append(len(self._records) - 1)
+            self._start[task] = min(self._start[task],
+                                    business_day_index(record.start))
+            self._end[task] = max(self._end[task],
+                                  business_day_index(record.end))
+        self._task_ids = task_ids
+
+        ntasks = len(self.tasks)
+        self.predecessors = [[] for _ in range(ntasks)]
+        self.successors = [[] for _ in range(ntasks)]
+        self.missing = []
+        for (task, prerequisites_string) in enumerate(prerequisites):
+            for (wbs, kind, lag) in \
+                    parse_prerequisites(prerequisites_string):
+                other = task_ids.get(wbs)
+                if other is None:
+                    self.missing.append((self.tasks[task], wbs))
+                    continue
+                self.predecessors[task].append((other, kind, lag))
+                self.successors[other].append(task)
+
+        self.order = self._topological_order()
+        self._rank = [0] * ntasks
+        for (rank, task) in enumerate(self.order):
+            self._rank[task] = rank
+        self.slips = [0] * ntasks
+        self.extensions = [0] * ntasks
+        self.shifts = [0] * ntasks
+        self._moved = {}
+        self.visited = 0
+        self.propagate()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def _topological_order(self):
+        # Kahn's algorithm.
+        indegree = [len(predecessors) for predecessors in self.predecessors]
+        order = [task for (task, degree) in enumerate(indegree)
+                 if degree == 0]
+        for task in order:
+            for successor in self.successors[task]:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    order.append(successor)
+        if len(order) < len(self.tasks):
+            cycle = sorted(self.tasks[task]
+                           for (task, degree) in enumerate(indegree)
+                           if degree > 0)
+            raise ValueError('Dependency cycle among the tasks %s' %
+                             ', '.join(cycle))
+        return order
+
+    def task_id(self, wbs):
+        """
+        Task of a WBS number.
+
+        Raises
+        ------
+        KeyError
+            If there is no such task.
+        """
+        try:
+            return self._task_ids[wbs]
+        except KeyError:
+            raise KeyError('Unknown task: %s' % wbs)
+
+    def _bounds(self, task):
+        # Start and end of a task, in business days.
+        shift = self.shifts[task]
+        return (self._start[task] + shift,
+                self._end[task] + shift + self.extensions[task])
+
+    def _earliest_shift(self, task):
+        # The shift of the task given its slip and its prerequisites.
+        start = self._start[task]
+        duration = self._end[task] + self.extensions[task] - start
+        shift = self.slips[task]
+        for (other, kind, lag) in self.predecessors[task]:
+            (other_start, other_end) = self._bounds(other)
+            if kind == 'FS':
+                earliest = other_end + lag
+            elif kind == 'SS':
+                earliest = other_start + lag
+            elif kind == 'FF':
+                earliest = other_end + lag - duration
+            else:
+                earliest = other_start + lag - duration
+            shift = max(shift, earliest - start)
+        return shift
+
+    def propagate(self):
+        """
+        Compute the dates of all the tasks, in topological order.
+        """
+        for task in self.order:
+            self.shifts[task] = self._earliest_shift(task)
+        self._moved.clear()
+        self.visited = len(self.order)
+
+    def update(self, slips=None, extensions=None):
+        """
+        Change tasks, and move the tasks downstream of them.
+
+        Parameters
+        ----------
+        slips : dict, optional
+            {wbs: business days} each task is delayed by on its own,
+            replacing the previous slip.
+        extensions : dict, optional
+            {wbs: business days} added to the duration of each task,
+            replacing the previous extension.
+
+        Returns
+        -------
+        list of str
+            The tasks whose dates changed.
+
+        Raises
+        ------
+        KeyError
+            If a task is unknown.
+        """
+        slips = dict((self.task_id(wbs), days)
+                     for (wbs, days) in (slips or {}).items())
+        extensions = dict((self.task_id(wbs), days)
+                          for (wbs, days) in (extensions or {}).items())
+        changed = set(slips) | set(extensions)
+        before = dict((task, self._bounds(task)) for task in changed)
+        for (task, days) in slips.items():
+            self.slips[task] = days
+        for (task, days) in extensions.items():
+            self.extensions[task] = days
+
+        # The tasks are visited in topological order, all of their
+        # prerequisites done first; the successors of a task are only
+        # visited if it moved.
+        moved = []
+        heap = [(self._rank[task], task) for task in changed]
+        heapq.heapify(heap)
+        queued = set(changed)
+        self.visited = 0
+        while heap:
+            (_, task) = heapq.heappop(heap)
+            self.visited += 1
+            bounds = before.get(task) or self._bounds(task)
+            self.shifts[task] = self._earliest_shift(task)
+            if self._bounds(task) == bounds:
+                continue
+            self._moved.pop(task, None)
+            moved.append(self.tasks[task])
+            for successor in self.successors[task]:
+                if successor not in queued:
+                    queued.add(successor)
+                    heapq.heappush(heap, (self._rank[successor], successor))
+        return moved
+
+    def dates(self, wbs):
+        """
+        Start and end dates of a task.
+        """
+        (start, end) = self._bounds(self.task_id(wbs))
+        return (business_day_date(start), business_day_date(end))
+
+    def _task_records(self, task):
+        # The records of a task, moved.  The last segment takes the
+        # extension.
+        shift = self.shifts[task]
+        extension = self.extensions[task]
+        segments = self._segments[task]
+        last = max(segments, key=lambda index: self._records[index].end)
+        records = []
+        for index in segments:
+            record = self._records[index]
+            end_shift = shift + (extension if index == last else 0)
+            records.append(omniplan.TaskRecord(
+                record.assigned, record.effort,
+                business_day_date(business_day_index(record.start) + shift),
+                business_day_date(business_day_index(record.end) +
+                                  end_shift),
+                record.completion, record.resources))
+        return records
+
+    def records(self):
+        """
+        The TaskRecords of all the rows, in order, with the dates
+        propagated.
+
+        The records of the tasks that did not move are the exported
+        ones, the same objects, so that a `taskcache.ContributionCache`
+        only recomputes the tasks that moved.
+        """
+        records = list(self._records)
+        for task in range(len(self.tasks)):
+            if not self.shifts[task] and not self.extensions[task]:
+                continue
+            if task not in self._moved:
+                self._moved[task] = self._task_records(task)
+            for (index, record) in zip(self._segments[task],
+                                       self._moved[task]):
+                records[index] = record
+        return records
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import sys
+import argparse
+
+from klpymisc.admin.bizdays import read_holidays
+from klpymisc.admin.omniplan import set_holidays
+from klpymisc.admin.server import serve, DEFAULT_HOST, DEFAULT_PORT, \
+                                  RELOAD_INTERVAL
+
+VERSION = '1.0.0'
+
+SHORT_DESCRIPTION = 'Serve resource allocation queries on localhost, from \
+                     OmniPlan CSV exports or documents'
+
+
+#------------------------------------------------------------------
+# Command-line handling
+
+def parse_args(command_line_args):
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=SHORT_DESCRIPTION)
+    parser.add_argument('inputfiles', type=str, nargs='+',
+                   help='CSV exports or OmniPlan .oplx documents')
+    parser.add_argument('--host', dest='host', type=str,
+                   default=DEFAULT_HOST,
+                   help='Loopback address to listen on [default: %s]' %
+                        DEFAULT_HOST)
+    parser.add_argument('--port', dest='port', type=int,
+                   default=DEFAULT_PORT,
+                   help='Port to listen on [default: %d]' % DEFAULT_PORT)
+    parser.add_argument('--holidays', dest='holidays', type=str,
+                   default=None,
+                   help='File with holiday dates, one YYYY-MM-DD per line')
+    parser.add_argument('--interval', dest='interval', type=float,
+                   default=RELOAD_INTERVAL,
+                   help='Seconds between two looks at the input files '
+                        '[default: %g]' % RELOAD_INTERVAL)
+    parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                   default=False,
+                   help='Toggle verbose on')
+
+    args = parser.parse_args(command_line_args)
+    return args
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    args = parse_args(argv[1:])
+
+    if args.holidays:
+        set_holidays(read_holidays(args.holidays))
+
+    try:
+        serve(args.inputfiles, args.host, args.port, args.interval,
+              args.verbose)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as err:
+        sys.exit(str(err))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,13 +4,11 @@ from __future__ import print_function
 
 import sys
 import argparse
-
-import csv
 from datetime import datetime
-from dateutil import parser
-# from datatime import date
 
-VERSION = '1.0.0'
+from klpymisc.admin.timesheet import TimesheetCheckpoint, read_timecard
+
+VERSION = '1.1.0'
 
 SHORT_DESCRIPTION = 'Convert app cvs to webtimesheet format'
 
@@ -21,8 +19,48 @@ def parse_args(command_line_args):
     parser = argparse.ArgumentParser(description=SHORT_DESCRIPTION)
     parser.add_argument('inputfile', type=str,
                    help='CSV input file')
+    parser.add_argument('-o', '--output', dest='outputfile', type=str,
+                   default=None,
+                   help='Write the category x period totals to this file, '
+                        'CSV unless --format or the extension (.json, .npz) '
+                        'says otherwise, instead of printing the daily '
+                        'totals.  In CSV, with more than one view, the view '
+                        'is appended to the output name')
+    parser.add_argument('--format', dest='format', type=str,
+                   choices=['csv', 'json', 'npz'], default=None,
+                   help='Output format [default: from the extension, csv]')
+    parser.add_argument('--views', dest='views', type=str,
+                   default='day,week,month,payperiod',
+                   help='Comma-separated totals to write, any of day, week, '
+                        'month, payperiod [default: all]')
+    parser.add_argument('--pay-period-origin', dest='pay_period_origin',
+                   type=str, default=None,
+                   help='First day of a pay period, YYYY-MM-DD '
+                        '[default: 2014-01-05]')
+    parser.add_argument('--state', dest='statefile', type=str,
+                   default=None,
+                   help='Keep the running totals in this file; only the '
+                        'rows appended to the export since the last run are '
+                        'read.  The export is read again from the start if '
+                        'it was not only appended to')
+    parser.add_argument('--pay-period-days', dest='pay_period_days',
+                   type=int, default=14,
+                   help='Length of the pay periods, in days [default: 14]')
 
     args = parser.parse_args(command_line_args)
+    args.views = args.views.split(',')
+    for view in args.views:
+        if view not in ('day', 'week', 'month', 'payperiod'):
+            parser.error('unknown view: %s' % view)
+    if args.pay_period_origin is not None:
+        try:
+            args.pay_period_origin = datetime.strptime(
+                args.pay_period_origin, '%Y-%m-%d').date()
+        except ValueError:
+            parser.error('--pay-period-origin expects YYYY-MM-DD, not %s' %
+                         args.pay_period_origin)
+    if args.pay_period_days < 1:
+        parser.error('--pay-period-days must be positive')
 
     return args
 
@@ -32,51 +70,36 @@ def main(argv=None):
 
     args = parse_args(sys.argv[1:])
 
-    table = csv.DictReader(open(args.inputfile))
-    records = []
-    for record in table:
-        records.append(record)
-
-    categories = []
-    for record in records:
-        category = record[' Tag']
-        if category not in categories:
-            categories.append(category)
-
-    # today = date.today()
-    # firstday = today
-    # for record in records:
-    #    starttime = record[' Start time']
-    #    the_date = \
-    #            datetime.strptime(starttime, "%b %d, %Y, %H:%M:%S %Z").date()
-    #    if the_date < firstday:
-    #        firstday = the_date
-
-
-    timecard = {}
-    for category in categories:
-        timecard[category] = {}
-
-    # timecard = { category1 : {date1 : total_duration,
-    #                           date2 : total_duration,
-    #                          },
-    #            }
-
-    for record in records:
-        category = record[' Tag']
-        the_date = parser.parse(record[' Start time']).date()
-        # the_date = datetime.strptime(record[' Start time'], \
-        #                             "%b %d, %Y, %H:%M:%S %Z").date()
-        duration = float(record['Duration in hours'])
-        if the_date in timecard[category]:
-            timecard[category][the_date] += duration
+    # The rows are streamed once, the hours summed per category and day.
+    # timecard.hours = { category1 : {date1 : total_duration,
+    #                                 date2 : total_duration,
+    #                                },
+    #                  }
+    try:
+        if args.statefile:
+            checkpoint = TimesheetCheckpoint(args.statefile)
+            timecard = checkpoint.update(args.inputfile)
+            checkpoint.save()
         else:
-            timecard[category][the_date] = duration
-
-    for category in timecard.keys():
+            timecard = read_timecard(args.inputfile)
+    except ValueError as err:
+        sys.exit(str(err))
+
+    if args.outputfile:
+        # NumPy is slow to import; only needed for the totals.
+        from klpymisc.admin import timepivot
+        pivot = timepivot.TimesheetPivot.from_timecard(timecard)
+        options = {'pay_period_days': args.pay_period_days}
+        if args.pay_period_origin is not None:
+            options['pay_period_origin'] = args.pay_period_origin
+        timepivot.write(pivot, args.outputfile, args.views, args.format,
+                        **options)
+        return
+
+    for category in timecard:
         print(category)
-        for the_date in sorted(timecard[category].keys()):
-            print('   ', the_date, timecard[category][the_date])
+        for (the_date, hours) in timecard.days(category):
+            print('   ', the_date, hours)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,387 @@
+"""
+Local query server over the allocations of one or more plans.
+
+The plans are loaded once and kept up to date with an AllocationWatcher
+each, so that a re-export only costs the tasks that changed.  Their
+merged allocations are indexed with per-resource prefix sums over the
+months: the hours of a resource over any range of months, or the total
+of all the resources, is two lookups and a subtraction.
+
+The HTTP server answers GET requests with JSON, and binds to the
+loopback interface only:
+
+/resources
+    The resource names and the span of the allocations.
+/hours?resource=NAME&start=YYYY-MM&end=YYYY-MM
+    Hours of a resource over the months, start and end included.
+/months?resource=NAME&start=YYYY-MM&end=YYYY-MM
+    Same, month by month.
+/total?start=YYYY-MM&end=YYYY-MM[&resource=NAME,NAME]
+    Hours of all, or some, resources over the months.
+
+start and end default to the span of the allocations.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import ipaddress
+import json
+import socket
+import threading
+from array import array
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from klpymisc.admin.alloctable import AllocationTable, period_date, \
+    period_index
+from klpymisc.admin.watch import READ_ERRORS, AllocationWatcher, file_stamp
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+
+# Seconds between two looks at the plans.
+RELOAD_INTERVAL = 2.
+
+
+class AllocationIndex(object):
+    """
+    Range queries over the monthly allocations.
+
+    Parameters
+    ----------
+    allocations : AllocationTable
+        Monthly allocations.
+
+    Attributes
+    ----------
+    resources : list of str
+        Sorted resource names.
+    first : int
+        Month number of the first month, None if there are no
+        allocations.
+    nmonths : int
+        Number of months of the span.
+    cumulative : dict
+        For each resource, the hours before each month of the span; one
+        more entry than there are months.
+    total_cumulative : array
+        Same for all the resources together.
+
+    Notes
+    -----
+    The months are month numbers from `alloctable.period_index`.  Ranges
+    are clipped to the span.
+    """
+
+    def __init__(self, allocations):
+        self.resources = sorted(allocations)
+        self.first = allocations.first
+        self.nmonths = 0 if self.first is None else \
+            allocations.last - allocations.first + 1
+        self.cumulative = {}
+        self.total_cumulative = array('d', [0.]) * (self.nmonths + 1)
+        for name in self.resources:
+            (hours, _) = allocations.row(name)
+            cumulative = array('d', [0.])
+            running = 0.
+            for effort in hours:
+                running += effort
+                cumulative.append(running)
+            self.cumulative[name] = cumulative
+            for column in range(1, self.nmonths + 1):
+                self.total_cumulative[column] += cumulative[column]
+
+    def span(self):
+        """
+        Month numbers of the first and last months, or None.
+        """
+        if self.first is None:
+            return None
+        return (self.first, self.first + self.nmonths - 1)
+
+    def _columns(self, start, end):
+        # Half-open range of columns of the months start to end included.
+        if self.first is None:
+            return (0, 0)
+        low = 0 if start is None else min(max(start - self.first, 0),
+                                          self.nmonths)
+        high = self.nmonths if end is None else \
+            min(max(end - self.first + 1, 0), self.nmonths)
+        return (low, max(low, high))
+
+    def hours(self, resource, start=None, end=None):
+        """
+        Hours of a resource from month start to month end, included.
+
+        Raises
+        ------
+        KeyError
+            If the resource is unknown.
+        """
+        cumulative = self.cumulative[resource]
+        (low, high) = self._columns(start, end)
+        return cumulative[high] - cumulative[low]
+
+    def months(self, resource, start=None, end=None):
+        """
+        Hours of a resource in each month from start to end, included.
+
+        Returns
+        -------
+        list of (int, float)
+            Month number and hours.
+        """
+        cumulative = self.cumulative[resource]
+        (low, high) = self._columns(start, end)
+        return [(self.first + column,
+                 cumulative[column + 1] - cumulative[column])
+                for column in range(low, high)]
+
+    def total(self, start=None, end=None, resources=None):
+        """
+        Hours of the resources, all by default, from start to end.
+        """
+        (low, high) = self._columns(start, end)
+        if resources is None:
+            return self.total_cumulative[high] - self.total_cumulative[low]
+        return sum(self.cumulative[name][high] - self.cumulative[name][low]
+                   for name in resources)
+
+
+class PlanSet(object):
+    """
+    The merged allocations of several plans, reloaded incrementally.
+
+    Parameters
+    ----------
+    inputfiles : list of str
+        CSV exports or OmniPlan documents.
+    verbose : bool
+        Log each reload and its latency.
+
+    Attributes
+    ----------
+    watchers : list of AllocationWatcher
+        One per plan.
+    index : AllocationIndex
+        Index of the merged allocations.  Replaced, never modified, by
+        a reload, so that queries can run while reloading.
+    """
+
+    def __init__(self, inputfiles, verbose=False):
+        self.watchers = [AllocationWatcher(inputfile, None, verbose=verbose)
+                         for inputfile in inputfiles]
+        self.stamps = [None] * len(self.watchers)
+        self.index = None
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """
+        Update the plans that changed on disk, and the index if needed.
+
+        Returns
+        -------
+        bool
+            Whether the allocations changed.
+        """
+        with self.lock:
+            changed = False
+            for (number, watcher) in enumerate(self.watchers):
+                stamp = file_stamp(watcher.inputfile)
+                if stamp is None or stamp == self.stamps[number]:
+                    continue
+                self.stamps[number] = stamp
+                try:
+                    changed = watcher.refresh() or changed
+                except READ_ERRORS as err:
+                    # Keep the allocations of the last good read.
+                    print('Cannot read %s: %s' % (watcher.inputfile, err))
+            if changed or self.index is None:
+                merged = AllocationTable()
+                for watcher in self.watchers:
+                    if watcher.allocations is not None:
+                        merged.merge(watcher.allocations)
+                self.index = AllocationIndex(merged)
+            return changed
+
+
+def parse_month(value):
+    """
+    Month number of a 'YYYY-MM' or 'YYYY-MM-DD' query parameter.
+    """
+    if value is None:
+        return None
+    try:
+        day = datetime.strptime(value[:7], '%Y-%m').date()
+    except ValueError:
+        raise ValueError('Invalid month, expected YYYY-MM: %s' % value)
+    return period_index(day)
+
+
+def month_label(index):
+    """
+    'YYYY-MM' of a month number.
+    """
+    return period_date(index).strftime('%Y-%m')
+
+
+class QueryError(Exception):
+    """
+    A request that cannot be answered, with its HTTP status.
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class AllocationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the queries of the module docstring, in JSON.
+    """
+
+    def do_GET(self):    # pylint: disable=invalid-name
+        url = urlparse(self.path)
+        query = dict((key, values[-1])
+                     for (key, values) in parse_qs(url.query).items())
+        route = self.routes.get(url.path)
+        try:
+            if route is None:
+                raise QueryError(404, 'Unknown query: %s' % url.path)
+            # Queries all run on the same index, even if a reload
+            # replaces it meanwhile.
+            content = route(self, self.server.plans.index, query)
+            status = 200
+        except QueryError as err:
+            (status, content) = (err.status, {'error': str(err)})
+        except ValueError as err:
+            (status, content) = (400, {'error': str(err)})
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):   # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    @staticmethod
+    def _range(index, query):
+        start = parse_month(query.get('start'))
+        end = parse_month(query.get('end'))
+        span = index.span()
+        if span is None:
+            return (start, end, None, None)
+        return (start, end,
+                month_label(span[0] if start is None else start),
+                month_label(span[1] if end is None else end))
+
+    @staticmethod
+    def _resource(index, query):
+        resource = query.get('resource')
+        if resource is None:
+            raise QueryError(400, 'Missing resource')
+        if resource not in index.cumulative:
+            raise QueryError(404, 'Unknown resource: %s' % resource)
+        return resource
+
+    def query_resources(self, index, query):
+        span = index.span()
+        return {'resources': index.resources,
+                'start': None if span is None else month_label(span[0]),
+                'end': None if span is None else month_label(span[1])}
+
+    def query_hours(self, index, query):
+        resource = self._resource(index, query)
+        (start, end, start_label, end_label) = self._range(index, query)
+        return {'resource': resource, 'start': start_label,
+                'end': end_label,
+                'hours': index.hours(resource, start, end)}
+
+    def query_months(self, index, query):
+        resource = self._resource(index, query)
+        (start, end, start_label, end_label) = self._range(index, query)
+        return {'resource': resource, 'start': start_label,
+                'end': end_label,
+                'months': [[month_label(month), hours] for (month, hours)
+                           in index.months(resource, start, end)]}
+
+    def query_total(self, index, query):
+        resources = None
+        if query.get('resource'):
+            resources = query['resource'].split(',')
+            for resource in resources:
+                if resource not in index.cumulative:
+                    raise QueryError(404, 'Unknown resource: %s' % resource)
+        (start, end, start_label, end_label) = self._range(index, query)
+        return {'resources': resources, 'start': start_label,
+                'end': end_label,
+                'hours': index.total(start, end, resources)}
+
+    routes = {'/resources': query_resources,
+              '/hours': query_hours,
+              '/months': query_months,
+              '/total': query_total}
+
+
+class AllocationServer(ThreadingHTTPServer):
+    """
+    HTTP server of a PlanSet, on the loopback interface only.
+
+    Raises
+    ------
+    ValueError
+        If host is not a loopback address.
+    """
+    daemon_threads = True
+
+    def __init__(self, plans, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 verbose=False):
+        if not ipaddress.ip_address(socket.gethostbyname(host)).is_loopback:
+            raise ValueError('The server only listens on localhost, not %s' %
+                             host)
+        self.plans = plans
+        self.verbose = verbose
+        ThreadingHTTPServer.__init__(self, (host, port),
+                                     AllocationRequestHandler)
+
+
+def reload_loop(plans, interval=RELOAD_INTERVAL, stop=None):
+    """
+    Reload the plans every interval seconds, until stop is set.
+    """
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        try:
+            plans.reload()
+        except Exception as err:    # pylint: disable=broad-except
+            # The thread must not die: the queries would be answered
+            # with stale allocations, and nothing said about it.
+            print('Reload failed: %s: %s' % (type(err).__name__, err))
+
+
+def serve(inputfiles, host=DEFAULT_HOST, port=DEFAULT_PORT,
+          interval=RELOAD_INTERVAL, verbose=False):
+    """
+    Load the plans and serve the queries until interrupted.
+    """
+    plans = PlanSet(inputfiles, verbose=verbose)
+    server = AllocationServer(plans, host, port, verbose)
+    stop = threading.Event()
+    reloader = threading.Thread(target=reload_loop,
+                                args=(plans, interval, stop))
+    reloader.daemon = True
+    reloader.start()
+    if verbose:
+        print('Serving %d plan(s) on http://%s:%d' %
+              ((len(inputfiles),) + server.server_address[:2]))
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
@@ -0,0 +1,219 @@
+"""
+Incremental allocation with a per-task contribution cache.
+
+The contribution of each task to the allocations is kept in a sidecar
+file, keyed on a hash of the task's columns.  On the next run, only the
+new, changed or removed tasks are computed; their contributions are added
+to or subtracted from the cached totals.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from io import open
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import AllocationTable
+
+CACHE_VERSION = 1
+
+
+def task_key(record):
+    """
+    Hash of the columns of a TaskRecord that the allocation depends on.
+    """
+    fields = (record.assigned, record.effort,
+              record.start.toordinal(), record.end.toordinal(),
+              record.completion)
+    return hashlib.sha1(repr(fields).encode('utf-8')).hexdigest()
+
+
+def task_contribution(record):
+    """
+    Allocation of a single task.
+
+    Returns
+    -------
+    dict
+        {resource: {month as 'YYYY-MM-DD': hours}}
+    """
+    allocations = AllocationTable()
+    omniplan.add_task_allocation(allocations, record)
+    return dict((name, dict((month.isoformat(), hours)
+                            for (month, hours) in
+                            allocations.allocation(name).items()))
+                for name in allocations)
+
+
+class ContributionCache(object):
+    """
+    Cached per-task contributions and the resulting allocations.
+
+    Parameters
+    ----------
+    filename : str or None
+        Sidecar cache file.  Loaded if it exists.  None keeps the cache
+        in memory only.
+
+    Attributes
+    ----------
+    tasks : dict
+        For each task key, [number of identical tasks, contribution].
+    totals : dict
+        {resource: {month: [hours, number of contributing tasks]}}
+    added : int
+        Number of tasks computed by the last update.
+    removed : int
+        Number of tasks subtracted by the last update.
+
+    Methods
+    -------
+    update(records)
+        Bring the cache up to date with the records.
+    update_counts(counts, records)
+        Same, from the task keys already computed.
+    allocations()
+        The allocations, as an AllocationTable.
+    save()
+        Write the cache to disk.
+
+    Notes
+    -----
+    The cache is discarded if the holiday calendar is not the one it was
+    computed with.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.holidays = None
+        self.tasks = {}
+        self.totals = {}
+        self.added = 0
+        self.removed = 0
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        """
+        Read the cache from disk.  An unreadable cache is ignored.
+        """
+        try:
+            with open(self.filename, encoding='utf-8') as filehandle:
+                content = json.load(filehandle)
+        except ValueError:
+            return
+        if content.get('version') != CACHE_VERSION:
+            return
+        self.holidays = content['holidays']
+        self.tasks = content['tasks']
+        self.totals = content['totals']
+
+    def save(self):
+        """
+        Write the cache to disk.
+        """
+        content = {'version': CACHE_VERSION,
+                   'holidays': self.holidays,
+                   'tasks': self.tasks,
+                   'totals': self.totals}
+        with open(self.filename, mode='w', encoding='utf-8') as filehandle:
+            filehandle.write(json.dumps(content))
+
+    def reset(self):
+        """
+        Forget all the cached contributions.
+        """
+        self.tasks = {}
+        self.totals = {}
+
+    def update(self, records):
+        """
+        Bring the cache up to date with the records.
+
+        Parameters
+        ----------
+        records : iterable of TaskRecord
+            All the tasks of the export.
+        """
+        self.check_holidays()
+        counts = Counter()
+        new_records = {}
+        for record in omniplan.active_records(records):
+            key = task_key(record)
+            counts[key] += 1
+            if key not in self.tasks and key not in new_records:
+                new_records[key] = record
+        self.update_counts(counts, new_records)
+
+    def check_holidays(self):
+        """
+        Reset the cache if the holiday calendar changed.
+        """
+        holidays = list(omniplan.BUSINESS_CALENDAR.holidays)
+        if holidays != self.holidays:
+            self.reset()
+            self.holidays = holidays
+
+    def update_counts(self, counts, records):
+        """
+        Bring the cache up to date with the tasks counted.
+
+        Parameters
+        ----------
+        counts : dict
+            Number of active tasks of each task key.
+        records : dict
+            TaskRecord of each key, at least of those not in the cache.
+        """
+        self.check_holidays()
+        self.added = 0
+        self.removed = 0
+        for key in list(self.tasks):
+            if key not in counts:
+                (count, contribution) = self.tasks.pop(key)
+                self._apply(contribution, -count)
+                self.removed += count
+        for (key, count) in counts.items():
+            if key not in self.tasks:
+                contribution = task_contribution(records[key])
+                self.tasks[key] = [0, contribution]
+            delta = count - self.tasks[key][0]
+            if delta:
+                self._apply(self.tasks[key][1], delta)
+                self.tasks[key][0] = count
+                if delta > 0:
+                    self.added += delta
+                else:
+                    self.removed -= delta
+
+    def _apply(self, contribution, count):
+        # Add count times the contribution to the totals.  A month is
+        # dropped when no task contributes to it anymore.
+        for (name, months) in contribution.items():
+            resource = self.totals.setdefault(name, {})
+            for (month, hours) in months.items():
+                cell = resource.setdefault(month, [0., 0])
+                cell[0] += count * hours
+                cell[1] += count
+                if cell[1] == 0:
+                    del resource[month]
+            if not resource:
+                del self.totals[name]
+
+    def allocations(self):
+        """
+        The allocations, as an AllocationTable.
+        """
+        allocations = AllocationTable()
+        for (name, months) in self.totals.items():
+            resource_id = allocations.resource_id(name)
+            for (month, (hours, _)) in months.items():
+                allocations.add_effort(
+                    resource_id,
+                    datetime.strptime(month, '%Y-%m-%d').date(), hours)
+        return allocations
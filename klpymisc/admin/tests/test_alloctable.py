@@ -0,0 +1,136 @@
+# pytest suite for alloctable module
+
+"""
+Tests for the alloctable module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import pickle
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import alloctable
+
+# pylint: disable=invalid-name, no-self-use
+
+
+class TestPeriodIndex(object):
+    """
+    Suite of tests for the period numbering.
+    """
+
+    def test_round_trip(self):
+        """
+        period_date is the first day of the period of period_index.
+        """
+        cases = [('month', date(2017, 12, 31), date(2017, 12, 1)),
+                 ('week', date(2018, 1, 3), date(2018, 1, 1)),
+                 ('quarter', date(2018, 8, 15), date(2018, 7, 1))]
+        for (granularity, day, start) in cases:
+            index = alloctable.period_index(day, granularity)
+            assert alloctable.period_date(index, granularity) == start
+            assert alloctable.period_index(start, granularity) == index
+
+    def test_consecutive(self):
+        """
+        Consecutive periods have consecutive numbers across years.
+        """
+        assert alloctable.period_index(date(2018, 1, 1)) - \
+            alloctable.period_index(date(2017, 12, 1)) == 1
+        assert alloctable.period_index(date(2018, 1, 1), 'quarter') - \
+            alloctable.period_index(date(2017, 10, 1), 'quarter') == 1
+
+    def test_unknown_granularity(self):
+        """
+        Only weeks, months and quarters.
+        """
+        with pytest.raises(ValueError):
+            alloctable.period_index(date(2018, 1, 1), 'day')
+        with pytest.raises(ValueError):
+            alloctable.AllocationTable('year')
+
+
+class TestAllocationTable(object):
+    """
+    Suite of tests for the AllocationTable class.
+    """
+
+    def test_grow_both_ways(self):
+        """
+        Cells survive the re-layout of the matrix, before and after.
+        """
+        table = alloctable.AllocationTable()
+        a = table.resource_id('A')
+        table.add_effort(a, date(2017, 6, 1), 10.)
+        b = table.resource_id('B')
+        table.add_effort(b, date(2030, 1, 1), 20.)
+        table.add_effort(a, date(1999, 3, 1), 0.)
+        table.add_effort(a, date(2017, 6, 1), 5.)
+        assert table.resource_id('A') == a
+        assert table.span() == (date(1999, 3, 1), date(2030, 1, 1))
+        assert table.allocation('A') == {date(1999, 3, 1): 0.,
+                                         date(2017, 6, 1): 15.}
+        assert table.allocation('B') == {date(2030, 1, 1): 20.}
+        assert len(table.periods()) == 12 * 31 - 1
+
+    def test_empty(self):
+        """
+        No cells, no span.
+        """
+        table = alloctable.AllocationTable()
+        table.resource_id('A')
+        assert table.span() is None
+        assert table.periods() == []
+        assert table.allocation('A') == {}
+
+    def test_merge(self):
+        """
+        Merging adds the cells of the other table.
+        """
+        table = alloctable.AllocationTable('week')
+        table.add_effort(table.resource_id('A'), date(2018, 1, 3), 8.)
+        other = alloctable.AllocationTable('week')
+        other.add_effort(other.resource_id('B'), date(2017, 12, 27), 4.)
+        other.add_effort(other.resource_id('A'), date(2018, 1, 4), 2.)
+        table.merge(pickle.loads(pickle.dumps(other)))
+        assert sorted(table) == ['A', 'B']
+        assert table.allocation('A') == {date(2018, 1, 1): 10.}
+        assert table.allocation('B') == {date(2017, 12, 25): 4.}
+        with pytest.raises(ValueError):
+            table.merge(alloctable.AllocationTable('month'))
+
+    def test_dictionary_row(self):
+        """
+        Rows by RESOURCES id, the same rows as by name.
+        """
+        table = alloctable.AllocationTable()
+        a = table.resource_id('A')
+        ids = alloctable.RESOURCES.encode((('B', 1.), ('A', 1.)))
+        assert table.dictionary_row(ids[1][0]) == a
+        b = table.dictionary_row(ids[0][0])
+        assert table.resources[b] == 'B'
+        assert table.dictionary_row(alloctable.RESOURCES.intern('C')) == 2
+        # The ids are those of the process, not kept when pickled.
+        copy = pickle.loads(pickle.dumps(table))
+        assert copy.dictionary_row(ids[0][0]) == b
+
+
+class TestResourceDictionary(object):
+    """
+    Suite of tests for the ResourceDictionary class.
+    """
+
+    def test_intern(self):
+        resources = alloctable.ResourceDictionary()
+        assert resources.encode((('A', .25), ('B', .75))) == \
+            ((0, .25), (1, .75))
+        assert resources.intern('B') == 1
+        assert resources.intern('C') == 2
+        assert resources.names == ['A', 'B', 'C']
+        assert len(resources) == 3
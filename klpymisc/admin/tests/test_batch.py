@@ -0,0 +1,98 @@
+# pytest suite for batch module
+
+"""
+Tests for the batch module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+
+import pytest
+
+from klpymisc.admin import batch
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import AllocationTable
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN2 = os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.csv')
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+class TestBatch(object):
+    """
+    Suite of tests for the batch allocation.
+    """
+
+    def test_expand_inputs(self, tmpdir):
+        """
+        Directories, glob patterns and plain files.
+        """
+        for name in ['b.csv', 'a.csv', 'notes.txt']:
+            tmpdir.join(name).write('')
+        dirname = str(tmpdir)
+        expected = [os.path.join(dirname, 'a.csv'),
+                    os.path.join(dirname, 'b.csv')]
+        assert batch.expand_inputs([dirname]) == expected
+        assert batch.expand_inputs([os.path.join(dirname, '*.csv')]) == \
+            expected
+        assert batch.expand_inputs([expected[1], dirname]) == \
+            [expected[1], expected[0]]
+        assert batch.expand_inputs(['missing.csv']) == ['missing.csv']
+
+    def test_batch_allocation(self):
+        """
+        The merged allocations are the sum of the per-project ones.
+        """
+        (allocations, per_project) = batch.batch_allocation(
+            [OMNIPLAN2, OMNIPLAN3], max_workers=2)
+        assert sorted(per_project) == sorted([OMNIPLAN2, OMNIPLAN3])
+
+        expected = AllocationTable()
+        for inputfile in [OMNIPLAN2, OMNIPLAN3]:
+            single = omniplan.calculate_allocation(
+                omniplan.iter_records(inputfile))
+            for name in single:
+                assert per_project[inputfile].allocation(name) == \
+                    pytest.approx(single.allocation(name))
+            omniplan.merge_allocations(expected, single)
+
+        assert sorted(allocations) == sorted(expected)
+        for name in expected:
+            assert allocations.allocation(name) == \
+                pytest.approx(expected.allocation(name))
+
+    def test_batch_allocation_empty(self):
+        """
+        Nothing to allocate.
+        """
+        (allocations, per_project) = batch.batch_allocation([])
+        assert (len(allocations), per_project) == (0, {})
+
+    def test_project_outputfile(self):
+        """
+        Per-project output names.
+        """
+        assert batch.project_outputfile('out/alloc.csv',
+                                        'exports/ProjectA.csv') == \
+            'out/alloc_ProjectA.csv'
+
+    def test_project_outputfiles(self):
+        """
+        Exports with the same name get different outputs.
+        """
+        inputfiles = ['2017/ProjectA.csv', '2018/ProjectA.csv',
+                      '2018/ProjectA.oplx', 'ProjectB.csv']
+        assert batch.project_outputfiles('alloc.csv', inputfiles) == {
+            '2017/ProjectA.csv': 'alloc_2017_ProjectA.csv',
+            '2018/ProjectA.csv': 'alloc_2018_ProjectA_1.csv',
+            '2018/ProjectA.oplx': 'alloc_2018_ProjectA_2.csv',
+            'ProjectB.csv': 'alloc_ProjectB.csv'}
@@ -0,0 +1,141 @@
+# pytest suite for the benchmarks package
+
+"""
+Tests for the benchmark generator and suite.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.benchmarks import generator
+from klpymisc.admin.benchmarks import startup
+from klpymisc.admin.benchmarks import suite
+
+# pylint: disable=invalid-name, no-self-use
+
+
+class TestGenerator(object):
+    """
+    Suite of tests for the synthetic export generator.
+    """
+
+    def test_seeded(self, tmpdir):
+        """
+        Same seed, same export; other seed, other export.
+        """
+        exports = []
+        for (name, seed) in (('a', 1), ('b', 1), ('c', 2)):
+            outputfile = tmpdir.join('%s.csv' % name)
+            generator.generate_export(str(outputfile), 200, seed)
+            exports.append(outputfile.read())
+        assert exports[0] == exports[1] != exports[2]
+
+    def test_realistic(self, tmpdir):
+        """
+        The export parses, and has the shapes found in real exports.
+        """
+        outputfile = str(tmpdir.join('export.csv'))
+        generator.generate_export(outputfile, 500, seed=3)
+        records = omniplan.load_records(outputfile)
+        tasks = [record for record in records if record.assigned]
+        assert len(tasks) == 500
+        assert len(records) == 500 + 500 // generator.GROUP_SIZE
+        assert any(len(record.assigned) > 1 for record in tasks)
+        assert any(record.start.year != record.end.year for record in tasks)
+        assert any(0. < record.completion < 1. for record in tasks)
+        assert any(record.effort == 0. for record in tasks)
+
+        content = open(outputfile).read()
+        assert '% out of ' in content
+        for unit in ('w ', 'd ', 'h ', 'm ', 's,'):
+            assert unit in content
+
+
+class TestSuite(object):
+    """
+    Suite of tests for the benchmark runner.
+    """
+
+    def test_run(self, tmpdir):
+        """
+        One timing and peak memory per phase, saved and compared.
+        """
+        content = suite.run([100], ['numpy'], str(tmpdir), seed=0)
+        assert [result['phase'] for result in content['results']] == \
+            ['load', 'allocate', 'write']
+        for result in content['results']:
+            assert result['seconds'] >= 0.
+            assert result['peak_bytes'] > 0
+
+        resultfile = str(tmpdir.join('results.json'))
+        suite.save(content, resultfile)
+        ratios = suite.compare(suite.load(resultfile), content)
+        assert sorted(ratios.values()) == [1., 1., 1.]
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   encodings.aliases
+import time:       900 |       1000 | encodings
+import time:      2000 |       2000 | site
+import time:       300 |        300 |   gettext
+import time:       700 |       1000 | argparse
+import time:       500 |       3500 |     re
+import time:       500 |       4000 |   klpymisc.admin.omniplan
+import time:       200 |       4200 | klpymisc.admin.batch
+"""
+
+
+class TestStartup(object):
+    """
+    Suite of tests for the startup benchmark.
+    """
+
+    def test_parse_importtime(self):
+        """
+        Nesting levels, and the imports of the tool only.
+        """
+        imports = startup.parse_importtime(IMPORTTIME)
+        assert imports[0] == ('encodings.aliases', 1, 100)
+        assert imports[5] == ('re', 2, 3500)
+        assert startup.tool_imports(imports) == \
+            [('argparse', 1000), ('klpymisc.admin.batch', 4200)]
+
+    def test_regressions(self):
+        """
+        Only the times well over the baseline are regressions.
+        """
+        baseline = {'a': 10000, 'b': 10000}
+        results = {'a': 19000, 'b': 21000, 'c': 50000}
+        assert startup.regressions(results, baseline) == \
+            {'b': (10000, 21000)}
+
+    def test_lazy_imports(self):
+        """
+        The command line tools do not import the slow modules at start.
+        """
+        for entry in ('omniplan2alloc', 'getdocs'):
+            (microseconds, modules) = startup.measure(entry, repeat=1)
+            assert microseconds > 0
+            assert startup.lazy_violations(entry, modules) == []
+
+    def test_broken_entry_point(self, tmpdir, monkeypatch):
+        """
+        An entry point failing to start fails the run, rather than
+        looking fast.
+        """
+        script = tmpdir.join('broken.py')
+        script.write('import json\nimport klpymisc.no_such_module\n')
+        monkeypatch.setitem(startup.ENTRY_POINTS, 'broken', str(script))
+        with pytest.raises(RuntimeError, match='no_such_module'):
+            startup.measure('broken', repeat=1)
+        (results, failures) = startup.run(['broken'], repeat=1,
+                                          verbose=False)
+        assert results == {}
+        assert len(failures) == 1
@@ -0,0 +1,155 @@
+# pytest suite for bizdays module
+
+"""
+Tests for the bizdays module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import random
+from datetime import date, datetime, timedelta
+
+from dateutil import rrule
+
+from klpymisc.admin import bizdays
+
+# pylint: disable=invalid-name, no-self-use
+
+def rrule_business_days(start_date, end_date):
+    """
+    Reference implementation, enumerating every business day.
+    """
+    return len(list(rrule.rrule(rrule.DAILY,
+                                byweekday=range(0, 5),
+                                dtstart=start_date,
+                                until=end_date)))
+
+
+class TestBusinessDaysBetween(object):
+    """
+    Suite of tests for the business_days_between function.
+    """
+
+    def test_against_rrule(self):
+        """
+        Differential test against the rrule enumeration on random spans,
+        including empty and reversed ones.
+        """
+        rng = random.Random(42)
+        origin = date(2014, 1, 1)
+        for _ in range(2000):
+            start = origin + timedelta(rng.randint(0, 2000))
+            end = start + timedelta(rng.randint(-10, 800))
+            assert bizdays.business_days_between(start, end) == \
+                rrule_business_days(start, end)
+
+    def test_all_weekday_alignments(self):
+        """
+        Every combination of start weekday and span length up to three
+        weeks.
+        """
+        monday = date(2017, 6, 5)
+        for offset in range(7):
+            start = monday + timedelta(offset)
+            for length in range(22):
+                end = start + timedelta(length)
+                assert bizdays.business_days_between(start, end) == \
+                    rrule_business_days(start, end)
+
+    def test_datetime_inputs(self):
+        """
+        datetime inputs are counted on their date.
+        """
+        start = datetime(2017, 6, 5, 8, 0)
+        end = datetime(2018, 12, 11, 11, 58)
+        assert bizdays.business_days_between(start, end) == \
+            rrule_business_days(start.date(), end.date())
+
+
+class TestBusinessDayIndex(object):
+    """
+    Suite of tests for the business day numbers.
+    """
+
+    def test_round_trip(self):
+        """
+        Business days apart, numbers apart; weekends go to Monday.
+        """
+        first = date(2017, 12, 25)
+        for offset in range(30):
+            day = first + timedelta(offset)
+            index = bizdays.business_day_index(day)
+            if day.weekday() < 5:
+                assert bizdays.business_day_date(index) == day
+                assert index - bizdays.business_day_index(first) == \
+                    bizdays.business_days_between(first, day) - 1
+            else:
+                assert bizdays.business_day_date(index) == \
+                    day + timedelta(7 - day.weekday())
+
+
+class TestBusinessCalendar(object):
+    """
+    Suite of tests for the BusinessCalendar class.
+    """
+
+    def test_no_holidays(self):
+        """
+        Without holidays, same as business_days_between.
+        """
+        cal = bizdays.BusinessCalendar()
+        start = date(2017, 10, 2)
+        end = date(2018, 1, 2)
+        assert cal.business_days(start, end) == \
+            bizdays.business_days_between(start, end)
+
+    def test_holidays(self):
+        """
+        Weekday holidays inside the span are removed, weekend and
+        out-of-span holidays are not.
+        """
+        cal = bizdays.BusinessCalendar([date(2017, 7, 4),    # Tuesday
+                                        date(2017, 7, 8),    # Saturday
+                                        date(2017, 7, 14)])  # outside
+        assert cal.holidays == [date(2017, 7, 4).toordinal(),
+                                date(2017, 7, 14).toordinal()]
+        assert cal.business_days(date(2017, 7, 3), date(2017, 7, 7)) == 4
+        assert cal.business_days(date(2017, 7, 4), date(2017, 7, 4)) == 0
+        assert cal.business_days(date(2017, 7, 5), date(2017, 7, 13)) == 7
+
+    def test_add_holidays_resets_cache(self):
+        """
+        Adding holidays invalidates memoized counts.
+        """
+        cal = bizdays.BusinessCalendar()
+        start = date(2017, 12, 18)
+        end = date(2017, 12, 29)
+        assert cal.business_days(start, end) == 10
+        cal.add_holidays([date(2017, 12, 25), date(2017, 12, 26)])
+        assert cal.business_days(start, end) == 8
+
+    def test_cache_size(self, monkeypatch):
+        """
+        The cache is bounded, the oldest pairs dropped first.
+        """
+        monkeypatch.setattr(bizdays, 'CALENDAR_CACHE_SIZE', 3)
+        cal = bizdays.BusinessCalendar([date(2017, 12, 25)])
+        start = date(2017, 12, 18)
+        for ndays in range(5):
+            cal.business_days(start, start + timedelta(ndays))
+        assert list(cal._cache) == [(start, start + timedelta(ndays))
+                                    for ndays in (2, 3, 4)]
+        assert cal.business_days(start, date(2017, 12, 29)) == 9
+
+    def test_read_holidays(self, tmpdir):
+        """
+        Holiday file parsing, comments and blank lines skipped.
+        """
+        holidayfile = tmpdir.join('holidays.txt')
+        holidayfile.write('# Holidays\n2017-12-25\n\n2018-01-01\n')
+        assert bizdays.read_holidays(str(holidayfile)) == \
+            [date(2017, 12, 25), date(2018, 1, 1)]
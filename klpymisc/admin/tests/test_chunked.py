@@ -0,0 +1,126 @@
+# pytest suite for chunked module
+
+"""
+Tests for the chunked module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import csv
+import io
+import os
+
+import pytest
+
+from klpymisc.admin import chunked
+from klpymisc.admin import omniplan
+from klpymisc.admin.benchmarks import generator
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+QUOTED = (b'Start,End,Effort,%Done,Assigned,NoteContents\n'
+          b'"6/5/17, 08:00","6/9/17, 17:00",1w,0%,A,"one, two\nthree"\n'
+          b'"6/5/17, 08:00","6/9/17, 17:00",1d,0%,B,"say ""hi""\n"\n'
+          b'"6/5/17, 08:00","6/9/17, 17:00",1d,0%,B,\n')
+
+# The quote of 5" is not a CSV quote: counted as one, it puts a boundary
+# inside the quoted field of the next record.
+STRAY_QUOTE = (b'Start,End,Effort,%Done,Assigned,NoteContents\n'
+               b'"6/5/17, 08:00","6/9/17, 17:00",1w,0%,A,5" screen\n'
+               b'"6/5/17, 08:00","6/9/17, 17:00",1d,0%,B,"one\ntwo"\n'
+               b'"6/5/17, 08:00","7/9/17, 17:00",1d,0%,C,\n')
+
+
+def assert_same_allocations(allocations, expected):
+    """
+    Same resources, same months, same efforts within tolerance.
+    """
+    assert sorted(allocations) == sorted(expected)
+    for name in expected:
+        assert allocations.allocation(name) == \
+            pytest.approx(expected.allocation(name))
+
+
+class TestChunkRanges(object):
+    """
+    Suite of tests for the split on record boundaries.
+    """
+
+    def test_quoted_fields(self):
+        """
+        Every split, however fine, falls between records.
+        """
+        expected = list(csv.reader(io.StringIO(QUOTED.decode('utf-8'))))
+        for nchunks in range(1, len(QUOTED) + 2):
+            (header, ranges) = chunked.chunk_ranges(QUOTED, nchunks)
+            assert header == (0, QUOTED.index(b'\n') + 1)
+            assert ranges[0][0] == header[1]
+            assert ranges[-1][1] == len(QUOTED)
+            rows = [expected[0]]
+            for (start, end) in ranges:
+                chunk = QUOTED[start:end].decode('utf-8')
+                rows.extend(csv.reader(io.StringIO(chunk)))
+            assert rows == expected
+            assert len(ranges) <= nchunks
+
+    def test_header_only(self):
+        """
+        No records, no ranges.
+        """
+        assert chunked.chunk_ranges(b'Start,End\n', 4) == ((0, 10), [])
+
+
+class TestParallelAllocation(object):
+    """
+    Suite of tests for the parallel allocation.
+    """
+
+    def test_same_as_serial(self, tmpdir):
+        """
+        Same allocations as the serial reader, for any number of chunks.
+        """
+        export = str(tmpdir.join('export.csv'))
+        generator.generate_export(export, 2000, seed=5)
+        for inputfile in (OMNIPLAN3, export):
+            expected = omniplan.calculate_allocation(
+                omniplan.iter_records(inputfile))
+            for nchunks in (1, 7):
+                assert_same_allocations(
+                    chunked.parallel_allocation(inputfile, max_workers=2,
+                                                nchunks=nchunks),
+                    expected)
+
+    def test_parse_error(self, tmpdir):
+        """
+        Errors say where the records are.
+        """
+        inputfile = tmpdir.join('bad.csv')
+        inputfile.write(b'Start,End,Effort,%Done,Assigned\n'
+                        b'"13/45/17, 08:00","6/9/17, 17:00",1w,0%,A\n',
+                        mode='wb')
+        with pytest.raises(ValueError, match='byte 32'):
+            chunked.parallel_allocation(str(inputfile), max_workers=1)
+
+    def test_stray_quote(self, tmpdir):
+        """
+        A quote inside a field that is not quoted does not lose records.
+        """
+        inputfile = tmpdir.join('stray.csv')
+        inputfile.write(STRAY_QUOTE, mode='wb')
+        expected = omniplan.calculate_allocation(
+            omniplan.iter_records(str(inputfile)))
+        assert sorted(expected) == ['A', 'B', 'C']
+        for nchunks in range(1, len(STRAY_QUOTE) + 2):
+            assert_same_allocations(
+                chunked.parallel_allocation(str(inputfile), max_workers=1,
+                                            nchunks=nchunks),
+                expected)
@@ -0,0 +1,150 @@
+# pytest suite for mapped module
+
+"""
+Tests for the mapped module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import csv
+import io
+import os
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import mapped
+from klpymisc.admin.benchmarks import generator
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN2 = os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.csv')
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+HEADER = ['Title', 'Start', 'End', 'Effort', '%Done', 'Assigned', 'Notes']
+
+
+def fields(record):
+    return (record.assigned, record.effort, record.start, record.end,
+            record.completion)
+
+
+def write_rows(tmpdir, rows, lineterminator='\n'):
+    """
+    CSV export of the rows, as csv.writer writes it.
+    """
+    content = io.StringIO()
+    writer = csv.writer(content, lineterminator=lineterminator)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    inputfile = tmpdir.join('export.csv')
+    inputfile.write(content.getvalue().encode('utf-8'), mode='wb')
+    return str(inputfile)
+
+
+class TestIterRecords(object):
+    """
+    Suite of tests comparing the memory-mapped reading to csv.reader.
+    """
+
+    def test_fixtures(self, tmpdir):
+        export = str(tmpdir.join('synthetic.csv'))
+        generator.generate_export(export, 2000, seed=3)
+        for inputfile in (OMNIPLAN2, OMNIPLAN3, export):
+            assert [fields(record) for record in
+                    mapped.load_records(inputfile)] == \
+                [fields(record) for record in
+                 omniplan.load_records(inputfile)]
+
+    @pytest.mark.parametrize('lineterminator', ['\n', '\r\n'])
+    def test_quoting(self, tmpdir, lineterminator):
+        """
+        Quotes, commas and newlines inside the fields, projected or not.
+        """
+        rows = [
+            ['Plain', '6/5/17, 08:00', '6/9/17, 17:00', '1w', '0%', 'A',
+             'No notes'],
+            ['Say "hi", twice\nor more', '6/5/17, 08:00', '6/9/17, 17:00',
+             '2d', '50%', 'A {50% out of 100%}; B',
+             'Line 1\nLine "2", end\r\n'],
+            ['', '6/12/17, 08:00', '6/16/17, 17:00', '', '', '',
+             '""'],
+            ['"Quoted"', '6/12/17, 08:00', '6/16/17, 17:00', '3h', '10%',
+             'Jean-"Luc"', ''],
+        ]
+        inputfile = write_rows(tmpdir, rows, lineterminator)
+        records = mapped.load_records(inputfile)
+        assert [fields(record) for record in records] == \
+            [fields(record) for record in omniplan.load_records(inputfile)]
+        assert records[2].start == date(2017, 6, 12)
+        assert records[3].assigned == (('Jean-"Luc"', 1.),)
+
+    def test_empty_lines(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'Start,End,Effort,%Done,Assigned\n'
+                        b'\n'
+                        b'"6/5/17, 08:00","6/9/17, 17:00",1w,0%,A\r\n'
+                        b'\r\n'
+                        b'"6/5/17, 08:00","6/9/17, 17:00",2d,0%,B',
+                        mode='wb')
+        records = mapped.load_records(str(inputfile))
+        assert [record.effort for record in records] == [40., 16.]
+
+    def test_stray_quote(self, tmpdir):
+        """
+        A quote inside a field that is not quoted is just a byte, as for
+        csv.reader, before and after the projected columns.
+        """
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'Title,Start,End,Effort,%Done,Assigned,Notes\n'
+                        b'5" screen,"6/5/17, 08:00","6/9/17, 17:00",1w,0%,'
+                        b'A,a 5" screen\n'
+                        b'"Quoted"x,"6/5/17, 08:00","6/9/17, 17:00",2d,0%,'
+                        b'B,"one\ntwo"\n', mode='wb')
+        records = mapped.load_records(str(inputfile))
+        assert [fields(record) for record in records] == \
+            [fields(record) for record in
+             omniplan.load_records(str(inputfile))]
+        assert [record.effort for record in records] == [40., 16.]
+
+    def test_too_few_fields(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'Start,End,Effort,%Done,Assigned\n'
+                        b'"6/5/17, 08:00","6/9/17, 17:00",1w,0%,A\n'
+                        b'"6/5/17, 08:00","6/9/17, 17:00",1w\n', mode='wb')
+        with pytest.raises(ValueError, match='byte 72'):
+            mapped.load_records(str(inputfile))
+
+    def test_unterminated_quote(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'Start,End,Effort,%Done,Assigned\n'
+                        b'"6/5/17, 08:00,"6/9/17, 17:00",1w,0%,A\n',
+                        mode='wb')
+        with pytest.raises(ValueError, match='byte 32'):
+            mapped.load_records(str(inputfile))
+
+    def test_parse_error(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'Start,End,Effort,%Done,Assigned\n'
+                        b'"13/45/17, 08:00","6/9/17, 17:00",1w,0%,A\n',
+                        mode='wb')
+        with pytest.raises(ValueError, match='byte 32'):
+            mapped.load_records(str(inputfile))
+
+    def test_empty_file(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write(b'', mode='wb')
+        with pytest.raises(ValueError):
+            mapped.load_records(str(inputfile))
+
+    def test_header_only(self, tmpdir):
+        inputfile = write_rows(tmpdir, [])
+        assert mapped.load_records(inputfile) == []
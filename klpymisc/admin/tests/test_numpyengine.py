@@ -0,0 +1,121 @@
+# pytest suite for numpyengine module
+
+"""
+Tests for the numpyengine module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import numpyengine
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+COLUMNS = omniplan.resolve_columns(['Start', 'End', 'Effort', '%Done',
+                                     'Assigned'])
+
+
+def make_record(row):
+    """
+    TaskRecord from a row of Start, End, Effort, %Done and Assigned.
+    """
+    return omniplan.TaskRecord.from_row(row, COLUMNS)
+
+
+def assert_same_allocations(allocations, expected):
+    """
+    Same resources, same months, same efforts within tolerance.
+    """
+    assert sorted(allocations) == sorted(expected)
+    for name in expected:
+        assert sorted(allocations.allocation(name)) == \
+            sorted(expected.allocation(name))
+        months = allocations.allocation(name)
+        for (month, hours) in expected.allocation(name).items():
+            assert months[month] == pytest.approx(hours, abs=1e-9)
+
+
+class TestCalculateAllocation(object):
+    """
+    Suite of tests comparing the numpy engine to the reference engine.
+    """
+
+    def test_omniplan3_fixture(self):
+        """
+        Same allocations as the reference engine on the OmniPlan 3 export.
+        """
+        records = omniplan.load_records(os.path.join(
+            TESTDATAPATH, 'OmniPlan3',
+            'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv'))
+        assert_same_allocations(numpyengine.calculate_allocation(records),
+                                omniplan.calculate_allocation(records))
+
+    def test_omniplan2_fixture(self):
+        """
+        Same allocations as the reference engine on the OmniPlan 2 export.
+        """
+        records = omniplan.load_records(os.path.join(TESTDATAPATH,
+                                                     'OmniPlan2',
+                                                     'OmniPlan.csv'))
+        assert_same_allocations(numpyengine.calculate_allocation(records),
+                                omniplan.calculate_allocation(records))
+
+    def test_random_tasks(self):
+        """
+        Same allocations as the reference engine on random tasks.
+        """
+        rng = random.Random(7)
+        records = []
+        for _ in range(300):
+            start = date(2016, 1, 1) + timedelta(rng.randint(0, 700))
+            end = start + timedelta(rng.randint(0, 400))
+            if omniplan.get_business_days(start, end) == 0:
+                continue
+            assigned = '; '.join('%s {%d%% out of 100%%}' %
+                                 (name, rng.randint(1, 100))
+                                 for name in rng.sample('ABCDE',
+                                                        rng.randint(1, 3)))
+            records.append(make_record([
+                start.strftime('%m/%d/%y') + ', 08:00',
+                end.strftime('%m/%d/%y') + ', 17:00',
+                '%dd %dh' % (rng.randint(1, 60), rng.randint(0, 7)),
+                '%d%%' % rng.choice([0, 10, 25, 50, 75, 99, 100]),
+                assigned]))
+        assert_same_allocations(numpyengine.calculate_allocation(records),
+                                omniplan.calculate_allocation(records))
+
+    def test_holidays(self):
+        """
+        The holiday calendar of the omniplan module is honoured.
+        """
+        records = [make_record(['6/26/17, 08:00', '7/7/17, 17:00',
+                                '10d', '0%', 'A'])]
+        omniplan.set_holidays([date(2017, 7, 4)])
+        try:
+            allocations = numpyengine.calculate_allocation(records)
+            expected = omniplan.calculate_allocation(records)
+        finally:
+            omniplan.set_holidays([])
+        assert_same_allocations(allocations, expected)
+        assert allocations.allocation('A')[date(2017, 6, 1)] == \
+            pytest.approx(80. * 5 / 9)
+
+    def test_no_tasks(self):
+        """
+        No assigned tasks, no allocations.
+        """
+        records = [make_record(['6/5/17, 08:00', '6/5/17, 08:00',
+                                '', '0%', ''])]
+        assert len(numpyengine.calculate_allocation(records)) == 0
@@ -0,0 +1,301 @@
+# pytest suite for omniplan module
+
+"""
+Tests for the omniplan module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import pickle
+import types
+from datetime import date, datetime
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.alloctable import RESOURCES
+
+# pylint: disable=invalid-name, no-self-use
+
+CSV_EXPORT = u'''WBS Number,Title,Start,End,Effort,Completed,Assigned,NoteContents
+1,Done,"6/5/17, 08:00","6/9/17, 17:00",1w,100%,A,
+2,Milestone,"6/5/17, 08:00","6/5/17, 08:00",,0%,,
+3,Task 3,"6/5/17, 08:00","6/9/17, 17:00",1w,50%,A {50% out of 100%}; B,"a, b"
+4,Task 4,"6/26/17, 08:00","7/7/17, 17:00",2w,0%,B,
+'''
+
+
+@pytest.fixture()
+def csv_export(tmpdir):
+    """
+    Small CSV export written to a temporary file.
+    """
+    inputfile = tmpdir.join('export.csv')
+    inputfile.write_text(CSV_EXPORT, encoding='utf-8')
+    return str(inputfile)
+
+
+class TestTaskRecord(object):
+    """
+    Suite of tests for the TaskRecord class and the header mapping.
+    """
+
+    def test_resolve_columns(self):
+        """
+        Both the '%Done' and 'Completed' headers are recognized.
+        """
+        header = ['Title', 'Start', 'End', 'Effort', '%Done', 'Assigned']
+        assert omniplan.resolve_columns(header) == (5, 3, 1, 2, 4)
+        header[4] = 'Completed'
+        assert omniplan.resolve_columns(header) == (5, 3, 1, 2, 4)
+
+    def test_resolve_columns_unknown(self):
+        """
+        A header without the needed columns is rejected.
+        """
+        with pytest.raises(ValueError):
+            omniplan.resolve_columns(['Task name', 'Start time'])
+
+    def test_from_row_omniplan2(self):
+        """
+        OmniPlan 2 date and assignment formats.
+        """
+        columns = omniplan.resolve_columns(['Start', 'End', 'Effort',
+                                            '%Done', 'Assigned'])
+        record = omniplan.TaskRecord.from_row(
+            ['12/5/14 8:00 AM', '12/22/14 8:53 AM', '2w', '25%',
+             'A {60% of 60%}; D {30% of 60%}'], columns)
+        assert record.start == date(2014, 12, 5)
+        assert record.end == date(2014, 12, 22)
+        assert record.effort == 80.
+        assert record.completion == 0.25
+        assert record.assigned == (('A', pytest.approx(2. / 3)),
+                                   ('D', pytest.approx(1. / 3)))
+
+    def test_from_row_missing_dates(self):
+        """
+        An assigned task left to do needs its dates, the others do not.
+        """
+        columns = omniplan.resolve_columns(['Start', 'End', 'Effort',
+                                            '%Done', 'Assigned'])
+        for row in (['', '6/9/17, 17:00', '1w', '0%', 'Kathleen'],
+                    ['6/5/17, 08:00', '', '1w', '50%', 'Kathleen']):
+            with pytest.raises(ValueError, match='Start or End'):
+                omniplan.TaskRecord.from_row(row, columns)
+        for row in (['', '', '1w', '100%', 'Kathleen'],
+                    ['', '', '', '0%', '']):
+            record = omniplan.TaskRecord.from_row(row, columns)
+            assert (record.start, record.end) == (None, None)
+
+    def test_resources(self):
+        """
+        The names are encoded to their ids, once per distinct cell.
+        """
+        columns = omniplan.resolve_columns(['Start', 'End', 'Effort',
+                                            '%Done', 'Assigned'])
+        row = ['6/5/17, 08:00', '6/9/17, 17:00', '1w', '0%',
+               'Kathleen {50% out of 100%}; Chris']
+        record = omniplan.TaskRecord.from_row(row, columns)
+        other = omniplan.TaskRecord.from_row(row, columns)
+        assert other.resources is record.resources
+        assert [(RESOURCES.names[resource], frac)
+                for (resource, frac) in record.resources] == \
+            list(record.assigned)
+        copy = pickle.loads(pickle.dumps(record))
+        assert copy.resources == record.resources
+        assert omniplan.TaskRecord(record.assigned, 40., None, None,
+                                   0.).resources == record.resources
+
+    def test_slots(self):
+        """
+        Only the projected columns are kept.
+        """
+        record = omniplan.TaskRecord([], 0., None, None, 0.)
+        assert not hasattr(record, '__dict__')
+
+
+class TestParsers(object):
+    """
+    Suite of tests for the memoized cell parsers.
+    """
+
+    def test_parse_date(self):
+        """
+        The m/d/yy fast path agrees with strptime, century pivot included.
+        """
+        for cell in ['6/5/17, 08:00', '12/11/18, 11:58', '12/5/14 8:00 AM',
+                     '1/2/68, 08:00', '1/2/69, 08:00', '02/28/00']:
+            date_only = cell.split(',')[0].split()[0]
+            assert omniplan.parse_date(cell) == \
+                datetime.strptime(date_only, '%m/%d/%y').date()
+
+    def test_parse_date_invalid(self):
+        """
+        Invalid dates are still rejected.
+        """
+        for cell in ['2/30/17, 08:00', '6/5/2017, 08:00', 'tomorrow']:
+            with pytest.raises(ValueError):
+                omniplan.parse_date(cell)
+
+    def test_parse_effort(self):
+        """
+        Mixed effort units.
+        """
+        assert omniplan.parse_effort('3w 4d 6h 35m 54s') == \
+            pytest.approx(120. + 32. + 6. + 35. / 60 + 54. / 3600)
+        assert omniplan.parse_effort('1mo 1.5d') == 172.
+        assert omniplan.parse_effort('') == 0.
+
+    def test_parse_assigned(self):
+        """
+        Fractions of the task, single and multiple assignees.
+        """
+        assert omniplan.parse_assigned('Kathleen') == (('Kathleen', 1.),)
+        assert omniplan.parse_assigned(
+            'Ricardo {15% out of 80%}; Chris {45% out of 90%}') == \
+            (('Ricardo', pytest.approx(0.25)),
+             ('Chris', pytest.approx(0.75)))
+
+    def test_malformed_cells(self):
+        """
+        Malformed cells raise ValueError, as the dates do.
+        """
+        with pytest.raises(ValueError, match='unit'):
+            omniplan.parse_effort('3w 2y')
+        for cell in ['abc', '3 w', '2d garbage', '1..5d']:
+            with pytest.raises(ValueError, match='effort'):
+                omniplan.parse_effort(cell)
+        with pytest.raises(ValueError):
+            omniplan.parse_assigned('Kathleen {lots}')
+        with pytest.raises(ValueError):
+            omniplan.parse_assigned('Kathleen {0% out of 100%}')
+
+    def test_cache_info(self):
+        """
+        Repeated cells are served from the caches.
+        """
+        omniplan.clear_parser_caches()
+        for _ in range(3):
+            omniplan.parse_assigned('Kathleen {60% out of 60%}')
+        info = omniplan.parser_cache_info()
+        assert sorted(info) == ['parse_assigned', 'parse_assigned_ids',
+                                'parse_date', 'parse_effort']
+        assert (info['parse_assigned'].hits,
+                info['parse_assigned'].misses) == (2, 1)
+        omniplan.clear_parser_caches()
+        assert omniplan.parser_cache_info()['parse_assigned'].hits == 0
+
+
+class TestRecordPipeline(object):
+    """
+    Suite of tests for the streaming of the records.
+    """
+
+    def test_iter_records(self, csv_export):
+        """
+        iter_records is lazy and yields one TaskRecord per row.
+        """
+        records = omniplan.iter_records(csv_export)
+        assert isinstance(records, types.GeneratorType)
+        records = list(records)
+        assert len(records) == 4
+        assert records[2].assigned == (('A', pytest.approx(1. / 3)),
+                                       ('B', pytest.approx(2. / 3)))
+
+    def test_active_records(self, csv_export):
+        """
+        Completed and unassigned tasks are filtered out.
+        """
+        active = omniplan.active_records(omniplan.iter_records(csv_export))
+        assert [record.effort for record in active] == [40., 80.]
+
+    def test_streamed_allocation(self, csv_export):
+        """
+        Streaming the records gives the same allocations as loading them.
+        """
+        streamed = omniplan.calculate_allocation(
+            omniplan.iter_records(csv_export))
+        loaded = omniplan.calculate_allocation(
+            omniplan.load_records(csv_export))
+        assert sorted(streamed) == sorted(loaded) == ['A', 'B']
+        for name in loaded:
+            assert streamed.allocation(name) == loaded.allocation(name)
+        assert streamed.allocation('A')[date(2017, 6, 1)] == \
+            pytest.approx(20. / 3)
+        assert streamed.allocation('B')[date(2017, 7, 1)] == \
+            pytest.approx(40.)
+
+    def test_fold_into_allocations(self, csv_export):
+        """
+        Allocations can be accumulated over several exports.
+        """
+        allocations = omniplan.calculate_allocation(
+            omniplan.iter_records(csv_export))
+        omniplan.calculate_allocation(omniplan.iter_records(csv_export),
+                                      allocations)
+        assert allocations.allocation('B')[date(2017, 7, 1)] == \
+            pytest.approx(80.)
+
+
+class TestTaskAllocation(object):
+    """
+    Suite of tests for the allocation of one task over its months.
+    """
+
+    def test_cumulative_business_days(self):
+        """
+        Business days up to the end of each month, across a year end.
+        """
+        (months, cumulative) = omniplan.cumulative_business_days(
+            date(2017, 12, 20), date(2018, 2, 2))
+        assert months == [date(2017, 12, 1), date(2018, 1, 1),
+                          date(2018, 2, 1)]
+        assert cumulative == [8, 8 + 23, 8 + 23 + 2]
+
+    def test_crossover(self):
+        """
+        Months before the completion level are done, the crossover month
+        has what is left of it, the months after their full share.
+        """
+        record = omniplan.TaskRecord((('A', 1.),), 330., date(2017, 12, 20),
+                                     date(2018, 2, 2), 0.5)
+        allocations = omniplan.calculate_allocation([record])
+        assert allocations.allocation('A') == pytest.approx(
+            {date(2017, 12, 1): 0., date(2018, 1, 1): 145.,
+             date(2018, 2, 1): 20.})
+
+    def test_completion_in_last_month(self):
+        """
+        A short task starting after the 15th, mostly done, keeps its last
+        month.
+        """
+        record = omniplan.TaskRecord((('A', 1.),), 90., date(2019, 6, 19),
+                                     date(2019, 7, 1), 0.95)
+        allocations = omniplan.calculate_allocation([record])
+        assert allocations.allocation('A') == pytest.approx(
+            {date(2019, 6, 1): 0., date(2019, 7, 1): 4.5})
+
+    def test_weekend_task(self):
+        """
+        No business day to pro-rate on, all in the first month.
+        """
+        record = omniplan.TaskRecord((('A', 1.),), 8., date(2017, 9, 30),
+                                     date(2017, 10, 1), 0.)
+        allocations = omniplan.calculate_allocation([record])
+        assert allocations.allocation('A') == {date(2017, 9, 1): 8.}
+
+    def test_zero_effort(self):
+        """
+        A multi-month task without effort has nothing left, as with the
+        NumPy engine and the other granularities.
+        """
+        record = omniplan.TaskRecord((('A', 1.),), 0., date(2017, 12, 20),
+                                     date(2018, 2, 2), 0.5)
+        allocations = omniplan.calculate_allocation([record])
+        assert allocations.allocation('A') == {date(2017, 12, 1): 0.,
+                                               date(2018, 1, 1): 0.,
+                                               date(2018, 2, 1): 0.}
@@ -0,0 +1,114 @@
+# pytest suite for oplx module
+
+"""
+Tests for the oplx module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import oplx
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN2_DOC = os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.oplx')
+OMNIPLAN2_CSV = os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.csv')
+
+SCENARIO = u'''<?xml version="1.0" encoding="utf-8" standalone="no"?>
+<scenario xmlns="http://www.omnigroup.com/namespace/OmniPlan/v2" id="s">
+  <start-date>2017-06-05T15:00:00.000Z</start-date>
+  <task id="t2">
+    <title>Waits on t1</title>
+    <effort>144000</effort>
+    <prerequisite-task idref="t1"/>
+    <assignment idref="r1" units="1"/>
+  </task>
+  <resource id="r1">
+    <name>A</name>
+  </resource>
+  <task id="t1">
+    <title>First</title>
+    <effort>28800</effort>
+    <percent-complete>0.5</percent-complete>
+    <assignment idref="r1" units="0.5"/>
+  </task>
+  <task id="t3">
+    <title>Waits on nothing that exists</title>
+    <prerequisite-task idref="t9"/>
+  </task>
+</scenario>
+'''
+
+
+class TestDocumentReader(object):
+    """
+    Suite of tests for the OmniPlan document reader.
+    """
+
+    def test_is_document(self):
+        """
+        .oplx bundles and XML files are documents, CSV files are not.
+        """
+        assert oplx.is_document(OMNIPLAN2_DOC)
+        assert oplx.is_document(OMNIPLAN2_DOC + os.sep)
+        assert oplx.is_document(os.path.join(OMNIPLAN2_DOC, 'Actual.xml'))
+        assert not oplx.is_document(OMNIPLAN2_CSV)
+
+    def test_same_as_csv_export(self):
+        """
+        The document gives the same tasks as its CSV export.
+        """
+        from_document = list(oplx.iter_document_records(OMNIPLAN2_DOC))
+        from_csv = list(omniplan.iter_records(OMNIPLAN2_CSV))
+        assert len(from_document) == len(from_csv)
+        for (task, expected) in zip(from_document, from_csv):
+            assert task.start == expected.start
+            assert task.end == expected.end
+            assert task.effort == pytest.approx(expected.effort)
+            assert task.completion == expected.completion
+            assert [name for (name, _) in task.assigned] == \
+                [name for (name, _) in expected.assigned]
+            assert [frac for (_, frac) in task.assigned] == \
+                pytest.approx([frac for (_, frac) in expected.assigned])
+
+    def test_allocation(self):
+        """
+        Same allocations from the document as from the CSV export.
+        """
+        allocations = omniplan.calculate_allocation(
+            omniplan.iter_export(OMNIPLAN2_DOC))
+        expected = omniplan.calculate_allocation(
+            omniplan.iter_export(OMNIPLAN2_CSV))
+        assert sorted(allocations) == sorted(expected)
+        for name in expected:
+            assert allocations.allocation(name) == \
+                pytest.approx(expected.allocation(name))
+
+    def test_forward_references(self, tmpdir):
+        """
+        Tasks waiting on later tasks are released when those are read,
+        and dangling prerequisites are reported.
+        """
+        xmlfile = tmpdir.join('Actual.xml')
+        xmlfile.write_text(SCENARIO, encoding='utf-8')
+        records = oplx.iter_document_records(str(xmlfile))
+        first = next(records)
+        assert (first.start, first.end, first.completion) == \
+            (date(2017, 6, 5), date(2017, 6, 6), 0.5)
+        second = next(records)
+        assert (second.start, second.end) == \
+            (date(2017, 6, 7), date(2017, 6, 13))
+        assert second.assigned == (('A', 1.),)
+        with pytest.raises(ValueError):
+            next(records)
@@ -0,0 +1,160 @@
+# pytest suite for periods module
+
+"""
+Tests for the periods module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import bizdays
+from klpymisc.admin import omniplan
+from klpymisc.admin import periods
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+EXPORTS = [os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.csv'),
+           os.path.join(TESTDATAPATH, 'OmniPlan3',
+                        'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')]
+
+
+def total(allocations, name):
+    """
+    Sum of the efforts of a resource in an AllocationTable.
+    """
+    return sum(allocations.allocation(name).values())
+
+
+class TestPeriodHelpers(object):
+    """
+    Suite of tests for the period functions.
+    """
+
+    def test_period_start(self):
+        """
+        Week, month and quarter starts.
+        """
+        day = date(2018, 2, 8)
+        assert periods.period_start(day, 'week') == date(2018, 2, 5)
+        assert periods.period_start(day, 'month') == date(2018, 2, 1)
+        assert periods.period_start(day, 'quarter') == date(2018, 1, 1)
+        with pytest.raises(ValueError):
+            periods.period_start(day, 'fortnight')
+
+    def test_period_starts(self):
+        """
+        Periods across a year change.
+        """
+        assert periods.period_starts(date(2017, 11, 15), date(2018, 4, 1),
+                                     'quarter') == \
+            [date(2017, 10, 1), date(2018, 1, 1), date(2018, 4, 1)]
+        assert periods.period_starts(date(2017, 12, 31), date(2018, 1, 8),
+                                     'week') == \
+            [date(2017, 12, 25), date(2018, 1, 1), date(2018, 1, 8)]
+
+    def test_period_label(self):
+        """
+        ISO week numbers take care of the year change.
+        """
+        assert periods.period_label(date(2018, 12, 31), 'week') == '2019-W01'
+        assert periods.period_label(date(2018, 2, 5), 'week') == '2018-W06'
+        assert periods.period_label(date(2018, 4, 1), 'quarter') == '2018Q2'
+        assert periods.period_label(date(2018, 4, 1), 'month') == 'April2018'
+
+
+class TestPeriodIndex(object):
+    """
+    Suite of tests for the PeriodIndex class.
+    """
+
+    def test_cover(self):
+        """
+        The index grows to cover new dates, and keeps its counts right.
+        """
+        index = periods.PeriodIndex(['month'])
+        index.cover(date(2017, 6, 5), date(2017, 6, 30))
+        origin = index.origin
+        index.cover(date(2017, 7, 1), date(2017, 7, 31))
+        assert index.origin == origin
+        index.cover(date(2010, 1, 1), date(2030, 1, 1))
+        assert index.origin < date(2010, 1, 1).toordinal()
+        start = date(2017, 6, 5).toordinal() - index.origin
+        end = date(2017, 6, 30).toordinal() - index.origin
+        assert index.bizdays[end + 1] - index.bizdays[start] == 20
+        assert index.bucket_dates['month'][index.buckets['month'][start]] \
+            == date(2017, 6, 1)
+
+    def test_holidays(self):
+        """
+        Holidays are not business days.
+        """
+        index = periods.PeriodIndex(
+            ['week'], bizdays.BusinessCalendar([date(2017, 7, 4)]))
+        index.cover(date(2017, 7, 3), date(2017, 7, 7))
+        start = date(2017, 7, 3).toordinal() - index.origin
+        assert index.bizdays[start + 5] - index.bizdays[start] == 4
+
+
+class TestCalculatePeriodAllocation(object):
+    """
+    Suite of tests for the single pass allocation.
+    """
+
+    def test_month_same_as_reference(self):
+        """
+        The monthly allocations are those of omniplan.calculate_allocation.
+        """
+        for export in EXPORTS:
+            expected = omniplan.calculate_allocation(
+                omniplan.iter_records(export))
+            allocations = periods.calculate_period_allocation(
+                omniplan.iter_records(export), ['month'])['month']
+            assert sorted(allocations) == sorted(expected)
+            for name in expected:
+                assert allocations.allocation(name) == \
+                    pytest.approx(expected.allocation(name))
+
+    def test_granularities_agree(self):
+        """
+        Every granularity allocates the same effort, and the quarters
+        are the sums of their months.
+        """
+        for export in EXPORTS:
+            allocations = periods.calculate_period_allocation(
+                omniplan.iter_records(export))
+            for name in allocations['month']:
+                month_total = total(allocations['month'], name)
+                assert total(allocations['week'], name) == \
+                    pytest.approx(month_total)
+                assert total(allocations['quarter'], name) == \
+                    pytest.approx(month_total)
+                months = allocations['month'].allocation(name)
+                for (quarter, hours) in \
+                        allocations['quarter'].allocation(name).items():
+                    assert hours == pytest.approx(sum(
+                        months.get(month, 0.)
+                        for month in periods.period_starts(
+                            quarter, quarter.replace(month=quarter.month + 2),
+                            'month')))
+
+    def test_write_weeks(self, tmpdir):
+        """
+        Weekly output, labelled with ISO weeks.
+        """
+        records = [omniplan.TaskRecord((('A', 1.),), 80., date(2017, 12, 25),
+                                       date(2018, 1, 5), 0.)]
+        allocations = periods.calculate_period_allocation(records, ['week'])
+        outputfile = tmpdir.join('weeks.csv')
+        omniplan.write_allocations(allocations['week'], str(outputfile))
+        assert outputfile.read().splitlines() == \
+            ['Resource,2017-W52,2018-W01', 'A,40.000000,40.000000']
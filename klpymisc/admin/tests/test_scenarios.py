@@ -0,0 +1,184 @@
+# pytest suite for scenarios module
+
+"""
+Tests for the scenarios module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import csv
+import os
+from datetime import timedelta
+from io import open
+
+import numpy as np
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import numpyengine
+from klpymisc.admin import scenarios
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+PLAN = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                    'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+def assert_same_allocations(allocations, expected):
+    """
+    Same resources, same months, same efforts within tolerance.
+    """
+    assert sorted(allocations) == sorted(expected)
+    for name in expected:
+        months = allocations.allocation(name)
+        assert sorted(months) == sorted(expected.allocation(name))
+        for (month, hours) in expected.allocation(name).items():
+            assert months[month] == pytest.approx(hours, abs=1e-9)
+
+
+def perturbed(records, shift=0, multiplier=1., completion=None):
+    """
+    Copies of the active records, perturbed one at a time.
+    """
+    return [omniplan.TaskRecord(record.assigned, record.effort * multiplier,
+                                record.start + timedelta(shift),
+                                record.end + timedelta(shift),
+                                record.completion if completion is None
+                                else completion)
+            for record in omniplan.active_records(records)]
+
+
+@pytest.fixture(scope='module')
+def records():
+    return omniplan.load_records(PLAN)
+
+
+class TestPerturbations(object):
+    """
+    Suite of tests for the broadcasting of the perturbations.
+    """
+
+    def test_per_scenario(self):
+        batch = scenarios.Perturbations(4, shift=[0, 7, 14])
+        assert len(batch) == 3
+        assert batch.shift.shape == (3, 4)
+        assert list(batch.shift[:, 0]) == [0, 7, 14]
+        assert (batch.multiplier == 1.).all()
+        assert np.isnan(batch.completion).all()
+        assert batch.names == ['0', '1', '2']
+
+    def test_per_task(self):
+        batch = scenarios.Perturbations(2, multiplier=[[1., 2.], [3., 4.]],
+                                        names=['a', 'b'])
+        assert batch.multiplier.tolist() == [[1., 2.], [3., 4.]]
+        assert batch.shift.shape == (2, 2)
+
+    def test_mismatch(self):
+        with pytest.raises(ValueError):
+            scenarios.Perturbations(3, multiplier=[[1., 2.]])
+        with pytest.raises(ValueError):
+            scenarios.Perturbations(3, shift=[0, 1], multiplier=[1., 2., 3.])
+        with pytest.raises(ValueError):
+            scenarios.Perturbations(3, shift=[0, 1], names=['a'])
+
+    def test_monte_carlo(self):
+        first = scenarios.monte_carlo(10, 50, shift_sd=5., multiplier_sd=.2,
+                                      seed=3)
+        again = scenarios.monte_carlo(10, 50, shift_sd=5., multiplier_sd=.2,
+                                      seed=3)
+        assert first.shift.shape == (50, 10)
+        assert (first.shift == again.shift).all()
+        assert (first.multiplier > 0.).all()
+
+
+class TestEvaluate(object):
+    """
+    Suite of tests comparing each scenario to its own allocation.
+    """
+
+    def test_what_if(self, records):
+        cube = scenarios.what_if(records, shift=[0, 14, -3, 0, 0],
+                                 multiplier=[1., 1., 1., 1.5, 1.],
+                                 completion=[np.nan, np.nan, np.nan, np.nan,
+                                             0.])
+        assert len(cube) == 5
+        assert cube.hours.shape == (5, len(cube.resources), len(cube.months))
+        assert_same_allocations(cube.scenario(0),
+                                omniplan.calculate_allocation(records))
+        assert_same_allocations(cube.scenario('1'),
+                                omniplan.calculate_allocation(
+                                    perturbed(records, shift=14)))
+        assert_same_allocations(cube.scenario(2),
+                                omniplan.calculate_allocation(
+                                    perturbed(records, shift=-3)))
+        assert_same_allocations(cube.scenario(3),
+                                omniplan.calculate_allocation(
+                                    perturbed(records, multiplier=1.5)))
+        assert_same_allocations(cube.scenario(4),
+                                omniplan.calculate_allocation(
+                                    perturbed(records, completion=0.)))
+
+    def test_per_task_shift(self, records):
+        """
+        Each task of a scenario moves on its own.
+        """
+        columns = numpyengine.TaskColumns(records)
+        shifts = np.arange(len(columns)) % 3 * 10
+        cube = scenarios.evaluate(columns, scenarios.Perturbations(
+            len(columns), shift=shifts[np.newaxis, :]))
+        expected = [omniplan.TaskRecord(record.assigned, record.effort,
+                                        record.start + timedelta(int(shift)),
+                                        record.end + timedelta(int(shift)),
+                                        record.completion)
+                    for (record, shift) in
+                    zip(omniplan.active_records(records), shifts)]
+        assert_same_allocations(cube.scenario(0),
+                                omniplan.calculate_allocation(expected))
+
+    def test_wrong_number_of_tasks(self, records):
+        columns = numpyengine.TaskColumns(records)
+        with pytest.raises(ValueError):
+            scenarios.evaluate(columns,
+                               scenarios.Perturbations(len(columns) + 1))
+
+    def test_no_tasks(self):
+        cube = scenarios.what_if([], shift=[0, 1])
+        assert cube.hours.shape == (2, 0, 0)
+        assert len(cube.scenario(1)) == 0
+
+
+class TestBands(object):
+    """
+    Suite of tests for the percentile bands.
+    """
+
+    def test_percentiles(self, records):
+        columns = numpyengine.TaskColumns(records)
+        cube = scenarios.evaluate(columns, scenarios.monte_carlo(
+            len(columns), 40, shift_sd=10., multiplier_sd=.3, seed=5))
+        bands = cube.percentiles()
+        assert bands.shape == (3,) + cube.hours.shape[1:]
+        assert (bands[0] <= bands[1] + 1e-9).all()
+        assert (bands[1] <= bands[2] + 1e-9).all()
+        assert cube.totals().shape == (40, len(cube.resources))
+
+    def test_write_bands(self, records, tmpdir):
+        cube = scenarios.what_if(records, multiplier=[1., 2.])
+        outputfile = str(tmpdir.join('bands.csv'))
+        cube.write_bands(outputfile, q=(0, 100))
+        with open(outputfile, encoding='utf-8') as filehandle:
+            rows = list(csv.reader(filehandle))
+        assert rows[0][:2] == ['Resource', 'Percentile']
+        assert len(rows) == 1 + 2 * len(cube.resources)
+        row = cube.resources.index(rows[1][0])
+        assert rows[1][1] == '0'
+        assert [float(hours) for hours in rows[1][2:]] == \
+            pytest.approx(cube.hours[0, row], abs=1e-5)
+        assert [float(hours) for hours in rows[2][2:]] == \
+            pytest.approx(cube.hours[1, row], abs=1e-5)
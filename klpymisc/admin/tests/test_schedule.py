@@ -0,0 +1,181 @@
+# pytest suite for schedule module
+
+"""
+Tests for the schedule module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+import random
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import schedule
+from klpymisc.admin.bizdays import business_day_date, business_day_index
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+def task(wbs, start, end, prerequisites='', assigned=(('A', 1.),)):
+    """
+    A schedule row, the dates as business day numbers from 2018-01-01.
+    """
+    origin = business_day_index(date(2018, 1, 1))
+    return (wbs, prerequisites,
+            omniplan.TaskRecord(assigned, 8. * (end - start + 1),
+                                business_day_date(origin + start),
+                                business_day_date(origin + end), 0.))
+
+
+def day(number):
+    return business_day_date(business_day_index(date(2018, 1, 1)) + number)
+
+
+class TestParsePrerequisites(object):
+    """
+    Suite of tests for the parsing of the Prerequisites cell.
+    """
+
+    def test_kinds(self):
+        assert schedule.parse_prerequisites('1.3SF, 1.1') == \
+            (('1.3', 'SF', 0), ('1.1', 'FS', 0))
+        assert schedule.parse_prerequisites('4SS,2.1FF') == \
+            (('4', 'SS', 0), ('2.1', 'FF', 0))
+        assert schedule.parse_prerequisites('') == ()
+
+    def test_lags(self):
+        assert schedule.parse_prerequisites('2FS+2d, 3SS-1w') == \
+            (('2', 'FS', 2), ('3', 'SS', -5))
+
+
+class TestSchedule(object):
+    """
+    Suite of tests for the propagation of the dates.
+    """
+
+    def test_exported_dates_kept(self):
+        """
+        The plan as exported does not move.
+        """
+        plan = schedule.read_schedule(OMNIPLAN3)
+        assert not any(plan.shifts)
+        assert plan.visited == len(plan)
+        records = omniplan.load_records(OMNIPLAN3)
+        assert [(record.start, record.end) for record in plan.records()] \
+            == [(record.start, record.end) for record in records]
+
+    def test_kinds(self):
+        plan = schedule.Schedule([
+            task('1', 0, 4),
+            task('2', 2, 3, '1'),
+            task('3', 0, 1, '1SS+3d'),
+            task('4', 0, 1, '1FF'),
+            task('5', 0, 1, '1SF'),
+            task('6', 0, 0, '2, 3, 4, 5')])
+        assert plan.dates('2') == (day(4), day(5))
+        assert plan.dates('3') == (day(3), day(4))
+        assert plan.dates('4') == (day(3), day(4))
+        assert plan.dates('5') == (day(0), day(1))
+        assert plan.dates('6') == (day(5), day(5))
+
+    def test_update_downstream_only(self):
+        plan = schedule.Schedule([
+            task('1', 0, 4),
+            task('2', 5, 9, '1'),
+            task('3', 10, 14, '2'),
+            task('4', 0, 20),
+            task('5', 25, 30, '3, 4')])
+        moved = plan.update(slips={'2': 3})
+        assert moved == ['2', '3']
+        assert plan.visited == 3
+        assert plan.dates('3') == (day(12), day(16))
+        assert plan.dates('5') == (day(25), day(30))
+        moved = plan.update(extensions={'3': 10})
+        assert moved == ['3', '5']
+        assert plan.dates('5') == (day(26), day(31))
+        assert plan.dates('1') == (day(0), day(4))
+        plan.update(slips={'2': 0}, extensions={'3': 0})
+        assert not any(plan.shifts)
+
+    def test_split_task(self):
+        """
+        The segments of a split task move together; the last one takes
+        the extension.
+        """
+        plan = schedule.Schedule([
+            task('1', 0, 4),
+            task('2', 3, 4, '1'),
+            task('2', 10, 12, '1'),
+            task('3', 13, 13, '2')])
+        plan.update(slips={'1': 5}, extensions={'2': 1})
+        records = plan.records()
+        assert [(record.start, record.end) for record in records[1:3]] == \
+            [(day(9), day(10)), (day(16), day(19))]
+        assert plan.dates('3') == (day(19), day(19))
+
+    def test_records_reused(self):
+        rows = [task('1', 0, 4), task('2', 5, 9, '1'), task('3', 0, 9)]
+        plan = schedule.Schedule(rows)
+        plan.update(slips={'2': 1})
+        records = plan.records()
+        assert records[0] is rows[0][2]
+        assert records[1] is not rows[1][2]
+        assert records[2] is rows[2][2]
+
+    def test_missing_and_cycle(self):
+        plan = schedule.Schedule([task('1', 0, 4, '9.9')])
+        assert plan.missing == [('1', '9.9')]
+        with pytest.raises(ValueError, match='cycle'):
+            schedule.Schedule([task('1', 0, 4, '3'), task('2', 0, 4, '1'),
+                               task('3', 0, 4, '2')])
+        with pytest.raises(KeyError):
+            plan.update(slips={'2': 1})
+
+    def test_incremental_same_as_full(self):
+        """
+        On a random graph, updates move the tasks as a full propagation.
+        """
+        rng = random.Random(11)
+        rows = []
+        for number in range(300):
+            start = rng.randint(0, 200)
+            prerequisites = ', '.join(
+                '%d%s' % (other, rng.choice(['', 'FS', 'SS', 'FF', 'SF']))
+                for other in rng.sample(range(number),
+                                        min(number, rng.randint(0, 3))))
+            rows.append(task(str(number), start,
+                             start + rng.randint(0, 20), prerequisites))
+        plan = schedule.Schedule(rows)
+        for _ in range(20):
+            wbs = str(rng.randrange(300))
+            if rng.random() < 0.5:
+                plan.update(slips={wbs: rng.randint(0, 30)})
+            else:
+                plan.update(extensions={wbs: rng.randint(0, 10)})
+            shifts = list(plan.shifts)
+            plan.propagate()
+            assert plan.shifts == shifts
+
+    def test_allocation(self):
+        """
+        The records feed the allocation.
+        """
+        plan = schedule.Schedule([task('1', 0, 4), task('2', 5, 24, '1')])
+        before = omniplan.calculate_allocation(plan.records())
+        plan.update(slips={'1': 20})
+        after = omniplan.calculate_allocation(plan.records())
+        assert sum(before.allocation('A').values()) == \
+            pytest.approx(sum(after.allocation('A').values()))
+        assert max(after.allocation('A')) > max(before.allocation('A'))
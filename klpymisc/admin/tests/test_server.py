@@ -0,0 +1,216 @@
+# pytest suite for server module
+
+"""
+Tests for the server module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import json
+import os
+import shutil
+import threading
+from datetime import date
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import server
+from klpymisc.admin.alloctable import period_index
+
+# pylint: disable=invalid-name, no-self-use, redefined-outer-name
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN2 = os.path.join(TESTDATAPATH, 'OmniPlan2', 'OmniPlan.csv')
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+@pytest.fixture
+def allocations():
+    return omniplan.calculate_allocation(omniplan.iter_records(OMNIPLAN3))
+
+
+def hours_between(allocations, name, start, end):
+    """
+    Brute force sum of the hours of a resource over the months.
+    """
+    return sum(hours for (month, hours) in
+               allocations.allocation(name).items() if start <= month <= end)
+
+
+class TestAllocationIndex(object):
+    """
+    Suite of tests for the AllocationIndex class.
+    """
+
+    def test_ranges(self, allocations):
+        """
+        Range sums are the sums of the months.
+        """
+        index = server.AllocationIndex(allocations)
+        months = allocations.periods()
+        for name in allocations:
+            for (start, end) in ((0, -1), (3, 7), (5, 5), (8, 2)):
+                expected = hours_between(allocations, name, months[start],
+                                         months[end])
+                assert index.hours(name, period_index(months[start]),
+                                   period_index(months[end])) == \
+                    pytest.approx(expected)
+            assert index.hours(name) == \
+                pytest.approx(sum(allocations.allocation(name).values()))
+            assert [hours for (_, hours) in index.months(name)] == \
+                pytest.approx(list(allocations.row(name)[0]))
+        assert index.total() == pytest.approx(
+            sum(index.hours(name) for name in allocations))
+
+    def test_clipped(self, allocations):
+        """
+        Ranges outside of the span are clipped.
+        """
+        index = server.AllocationIndex(allocations)
+        name = index.resources[0]
+        assert index.hours(name, period_index(date(1990, 1, 1)),
+                           period_index(date(2090, 1, 1))) == \
+            pytest.approx(index.hours(name))
+        assert index.hours(name, period_index(date(2090, 1, 1))) == 0.
+        with pytest.raises(KeyError):
+            index.hours('Nobody')
+
+
+class TestPlanSet(object):
+    """
+    Suite of tests for the PlanSet class.
+    """
+
+    def test_reload(self, tmpdir):
+        """
+        Plans are merged, and reloaded only when changed.
+        """
+        plan = str(tmpdir.join('plan.csv'))
+        shutil.copy(OMNIPLAN2, plan)
+        plans = server.PlanSet([plan, OMNIPLAN3])
+        expected = omniplan.calculate_allocation(
+            omniplan.iter_records(OMNIPLAN3))
+        omniplan.calculate_allocation(omniplan.iter_records(OMNIPLAN2),
+                                      expected)
+        assert plans.index.total() == \
+            pytest.approx(server.AllocationIndex(expected).total())
+
+        index = plans.index
+        assert not plans.reload()
+        assert plans.index is index
+
+        with open(OMNIPLAN2) as filehandle:
+            header = filehandle.readline()
+        with open(plan, 'w') as filehandle:
+            filehandle.write(header)
+        assert plans.reload()
+        assert plans.index.total() == \
+            pytest.approx(server.AllocationIndex(
+                omniplan.calculate_allocation(
+                    omniplan.iter_records(OMNIPLAN3))).total())
+
+
+    def test_malformed_plan(self, tmpdir, capsys):
+        """
+        A malformed cell is logged, the last allocations are kept.
+        """
+        plan = str(tmpdir.join('plan.csv'))
+        shutil.copy(OMNIPLAN3, plan)
+        plans = server.PlanSet([plan])
+        total = plans.index.total()
+        with open(OMNIPLAN3) as filehandle:
+            content = filehandle.read()
+        with open(plan, 'w') as filehandle:
+            filehandle.write(content.replace(',1w,', ',1y,', 1))
+        assert not plans.reload()
+        assert 'Cannot read' in capsys.readouterr().out
+        assert plans.index.total() == total
+
+    def test_reload_loop_survives(self, capsys):
+        """
+        An unexpected error is logged, the reloads go on.
+        """
+        stop = threading.Event()
+
+        class Plans(object):
+            reloads = 0
+
+            def reload(self):
+                self.reloads += 1
+                if self.reloads == 1:
+                    raise ZeroDivisionError('division by zero')
+                stop.set()
+
+        plans = Plans()
+        server.reload_loop(plans, interval=0., stop=stop)
+        assert plans.reloads == 2
+        assert 'Reload failed: ZeroDivisionError' in capsys.readouterr().out
+
+
+class TestAllocationServer(object):
+    """
+    Suite of tests for the HTTP queries.
+    """
+
+    @pytest.fixture
+    def url(self):
+        plans = server.PlanSet([OMNIPLAN3])
+        httpd = server.AllocationServer(plans, port=0)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        yield 'http://127.0.0.1:%d' % httpd.server_address[1]
+        httpd.shutdown()
+        httpd.server_close()
+
+    def test_queries(self, url, allocations):
+        """
+        Resources, hours, months and totals.
+        """
+        def get(path):
+            return json.loads(urlopen(url + path).read().decode('utf-8'))
+
+        content = get('/resources')
+        assert content['resources'] == sorted(allocations)
+        assert (content['start'], content['end']) == ('2017-06', '2018-12')
+
+        content = get('/hours?resource=Ken&start=2017-06&end=2017-08')
+        assert content['hours'] == pytest.approx(hours_between(
+            allocations, 'Ken', date(2017, 6, 1), date(2017, 8, 1)))
+
+        content = get('/months?resource=Ken&start=2017-06&end=2017-07')
+        assert [month for (month, _) in content['months']] == \
+            ['2017-06', '2017-07']
+
+        content = get('/total?resource=Ken,Chris')
+        assert content['hours'] == pytest.approx(
+            sum(allocations.allocation('Ken').values()) +
+            sum(allocations.allocation('Chris').values()))
+
+    def test_errors(self, url):
+        """
+        Unknown queries and resources, invalid months.
+        """
+        for (path, status) in (('/nothing', 404),
+                               ('/hours?resource=Nobody', 404),
+                               ('/hours', 400),
+                               ('/total?start=June', 400)):
+            with pytest.raises(HTTPError) as err:
+                urlopen(url + path)
+            assert err.value.code == status
+
+    def test_localhost_only(self):
+        """
+        The server does not listen on other interfaces.
+        """
+        with pytest.raises(ValueError):
+            server.AllocationServer(None, host='0.0.0.0', port=0)
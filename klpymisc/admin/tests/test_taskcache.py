@@ -0,0 +1,126 @@
+# pytest suite for taskcache module
+
+"""
+Tests for the taskcache module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+from datetime import date
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import taskcache
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+def assert_same_allocations(allocations, expected):
+    """
+    Same resources, same months, same efforts within tolerance.
+    """
+    assert sorted(allocations) == sorted(expected)
+    for name in expected:
+        assert allocations.allocation(name) == \
+            pytest.approx(expected.allocation(name), abs=1e-9)
+
+
+class TestContributionCache(object):
+    """
+    Suite of tests for the ContributionCache class.
+    """
+
+    def test_first_run(self, tmpdir):
+        """
+        Without a cache file, everything is computed.
+        """
+        records = omniplan.load_records(OMNIPLAN3)
+        cache = taskcache.ContributionCache(str(tmpdir.join('cache.json')))
+        cache.update(records)
+        assert cache.added == len(list(omniplan.active_records(records)))
+        assert_same_allocations(cache.allocations(),
+                                omniplan.calculate_allocation(records))
+
+    def test_rerun(self, tmpdir):
+        """
+        With an up to date cache, nothing is recomputed.
+        """
+        cachefile = str(tmpdir.join('cache.json'))
+        records = omniplan.load_records(OMNIPLAN3)
+        cache = taskcache.ContributionCache(cachefile)
+        cache.update(records)
+        cache.save()
+
+        cache = taskcache.ContributionCache(cachefile)
+        cache.update(records)
+        assert (cache.added, cache.removed) == (0, 0)
+        assert_same_allocations(cache.allocations(),
+                                omniplan.calculate_allocation(records))
+
+    def test_edits(self, tmpdir):
+        """
+        Changed, new and removed tasks are applied to the totals.
+        """
+        cachefile = str(tmpdir.join('cache.json'))
+        records = omniplan.load_records(OMNIPLAN3)
+        cache = taskcache.ContributionCache(cachefile)
+        cache.update(records)
+        cache.save()
+
+        active = list(omniplan.active_records(records))
+        edited = active[2:]
+        edited[0] = omniplan.TaskRecord(edited[0].assigned, edited[0].effort,
+                                        edited[0].start, edited[0].end,
+                                        0.5 * edited[0].completion + 0.1)
+        edited.append(omniplan.TaskRecord((('Newcomer', 1.),), 80.,
+                                          date(2018, 1, 8), date(2018, 2, 2),
+                                          0.))
+        cache = taskcache.ContributionCache(cachefile)
+        cache.update(edited)
+        assert (cache.added, cache.removed) == (2, 3)
+        assert_same_allocations(cache.allocations(),
+                                omniplan.calculate_allocation(edited))
+
+    def test_duplicate_tasks(self, tmpdir):
+        """
+        Identical tasks are counted as many times as they appear.
+        """
+        task = omniplan.TaskRecord((('A', 1.),), 40., date(2017, 6, 5),
+                                   date(2017, 6, 9), 0.)
+        cache = taskcache.ContributionCache(str(tmpdir.join('cache.json')))
+        cache.update([task, task])
+        assert cache.allocations().allocation('A') == \
+            {date(2017, 6, 1): 80.}
+        cache.update([task])
+        assert cache.allocations().allocation('A') == \
+            {date(2017, 6, 1): 40.}
+        cache.update([])
+        assert len(cache.allocations()) == 0
+
+    def test_holidays_invalidate(self, tmpdir):
+        """
+        A different holiday calendar discards the cache.
+        """
+        task = omniplan.TaskRecord((('A', 1.),), 80., date(2017, 6, 26),
+                                   date(2017, 7, 7), 0.)
+        cache = taskcache.ContributionCache(str(tmpdir.join('cache.json')))
+        cache.update([task])
+        omniplan.set_holidays([date(2017, 7, 4)])
+        try:
+            cache.update([task])
+        finally:
+            omniplan.set_holidays([])
+        assert cache.added == 1
+        assert cache.allocations().allocation('A')[date(2017, 6, 1)] == \
+            pytest.approx(80. * 5 / 9)
@@ -0,0 +1,148 @@
+# pytest suite for timepivot module
+
+"""
+Tests for the timepivot module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import csv
+import json
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from klpymisc.admin import timepivot
+from klpymisc.admin.timesheet import Timecard
+
+# pylint: disable=invalid-name, no-self-use
+
+
+def random_timecard(seed=5, nentries=2000):
+    rng = random.Random(seed)
+    timecard = Timecard()
+    for _ in range(nentries):
+        timecard.add(rng.choice(['Admin', 'DRAGONS', 'Meetings']),
+                     date(2014, 10, 20) + timedelta(rng.randint(0, 400)),
+                     rng.choice([0.25, 0.5, 0.75]))
+    return timecard
+
+
+def reference_rollup(timecard, start_of):
+    """
+    Totals of each category per period, summed entry by entry.
+    """
+    totals = {}
+    for category in timecard:
+        for (day, hours) in timecard.hours[category].items():
+            key = (category, start_of(day))
+            totals[key] = totals.get(key, 0.) + hours
+    return totals
+
+
+class TestPeriodStarts(object):
+    """
+    Suite of tests for the period of the days.
+    """
+
+    def test_views(self):
+        days = np.array(['2014-10-19', '2014-10-20', '2014-10-26',
+                         '2014-11-01'], dtype='datetime64[D]')
+        assert timepivot.period_starts(days, 'week').tolist() == \
+            [date(2014, 10, 13), date(2014, 10, 20), date(2014, 10, 20),
+             date(2014, 10, 27)]
+        assert timepivot.period_starts(days, 'month').tolist() == \
+            [date(2014, 10, 1)] * 3 + [date(2014, 11, 1)]
+        assert timepivot.period_starts(
+            days, 'payperiod', date(2014, 10, 20), 7).tolist() == \
+            [date(2014, 10, 13), date(2014, 10, 20), date(2014, 10, 20),
+             date(2014, 10, 27)]
+        with pytest.raises(ValueError):
+            timepivot.period_starts(days, 'year')
+
+
+class TestTimesheetPivot(object):
+    """
+    Suite of tests for the pivot and its rollups.
+    """
+
+    def test_from_timecard(self):
+        timecard = random_timecard()
+        pivot = timepivot.TimesheetPivot.from_timecard(timecard)
+        assert pivot.categories == list(timecard)
+        for (row, category) in enumerate(pivot.categories):
+            for (day, hours) in timecard.hours[category].items():
+                column = (np.datetime64(day) - pivot.days[0]).astype(int)
+                assert pivot.hours[row, column] == hours
+        assert pivot.hours.sum() == \
+            pytest.approx(sum(sum(days.values())
+                              for days in timecard.hours.values()))
+
+    def test_rollups_against_reference(self):
+        timecard = random_timecard()
+        pivot = timepivot.TimesheetPivot.from_timecard(timecard)
+        origin = timepivot.PAY_PERIOD_ORIGIN
+        references = {
+            'day': lambda day: day,
+            'week': lambda day: day - timedelta(day.weekday()),
+            'month': lambda day: day.replace(day=1),
+            'payperiod': lambda day: day - timedelta(
+                (day - origin).days % timepivot.PAY_PERIOD_DAYS),
+        }
+        for (view, start_of) in references.items():
+            (periods, hours) = pivot.rollup(view)
+            expected = reference_rollup(timecard, start_of)
+            assert hours.sum() == pytest.approx(sum(expected.values()))
+            for (row, category) in enumerate(pivot.categories):
+                for (column, period) in enumerate(periods.tolist()):
+                    assert hours[row, column] == pytest.approx(
+                        expected.get((category, period), 0.))
+
+    def test_empty(self):
+        pivot = timepivot.TimesheetPivot.from_timecard(Timecard())
+        (periods, hours) = pivot.rollup('week')
+        assert len(periods) == 0
+        assert hours.shape == (0, 0)
+
+
+class TestWrite(object):
+    """
+    Suite of tests for the outputs.
+    """
+
+    def test_formats(self, tmpdir):
+        timecard = Timecard()
+        timecard.add('Admin', date(2014, 10, 20), 1.5)
+        timecard.add('DRAGONS', date(2014, 11, 3), 2.)
+        pivot = timepivot.TimesheetPivot.from_timecard(timecard)
+
+        outputfile = str(tmpdir.join('timesheet.csv'))
+        timepivot.write(pivot, outputfile, views=('month', 'week'))
+        with open(str(tmpdir.join('timesheet_month.csv'))) as filehandle:
+            rows = list(csv.reader(filehandle))
+        assert rows == [['Category', 'October2014', 'November2014'],
+                        ['Admin', '1.500000', '0.000000'],
+                        ['DRAGONS', '0.000000', '2.000000']]
+        assert tmpdir.join('timesheet_week.csv').check()
+
+        outputfile = str(tmpdir.join('timesheet.json'))
+        timepivot.write(pivot, outputfile)
+        with open(outputfile) as filehandle:
+            document = json.load(filehandle)
+        assert document['categories'] == ['Admin', 'DRAGONS']
+        assert sorted(document['views']) == sorted(timepivot.VIEWS)
+        assert document['views']['week']['periods'] == \
+            ['2014-10-20', '2014-10-27', '2014-11-03']
+
+        outputfile = str(tmpdir.join('timesheet.out'))
+        timepivot.write(pivot, outputfile, fmt='npz')
+        with np.load(outputfile) as archive:
+            assert archive['categories'].tolist() == ['Admin', 'DRAGONS']
+            assert archive['day_hours'].shape == (2, 15)
+            assert archive['payperiod_hours'].sum() == 3.5
@@ -0,0 +1,172 @@
+# pytest suite for timesheet module
+
+"""
+Tests for the timesheet module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+from datetime import date
+
+import pytest
+from dateutil import parser as dateparser
+
+from klpymisc.admin import timesheet
+
+# pylint: disable=invalid-name, no-self-use
+
+EXPORT = u'''Duration in hours, Start time, End time, Tag, Notes
+0.25,"Oct 20, 2014, 07:45:00 HST","Oct 20, 2014, 08:00:00 HST",Admin,
+0.5,"Oct 20, 2014, 08:00:00 HST","Oct 20, 2014, 08:30:00 HST",DRAGONS,"a, b"
+
+1.25,"Oct 21, 2014, 09:00:00 HST","Oct 21, 2014, 10:15:00 HST",Admin,
+0.75,"Oct 20, 2014, 16:00:00 HST","Oct 20, 2014, 16:45:00 HST",Admin,
+'''
+
+
+@pytest.fixture()
+def export(tmpdir):
+    """
+    Small export written to a temporary file.
+    """
+    inputfile = tmpdir.join('export.csv')
+    inputfile.write_text(EXPORT, encoding='utf-8')
+    return str(inputfile)
+
+
+class TestParseStartTime(object):
+    """
+    Suite of tests for the parsing of the start times.
+    """
+
+    def test_fixed_layout(self):
+        """
+        Same dates as dateutil, the date part parsed once.
+        """
+        timesheet.parse_date_prefix.cache_clear()
+        for timestamp in ('Oct 20, 2014, 07:45:00 HST',
+                          ' Oct 20, 2014, 23:59:59 HST',
+                          'Feb 3, 2016, 00:00:00 PST'):
+            assert timesheet.parse_start_time(timestamp) == \
+                dateparser.parse(timestamp.replace(' HST', '').replace(
+                    ' PST', '')).date()
+        info = timesheet.parse_date_prefix.cache_info()
+        assert (info.hits, info.misses) == (1, 2)
+
+    def test_fallback(self):
+        assert timesheet.parse_start_time('2014-10-20 07:45') == \
+            date(2014, 10, 20)
+        assert timesheet.parse_start_time('October 20, 2014, 07:45') == \
+            date(2014, 10, 20)
+        with pytest.raises(ValueError):
+            timesheet.parse_start_time('Feb 30, 2016, 00:00:00 HST')
+
+
+class TestTimecard(object):
+    """
+    Suite of tests for the aggregation of the entries.
+    """
+
+    def test_read_timecard(self, export):
+        timecard = timesheet.read_timecard(export)
+        assert list(timecard) == ['Admin', 'DRAGONS']
+        assert timecard.days('Admin') == [(date(2014, 10, 20), 1.),
+                                          (date(2014, 10, 21), 1.25)]
+        assert timecard.days('DRAGONS') == [(date(2014, 10, 20), 0.5)]
+        timesheet.read_timecard(export, timecard)
+        assert timecard.hours['Admin'][date(2014, 10, 21)] == 2.5
+
+    def test_bad_header(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write_text(u'Duration in hours, Tag\n1,Admin\n',
+                             encoding='utf-8')
+        with pytest.raises(ValueError, match='header'):
+            timesheet.read_timecard(str(inputfile))
+
+    def test_bad_row(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write_text(EXPORT + u'x,"Oct 22, 2014, 09:00:00 HST",,A,\n',
+                             encoding='utf-8')
+        with pytest.raises(ValueError, match='line 7'):
+            timesheet.read_timecard(str(inputfile))
+
+
+class TestTimesheetCheckpoint(object):
+    """
+    Suite of tests for the incremental reading of a growing export.
+    """
+
+    @staticmethod
+    def totals(timecard):
+        return dict((category, timecard.days(category))
+                    for category in timecard)
+
+    def test_append(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        statefile = str(tmpdir.join('export.state'))
+        lines = EXPORT.splitlines(True)
+        inputfile.write_text(u''.join(lines[:3]), encoding='utf-8')
+        checkpoint = timesheet.TimesheetCheckpoint(statefile)
+        checkpoint.update(str(inputfile))
+        assert (checkpoint.restarted, checkpoint.entries) == (True, 2)
+        checkpoint.save()
+
+        inputfile.write_text(u''.join(lines), encoding='utf-8')
+        checkpoint = timesheet.TimesheetCheckpoint(statefile)
+        timecard = checkpoint.update(str(inputfile))
+        assert (checkpoint.restarted, checkpoint.entries) == (False, 2)
+        assert self.totals(timecard) == \
+            self.totals(timesheet.read_timecard(str(inputfile)))
+        checkpoint.update(str(inputfile))
+        assert (checkpoint.restarted, checkpoint.entries) == (False, 0)
+
+    def test_incomplete_last_row(self, tmpdir):
+        """
+        A row still being written is left for the next update.
+        """
+        inputfile = tmpdir.join('export.csv')
+        lines = EXPORT.splitlines(True)
+        checkpoint = timesheet.TimesheetCheckpoint(None)
+        for partial in (u'0.5,"Oct 22', u'0.5,"Oct 22, 2014, 09:00:00 HST"',
+                        u'0.5,"Oct 22, 2014, 09:00:00 HST",,Admin,"a\n'):
+            inputfile.write_text(u''.join(lines) + partial,
+                                 encoding='utf-8')
+            checkpoint.update(str(inputfile))
+            assert checkpoint.offset == len(EXPORT)
+        inputfile.write_text(u''.join(lines) + partial + u'b"\n',
+                             encoding='utf-8')
+        timecard = checkpoint.update(str(inputfile))
+        assert checkpoint.entries == 1
+        assert timecard.hours['Admin'][date(2014, 10, 22)] == 0.5
+
+    @pytest.mark.parametrize('rewrite', [
+        EXPORT.splitlines(True)[0] + u'1,"Oct 20, 2014, 07:45:00 HST",,B,\n',
+        EXPORT.replace(u'Notes', u'Memo'),
+        EXPORT.replace(u'0.75,', u'0.50,')])
+    def test_restart(self, tmpdir, rewrite):
+        """
+        Shrunk, new header or rewritten: read from the start.
+        """
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write_text(EXPORT, encoding='utf-8')
+        checkpoint = timesheet.TimesheetCheckpoint(None)
+        checkpoint.update(str(inputfile))
+        inputfile.write_text(rewrite, encoding='utf-8')
+        timecard = checkpoint.update(str(inputfile))
+        assert checkpoint.restarted
+        assert self.totals(timecard) == \
+            self.totals(timesheet.read_timecard(str(inputfile)))
+
+    def test_error_line(self, tmpdir):
+        inputfile = tmpdir.join('export.csv')
+        inputfile.write_text(EXPORT, encoding='utf-8')
+        checkpoint = timesheet.TimesheetCheckpoint(None)
+        checkpoint.update(str(inputfile))
+        inputfile.write_text(EXPORT + u'x,"Oct 22, 2014, 09:00:00 HST",,A,\n',
+                             encoding='utf-8')
+        with pytest.raises(ValueError, match='line 7'):
+            checkpoint.update(str(inputfile))
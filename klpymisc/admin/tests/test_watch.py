@@ -0,0 +1,121 @@
+# pytest suite for watch module
+
+"""
+Tests for the watch module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import csv
+import os
+
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import watch
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+def reference_output(inputfile, outputfile):
+    """
+    The output of a full run.
+    """
+    omniplan.write_allocations(
+        omniplan.calculate_allocation(omniplan.iter_records(inputfile)),
+        outputfile)
+    with open(outputfile) as filehandle:
+        return filehandle.read()
+
+
+def write_rows(filename, rows):
+    with open(filename, 'w') as filehandle:
+        csv.writer(filehandle).writerows(rows)
+
+
+class TestAllocationWatcher(object):
+    """
+    Suite of tests for the AllocationWatcher class.
+    """
+
+    def test_refresh(self, tmpdir):
+        """
+        Only the edited rows are recomputed, the output is that of a full
+        run, and it is not rewritten when nothing changed.
+        """
+        with open(OMNIPLAN3) as filehandle:
+            rows = list(csv.reader(filehandle))
+        inputfile = tmpdir.join('export.csv')
+        write_rows(str(inputfile), rows)
+        outputfile = tmpdir.join('alloc.csv')
+        watcher = watch.AllocationWatcher(str(inputfile), str(outputfile))
+        assert watcher.refresh()
+        assert outputfile.read() == \
+            reference_output(str(inputfile), str(tmpdir.join('ref.csv')))
+
+        assert not watcher.refresh()
+        assert (watcher.cache.added, watcher.cache.removed) == (0, 0)
+
+        # Change the effort of the first task with some left to do.
+        columns = omniplan.resolve_columns(rows[0])
+        for row in rows[1:]:
+            if row[columns[0]] and row[columns[1]] and \
+                    row[columns[4]] == '0%':
+                row[columns[1]] = '2d 4h'
+                break
+        write_rows(str(inputfile), rows)
+        assert watcher.refresh()
+        assert (watcher.cache.added, watcher.cache.removed) == (1, 1)
+        assert outputfile.read() == \
+            reference_output(str(inputfile), str(tmpdir.join('ref.csv')))
+
+    def test_unreadable_export(self, tmpdir):
+        """
+        A half-written export is skipped, the last allocations are kept.
+        """
+        inputfile = tmpdir.join('export.csv')
+        with open(OMNIPLAN3) as filehandle:
+            inputfile.write(filehandle.read())
+        outputfile = tmpdir.join('alloc.csv')
+        watcher = watch.AllocationWatcher(str(inputfile), str(outputfile))
+        watcher.watch(interval=0., max_changes=1)
+        expected = outputfile.read()
+
+        inputfile.write('WBS Number,Ti')
+        with pytest.raises(ValueError):
+            watcher.refresh()
+        watcher.watch(interval=0., max_changes=1)
+        assert watcher.updates == 1
+        assert outputfile.read() == expected
+        assert watch.file_stamp(str(tmpdir.join('missing.csv'))) is None
+
+    @pytest.mark.parametrize('column,cell', [(1, '2y'), (0, 'A {lots}')])
+    def test_malformed_cell(self, tmpdir, column, cell):
+        """
+        A malformed cell is reported, the watch goes on.
+        """
+        with open(OMNIPLAN3) as filehandle:
+            rows = list(csv.reader(filehandle))
+        inputfile = tmpdir.join('export.csv')
+        write_rows(str(inputfile), rows)
+        outputfile = tmpdir.join('alloc.csv')
+        watcher = watch.AllocationWatcher(str(inputfile), str(outputfile))
+        watcher.watch(interval=0., max_changes=1)
+        expected = outputfile.read()
+
+        columns = omniplan.resolve_columns(rows[0])
+        rows[1][columns[column]] = cell
+        write_rows(str(inputfile), rows)
+        with pytest.raises(ValueError):
+            watcher.refresh()
+        watcher.watch(interval=0., max_changes=1)
+        assert outputfile.read() == expected
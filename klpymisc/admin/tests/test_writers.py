@@ -0,0 +1,108 @@
+# pytest suite for writers module
+
+"""
+Tests for the writers module.
+
+This is a suite of tests to run with pytest.
+
+To run:
+    1) py.test -v
+"""
+__author__ = 'Kathleen Labrie'
+
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+from klpymisc.admin import omniplan
+from klpymisc.admin import writers
+from klpymisc.admin.alloctable import AllocationTable
+
+# pylint: disable=invalid-name, no-self-use
+
+TESTDATAPATH = os.path.join(os.path.dirname(__file__), '..', 'test')
+
+OMNIPLAN3 = os.path.join(TESTDATAPATH, 'OmniPlan3',
+                         'PIPE-PLAN-115_Plan-DRAGONSSQImagingUsers.csv')
+
+
+@pytest.fixture
+def allocations():
+    return omniplan.calculate_allocation(omniplan.iter_records(OMNIPLAN3))
+
+
+def assert_same_as_table(content, allocations):
+    """
+    The arrays hold the cells of the table, resources sorted.
+    """
+    assert content['granularity'] == 'month'
+    assert content['resources'].tolist() == sorted(allocations)
+    assert content['periods'].astype(date).tolist() == allocations.periods()
+    assert content['hours'].dtype == np.float64
+    assert content['assigned'].dtype == bool
+    for (row, name) in enumerate(content['resources']):
+        expected = allocations.allocation(name)
+        columns = np.flatnonzero(content['assigned'][row])
+        assert dict((content['periods'][column].astype(date),
+                     content['hours'][row, column])
+                    for column in columns) == expected
+
+
+class TestWriters(object):
+    """
+    Suite of tests for the binary writers.
+    """
+
+    def test_output_format(self):
+        """
+        The format comes from the extension unless given.
+        """
+        assert writers.output_format('alloc.npz') == 'npz'
+        assert writers.output_format('alloc.PARQUET') == 'parquet'
+        assert writers.output_format('alloc.txt') == 'csv'
+        assert writers.output_format('alloc.bin', 'raw') == 'raw'
+        with pytest.raises(ValueError):
+            writers.output_format('alloc.csv', 'xls')
+
+    def test_npz(self, allocations, tmpdir):
+        """
+        Round trip through an .npz archive.
+        """
+        outputfile = str(tmpdir.join('alloc.npz'))
+        writers.write(allocations, outputfile)
+        assert_same_as_table(writers.load_npz(outputfile), allocations)
+
+    def test_raw(self, allocations, tmpdir):
+        """
+        The raw arrays are memory-mapped back.
+        """
+        outputfile = str(tmpdir.join('alloc.bin'))
+        writers.write(allocations, outputfile, 'raw')
+        content = writers.load_raw(outputfile)
+        assert isinstance(content['hours'], np.memmap)
+        assert_same_as_table(content, allocations)
+
+    def test_empty(self, tmpdir):
+        """
+        No allocations, empty arrays.
+        """
+        outputfile = str(tmpdir.join('alloc.raw'))
+        writers.write(AllocationTable(), outputfile)
+        assert writers.load_raw(outputfile)['hours'].shape == (0, 0)
+
+    def test_parquet(self, allocations, tmpdir):
+        """
+        One row per filled cell.
+        """
+        parquet = pytest.importorskip('pyarrow.parquet')
+        outputfile = str(tmpdir.join('alloc.parquet'))
+        writers.write(allocations, outputfile)
+        table = parquet.read_table(outputfile).to_pydict()
+        cells = {}
+        for (name, period, hours) in zip(table['resource'], table['period'],
+                                         table['hours']):
+            cells.setdefault(name, {})[period] = hours
+        assert cells == dict((name, allocations.allocation(name))
+                             for name in allocations)
@@ -0,0 +1,260 @@
+"""
+Category x day matrix of a timecard, and its rollups.
+
+The Timecard of the timesheet module is pivoted once into a dense
+category x day matrix of hours, one column per calendar day of the span.
+The weekly, monthly and pay period totals are reductions over runs of
+columns, `numpy.add.reduceat`, without going back to the entries:
+
+    pivot = TimesheetPivot.from_timecard(read_timecard('export.csv'))
+    (weeks, hours) = pivot.rollup('week')
+    write(pivot, 'timesheet.json')
+
+The views are written to CSV, one file per view, or all of them to one
+JSON document or NumPy .npz archive.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import json
+import os
+from datetime import date
+from io import open
+
+import numpy as np
+
+from klpymisc.admin.periods import period_label
+
+VIEWS = ('day', 'week', 'month', 'payperiod')
+
+FORMATS = ('csv', 'json', 'npz')
+
+EXTENSIONS = {'.csv': 'csv',
+              '.json': 'json',
+              '.npz': 'npz'}
+
+# The pay periods are PAY_PERIOD_DAYS long, one of them starting on
+# PAY_PERIOD_ORIGIN.
+PAY_PERIOD_ORIGIN = date(2014, 1, 5)
+PAY_PERIOD_DAYS = 14
+
+# 1970-01-01, day 0 of datetime64[D], is a Thursday.
+_EPOCH_WEEKDAY = 3
+
+
+def period_starts(days, view, pay_period_origin=PAY_PERIOD_ORIGIN,
+                  pay_period_days=PAY_PERIOD_DAYS):
+    """
+    First day of the period each day falls in.
+
+    Parameters
+    ----------
+    days : numpy.ndarray of datetime64[D]
+    view : str
+        One of VIEWS.  Weeks start on Monday.
+    pay_period_origin : datetime.date
+        First day of a pay period.
+    pay_period_days : int
+        Length of the pay periods.
+
+    Returns
+    -------
+    numpy.ndarray of datetime64[D]
+    """
+    if view == 'day':
+        return days
+    if view == 'week':
+        weekday = (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+        return days - weekday.astype('timedelta64[D]')
+    if view == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    if view == 'payperiod':
+        offset = (days - np.datetime64(pay_period_origin, 'D')).astype(
+            np.int64) % pay_period_days
+        return days - offset.astype('timedelta64[D]')
+    raise ValueError('Unknown view: %s' % view)
+
+
+def view_label(day, view):
+    """
+    Column header of a period, eg. '2014-10-20', '2014-W43',
+    'October2014'.  A pay period is labelled with its first day.
+    """
+    if view in ('week', 'month'):
+        return period_label(day, view)
+    return day.isoformat()
+
+
+class TimesheetPivot(object):
+    """
+    Hours of each category on each day of the span.
+
+    Parameters
+    ----------
+    categories : list of str
+        Category of each row.
+    first_day : datetime.date or numpy.datetime64
+        Day of column 0.
+    hours : numpy.ndarray of float
+        The category x day matrix, one column per calendar day.
+
+    Attributes
+    ----------
+    categories : list of str
+    days : numpy.ndarray of datetime64[D]
+        Day of each column.
+    hours : numpy.ndarray of float
+
+    Methods
+    -------
+    rollup(view)
+        Total hours of each category over each day, week, month or pay
+        period.
+    """
+
+    def __init__(self, categories, first_day, hours):
+        self.categories = list(categories)
+        self.hours = np.asarray(hours, dtype=float)
+        self.days = np.datetime64(first_day, 'D') + \
+            np.arange(self.hours.shape[1]).astype('timedelta64[D]')
+
+    @classmethod
+    def from_timecard(cls, timecard):
+        """
+        Pivot of a timesheet.Timecard.
+        """
+        categories = list(timecard)
+        days = [np.array(list(timecard.hours[category]),
+                         dtype='datetime64[D]') for category in categories]
+        if not categories or not sum(len(column) for column in days):
+            return cls(categories, date(1970, 1, 1),
+                       np.zeros((len(categories), 0)))
+        first_day = min(column.min() for column in days if len(column))
+        last_day = max(column.max() for column in days if len(column))
+        hours = np.zeros((len(categories),
+                          int((last_day - first_day).astype(int)) + 1))
+        for (row, category) in enumerate(categories):
+            columns = (days[row] - first_day).astype(np.intp)
+            hours[row, columns] = list(timecard.hours[category].values())
+        return cls(categories, first_day, hours)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def rollup(self, view, pay_period_origin=PAY_PERIOD_ORIGIN,
+               pay_period_days=PAY_PERIOD_DAYS):
+        """
+        Total hours of each category in each period of the view.
+
+        The periods are the runs of consecutive days with the same
+        period_starts(), summed in one reduction.
+
+        Returns
+        -------
+        periods : numpy.ndarray of datetime64[D]
+            First day of each period, the columns.  The first and last
+            periods can start before or end after the span.
+        hours : numpy.ndarray of float
+            The category x period matrix.
+        """
+        starts = period_starts(self.days, view, pay_period_origin,
+                               pay_period_days)
+        if not len(starts):
+            return (starts, self.hours[:, :0])
+        boundaries = np.flatnonzero(np.concatenate(
+            ([True], starts[1:] != starts[:-1])))
+        return (starts[boundaries],
+                np.add.reduceat(self.hours, boundaries, axis=1))
+
+    def rollups(self, views=VIEWS, **kwargs):
+        """
+        The rollup() of each view, keyed on the view.
+        """
+        return dict((view, self.rollup(view, **kwargs)) for view in views)
+
+
+def output_format(outputfile, fmt=None):
+    """
+    The format to write, given explicitly or from the file extension.
+    CSV by default.
+    """
+    if fmt is None:
+        fmt = EXTENSIONS.get(os.path.splitext(outputfile)[1].lower(), 'csv')
+    if fmt not in FORMATS:
+        raise ValueError('Unknown output format: %s' % fmt)
+    return fmt
+
+
+def view_outputfile(outputfile, view):
+    """
+    Name of the CSV output of a view, eg. 'timesheet_week.csv' for
+    outputfile 'timesheet.csv'.
+    """
+    (root, ext) = os.path.splitext(outputfile)
+    return '%s_%s%s' % (root, view, ext or '.csv')
+
+
+def write_csv(categories, rollups, outputfile):
+    """
+    Write each view to its CSV file, one row per category, one column
+    per period.  With one view, to outputfile itself.
+    """
+    for (view, (periods, hours)) in rollups.items():
+        filename = outputfile
+        if len(rollups) > 1:
+            filename = view_outputfile(outputfile, view)
+        header = ['Category'] + [view_label(period, view)
+                                 for period in periods.tolist()]
+        with open(filename, mode='w', encoding='utf-8',
+                  newline='') as filehandle:
+            writer = csv.writer(filehandle)
+            writer.writerow(header)
+            for (category, row) in zip(categories, hours.tolist()):
+                writer.writerow([category] + ['%f' % value for value in row])
+
+
+def write_json(categories, rollups, outputfile):
+    """
+    Write the views to one JSON document:
+    {"categories": [...], "views": {view: {"periods": [...],
+    "hours": [[...], ...]}}}, the periods as ISO dates.
+    """
+    document = {
+        'categories': categories,
+        'views': dict((view, {'periods': [str(period) for period in periods],
+                              'hours': hours.tolist()})
+                      for (view, (periods, hours)) in rollups.items()),
+    }
+    with open(outputfile, mode='w', encoding='utf-8') as filehandle:
+        filehandle.write(json.dumps(document, indent=1))
+
+
+def write_npz(categories, rollups, outputfile):
+    """
+    Write the views to a NumPy .npz archive: 'categories', and
+    '<view>_periods', '<view>_hours' for each view.
+    """
+    arrays = {'categories': np.array(categories, dtype=str)}
+    for (view, (periods, hours)) in rollups.items():
+        arrays['%s_periods' % view] = periods
+        arrays['%s_hours' % view] = hours
+    # np.savez appends .npz to names without it; write to a handle instead.
+    with open(outputfile, mode='wb') as filehandle:
+        np.savez(filehandle, **arrays)
+
+
+def write(pivot, outputfile, views=VIEWS, fmt=None, **kwargs):
+    """
+    Write the rollups of the views in the format given or implied by the
+    file extension.  The keyword arguments go to rollup().
+    """
+    fmt = output_format(outputfile, fmt)
+    WRITERS[fmt](pivot.categories, pivot.rollups(views, **kwargs),
+                 outputfile)
+
+
+WRITERS = {'csv': write_csv,
+           'json': write_json,
+           'npz': write_npz}
@@ -0,0 +1,411 @@
+"""
+Daily hours per category from the CSV exports of the time tracking app.
+
+The export has one row per time entry, eg. 15 minutes, with its tag, its
+start time and its duration.  The rows are streamed once and folded into
+a Timecard, the hours of each category on each day:
+
+    timecard = read_timecard('export.csv')
+    for category in timecard:
+        print(category, timecard.days(category))
+
+The start times, eg. "Oct 20, 2014, 07:45:00 HST", are parsed with a
+fixed layout, the date part looked up once per distinct date.  Other
+formats fall back to dateutil, which is slow to import and to run.
+
+The app keeps appending to the same export.  A TimesheetCheckpoint keeps
+the running totals in a state file, with how far the export was read,
+so that the next run only parses the rows appended since:
+
+    checkpoint = TimesheetCheckpoint('export.state')
+    timecard = checkpoint.update('export.csv')
+    checkpoint.save()
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import os
+from datetime import date
+from functools import lru_cache
+from io import open
+
+# Header of the columns used, stripped.  The app writes ' Tag' and
+# ' Start time'.
+TAG = 'Tag'
+START_TIME = 'Start time'
+DURATION = 'Duration in hours'
+
+# The app writes English month abbreviations, whatever the locale.
+_MONTHS = dict((name, number + 1) for (number, name) in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+     'Nov', 'Dec')))
+
+# A few thousand days cover years of entries.
+DATE_CACHE_SIZE = 4096
+
+CHECKPOINT_VERSION = 1
+
+# Bytes before the checkpoint offset that must be found again for the
+# export to be the one appended to.
+TAIL_SIZE = 256
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_prefix(prefix):
+    """
+    The date of the date part of a start time, eg. 'Oct 20, 2014', or
+    None if it does not have that layout.
+    """
+    try:
+        (month_day, year) = prefix.split(',')
+        (month, day) = month_day.split()
+        return date(int(year), _MONTHS[month], int(day))
+    except (KeyError, ValueError):
+        return None
+
+
+def parse_start_time(timestamp):
+    """
+    Date of a start time.
+
+    'Oct 20, 2014, 07:45:00 HST' is split after the date, the date part
+    parsed once by parse_date_prefix().  Anything else is parsed by
+    dateutil.
+
+    Raises
+    ------
+    ValueError
+        If dateutil cannot parse it either.
+    """
+    timestamp = timestamp.strip()
+    (prefix, separator, _) = timestamp.rpartition(',')
+    if separator:
+        the_date = parse_date_prefix(prefix)
+        if the_date is not None:
+            return the_date
+    # dateutil is slow to import; only needed for unexpected formats.
+    from dateutil import parser as dateparser
+    return dateparser.parse(timestamp).date()
+
+
+def resolve_columns(header):
+    """
+    Index of the tag, start time and duration columns of the header.
+
+    Raises
+    ------
+    ValueError
+        If a column is missing.
+    """
+    names = [name.strip() for name in header]
+    try:
+        return tuple(names.index(name) for name in (TAG, START_TIME,
+                                                    DURATION))
+    except ValueError:
+        raise ValueError('Unrecognized header, not a time tracking export: '
+                         '%s' % ','.join(header))
+
+
+def iter_entries(inputfile):
+    """
+    Stream the category, date and hours of each row of an export.
+
+    Raises
+    ------
+    ValueError
+        If the header is not recognized or a row cannot be parsed.
+    """
+    with open(inputfile, encoding='utf-8', newline='') as filehandle:
+        reader = csv.reader(filehandle)
+        try:
+            columns = resolve_columns(next(reader))
+        except StopIteration:
+            return
+        for entry in _iter_rows(reader, columns, inputfile):
+            yield entry
+
+
+def _iter_rows(reader, columns, inputfile, skipped_lines=0):
+    # The entries of the rows of a csv.reader, the errors reported with
+    # the line number in the file.
+    (tag, start_time, duration) = columns
+    for row in reader:
+        if not row:
+            continue
+        try:
+            yield (row[tag], parse_start_time(row[start_time]),
+                   float(row[duration]))
+        except (IndexError, ValueError, OverflowError) as err:
+            raise ValueError('File %s, line %d: %s' %
+                             (inputfile, skipped_lines + reader.line_num,
+                              err))
+
+
+def read_timecard(inputfile, timecard=None):
+    """
+    Fold the entries of an export into a Timecard, in one pass.
+    """
+    if timecard is None:
+        timecard = Timecard()
+    timecard.add_entries(iter_entries(inputfile))
+    return timecard
+
+
+class Timecard(object):
+    """
+    Hours of each category on each day.
+
+    Attributes
+    ----------
+    hours : dict
+        {category: {datetime.date: hours}}, the categories in order of
+        appearance.
+
+    Methods
+    -------
+    add(category, day, hours)
+        Add hours to a category on a day.
+    add_entries(entries)
+        Add a stream of (category, day, hours).
+    days(category)
+        The days of a category and their hours, in order.
+
+    Notes
+    -----
+    Iterating over the timecard, or `in`, works on the categories.
+    """
+
+    def __init__(self):
+        self.hours = {}
+
+    def __len__(self):
+        return len(self.hours)
+
+    def __iter__(self):
+        return iter(self.hours)
+
+    def __contains__(self, category):
+        return category in self.hours
+
+    def add(self, category, day, hours):
+        """
+        Add hours to a category on a day.
+        """
+        try:
+            days = self.hours[category]
+        except KeyError:
+            days = self.hours[category] = {}
+        days[day] = days.get(day, 0.) + hours
+
+    def add_entries(self, entries):
+        """
+        Add a stream of (category, day, hours).
+        """
+        add = self.add
+        for (category, day, hours) in entries:
+            add(category, day, hours)
+
+    def days(self, category):
+        """
+        The (day, hours) of a category, in order of the days.
+        """
+        return sorted(self.hours[category].items())
+
+
+def _fingerprint(data):
+    # hashlib and json are only needed with a checkpoint, not to start.
+    import hashlib
+    return hashlib.sha1(data).hexdigest()
+
+
+class TimesheetCheckpoint(object):
+    """
+    Running totals of an export that is only ever appended to.
+
+    Parameters
+    ----------
+    filename : str or None
+        State file.  Loaded if it exists.  None keeps the state in memory
+        only.
+
+    Attributes
+    ----------
+    timecard : Timecard
+        The totals of the rows read so far.
+    offset : int
+        Byte offset in the export of the first row not read.
+    lines : int
+        Number of lines read, the header included.
+    header : str
+        Fingerprint of the header line.
+    tail : str
+        Fingerprint of the TAIL_SIZE bytes before offset.
+    restarted : bool
+        Whether the last update read the export from the start.
+    entries : int
+        Number of entries read by the last update.
+
+    Methods
+    -------
+    update(inputfile)
+        Add the rows appended since the last update.
+    save()
+        Write the state to disk.
+    reset()
+        Forget the totals, to read the export from the start.
+
+    Notes
+    -----
+    The export is read from the start again if it is smaller than what
+    was read, if its header changed, or if the bytes just before the
+    offset are not the ones read, ie. it was rewritten rather than
+    appended to.  A last line without its end of line may still be being
+    written; it is left for the next update.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.timecard = Timecard()
+        self.offset = 0
+        self.lines = 0
+        self.header = None
+        self.tail = None
+        self.restarted = False
+        self.entries = 0
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        """
+        Read the state from disk.  An unreadable state is ignored.
+        """
+        import json
+        try:
+            with open(self.filename, encoding='utf-8') as filehandle:
+                content = json.load(filehandle)
+        except ValueError:
+            return
+        if content.get('version') != CHECKPOINT_VERSION:
+            return
+        self.offset = content['offset']
+        self.lines = content['lines']
+        self.header = content['header']
+        self.tail = content['tail']
+        self.timecard = Timecard()
+        for (category, days) in content['totals'].items():
+            self.timecard.hours[category] = dict(
+                (date.fromordinal(day), hours) for (day, hours) in days)
+
+    def save(self):
+        """
+        Write the state to disk.
+        """
+        import json
+        # The days as ordinals, quicker to read back than ISO dates.
+        totals = dict((category, [(day.toordinal(), hours)
+                                  for (day, hours) in days.items()])
+                      for (category, days) in self.timecard.hours.items())
+        content = {'version': CHECKPOINT_VERSION,
+                   'offset': self.offset,
+                   'lines': self.lines,
+                   'header': self.header,
+                   'tail': self.tail,
+                   'totals': totals}
+        with open(self.filename, mode='w', encoding='utf-8') as filehandle:
+            filehandle.write(json.dumps(content))
+
+    def reset(self):
+        """
+        Forget the totals and the position in the export.
+        """
+        self.timecard = Timecard()
+        self.offset = 0
+        self.lines = 0
+        self.header = None
+        self.tail = None
+
+    def _appended_to(self, filehandle, header):
+        # Whether the export is the one read so far, with rows appended.
+        if self.header is None or _fingerprint(header) != self.header:
+            return False
+        filehandle.seek(0, os.SEEK_END)
+        if filehandle.tell() < self.offset:
+            return False
+        start = max(self.offset - TAIL_SIZE, 0)
+        filehandle.seek(start)
+        return _fingerprint(filehandle.read(self.offset - start)) == \
+            self.tail
+
+    def update(self, inputfile):
+        """
+        Add the rows appended to the export since the last update, or
+        read it all if it was not appended to.
+
+        Returns
+        -------
+        Timecard
+            The totals, up to date.
+
+        Raises
+        ------
+        ValueError
+            If the header is not recognized or a row cannot be parsed.
+            The rows before it are added.
+        """
+        self.entries = 0
+        with open(inputfile, mode='rb') as filehandle:
+            header = filehandle.readline()
+            self.restarted = not self._appended_to(filehandle, header)
+            if self.restarted:
+                self.reset()
+                if not header.endswith(b'\n'):
+                    # Empty, or the header is still being written.
+                    return self.timecard
+                self.header = _fingerprint(header)
+                self.offset = len(header)
+                self.lines = 1
+            columns = resolve_columns(next(csv.reader(
+                [header.decode('utf-8')])))
+
+            # The reader pulls the lines one at a time: once it returns a
+            # row, the bytes read are those up to the end of that row,
+            # unless it ran out of complete lines, in which case the row
+            # may be incomplete.
+            filehandle.seek(self.offset)
+            position = {'offset': self.offset, 'lines': 0, 'end': False}
+
+            def complete_lines():
+                for line in filehandle:
+                    if not line.endswith(b'\n'):
+                        break
+                    position['offset'] += len(line)
+                    position['lines'] += 1
+                    yield line.decode('utf-8')
+                position['end'] = True
+
+            reader = csv.reader(complete_lines())
+            rows = _iter_rows(reader, columns, inputfile, self.lines)
+            add = self.timecard.add
+            while True:
+                try:
+                    (category, day, hours) = next(rows)
+                except StopIteration:
+                    break
+                except ValueError:
+                    if position['end']:
+                        break
+                    raise
+                if position['end']:
+                    break
+                add(category, day, hours)
+                self.entries += 1
+                self.offset = position['offset']
+                self.lines += position['lines']
+                position['lines'] = 0
+
+            start = max(self.offset - TAIL_SIZE, 0)
+            filehandle.seek(start)
+            self.tail = _fingerprint(filehandle.read(self.offset - start))
+        return self.timecard
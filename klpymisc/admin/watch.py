@@ -0,0 +1,211 @@
+"""
+Keep the allocations of an export up to date as it is re-exported.
+
+The AllocationWatcher keeps the parsed tasks and their contributions in
+memory.  The export is polled; when it changes, its rows are read again,
+the rows already seen are not parsed again, only the new or edited tasks
+are allocated, through a `taskcache.ContributionCache`, and the output
+is rewritten only if the allocations changed.
+
+The file is polled with os.stat rather than watched with inotify, which
+is not in the standard library and not available on every platform.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import csv
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from io import open
+
+from klpymisc.admin import omniplan
+from klpymisc.admin.taskcache import ContributionCache, task_key
+from klpymisc.swdevel.timer import Timer
+
+# Seconds between two looks at the export.
+POLL_INTERVAL = 1.
+
+# What reading an export can raise, eg. while it is being written, or if
+# a cell is malformed.
+READ_ERRORS = (ValueError, csv.Error, IndexError, StopIteration, OSError)
+
+
+def file_stamp(filename):
+    """
+    What changes when a file is rewritten or replaced, None if the file
+    is missing.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class AllocationWatcher(object):
+    """
+    Allocations of one export, kept hot in memory.
+
+    Parameters
+    ----------
+    inputfile : str
+        CSV export or OmniPlan document.
+    outputfile : str or None
+        Where the allocations are written.  None to only keep them in
+        memory.
+    writer : callable, optional
+        writer(allocations, outputfile).  Default is
+        `omniplan.write_allocations`.
+    cachefile : str, optional
+        Contribution cache file, read at start and saved after each
+        update.  Default is to keep the cache in memory only.
+    verbose : bool
+        Log each update and its latency.
+
+    Attributes
+    ----------
+    cache : ContributionCache
+        The contribution of each task and the totals.
+    rows : dict
+        (TaskRecord, task key) of each row seen in the last read, keyed
+        on the cells of the row the allocation depends on.
+    allocations : AllocationTable
+        The allocations of the last update, None before the first.
+    updates : int
+        Number of updates done.
+
+    Methods
+    -------
+    refresh()
+        Read the export and update the output if needed.
+    watch(interval, max_changes)
+        Poll the export and refresh on every change.
+    """
+
+    def __init__(self, inputfile, outputfile, writer=None, cachefile=None,
+                 verbose=False):
+        self.inputfile = inputfile
+        self.outputfile = outputfile
+        self.writer = writer or omniplan.write_allocations
+        self.cachefile = cachefile
+        self.verbose = verbose
+        self.cache = ContributionCache(cachefile)
+        self.rows = {}
+        self.allocations = None
+        self.updates = 0
+
+    def read_counts(self):
+        """
+        Count the active tasks of the export by task key.
+
+        Returns
+        -------
+        counts : Counter
+            Number of identical active tasks of each key.
+        records : dict
+            TaskRecord of each key.
+        """
+        from klpymisc.admin import oplx
+        if oplx.is_document(self.inputfile):
+            # No rows to compare, the document is scheduled again.
+            entries = [(record, task_key(record))
+                       for record in omniplan.iter_export(self.inputfile)]
+        else:
+            entries = self._read_rows()
+        counts = Counter()
+        records = {}
+        for (record, key) in entries:
+            if key is None:
+                continue
+            counts[key] += 1
+            records[key] = record
+        return (counts, records)
+
+    def _read_rows(self):
+        # The rows unchanged since the last read are neither parsed nor
+        # hashed again.  Inactive tasks are remembered with a None key.
+        entries = []
+        rows = {}
+        with open(self.inputfile, encoding='utf-8') as filehandle:
+            reader = csv.reader(filehandle)
+            columns = omniplan.resolve_columns(next(reader))
+            for row in reader:
+                cells = tuple(row[index] for index in columns)
+                entry = rows.get(cells) or self.rows.get(cells)
+                if entry is None:
+                    record = omniplan.TaskRecord.from_row(row, columns)
+                    active = list(omniplan.active_records([record]))
+                    entry = (record, task_key(record) if active else None)
+                rows[cells] = entry
+                entries.append(entry)
+        self.rows = rows
+        return entries
+
+    def refresh(self):
+        """
+        Read the export, and rewrite the output if the allocations
+        changed, or if it was never written.
+
+        Returns
+        -------
+        bool
+            Whether the output was written.
+
+        Raises
+        ------
+        ValueError, csv.Error, IndexError, StopIteration, OSError
+            READ_ERRORS, if the export cannot be read, eg. while it is
+            being written.  The allocations are left as they were.
+        """
+        with Timer() as timer:
+            (counts, records) = self.read_counts()
+            self.cache.update_counts(counts, records)
+            changed = bool(self.cache.added or self.cache.removed or
+                           not self.updates)
+            if changed:
+                self.allocations = self.cache.allocations()
+                if self.outputfile is not None:
+                    self.writer(self.allocations, self.outputfile)
+                if self.cachefile is not None:
+                    self.cache.save()
+        self.updates += 1
+        if self.verbose:
+            print('%s %s: %d tasks recomputed, %d removed, %s in %.1f ms' %
+                  (datetime.now().strftime('%H:%M:%S'), self.inputfile,
+                   self.cache.added, self.cache.removed,
+                   'output written' if changed else 'output unchanged',
+                   1000. * timer.secs))
+        return changed
+
+    def watch(self, interval=POLL_INTERVAL, max_changes=None):
+        """
+        Refresh now, then every time the export changes.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between two looks at the export.
+        max_changes : int, optional
+            Stop after that many changes of the export, the first read
+            included.  Default is to run until interrupted.
+        """
+        stamp = None
+        changes = 0
+        while True:
+            current = file_stamp(self.inputfile)
+            if current is not None and current != stamp:
+                stamp = current
+                changes += 1
+                try:
+                    self.refresh()
+                except READ_ERRORS as err:
+                    # Most likely caught while being exported; the end of
+                    # the export is another change.  Keep the allocations
+                    # of the last good read.
+                    print('Cannot read %s: %s' % (self.inputfile, err))
+                if max_changes is not None and changes >= max_changes:
+                    return
+            time.sleep(interval)
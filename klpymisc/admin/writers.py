@@ -0,0 +1,225 @@
+"""
+Columnar binary outputs of the allocations.
+
+Besides the CSV of `omniplan.write_allocations`, the AllocationTable can
+be written as:
+
+npz
+    NumPy archive with the typed axes and the matrices.
+raw
+    The matrices as raw C-order arrays in one file, with a JSON sidecar
+    describing them, so that they can be memory-mapped.
+parquet
+    Long table of (resource, period, hours), when pyarrow is installed.
+
+In all of them the resources are strings, sorted, the periods are the
+first day of each period as datetime64[D], and the hours a float64
+resources x periods matrix.  The assigned matrix flags the cells a task
+contributed to, the ones written '%f' rather than '0.' in the CSV.
+"""
+from __future__ import print_function
+
+__author__ = 'Kathleen Labrie'
+
+import json
+import os
+from io import open
+
+import numpy as np
+
+from klpymisc.admin import omniplan
+
+RAW_FORMAT = 'klpymisc-allocation-raw'
+RAW_VERSION = 1
+
+FORMATS = ('csv', 'npz', 'raw', 'parquet')
+
+EXTENSIONS = {'.csv': 'csv',
+              '.npz': 'npz',
+              '.raw': 'raw',
+              '.parquet': 'parquet'}
+
+
+def output_format(outputfile, fmt=None):
+    """
+    The format to write, given explicitly or from the file extension.
+    CSV by default.
+    """
+    if fmt is None:
+        fmt = EXTENSIONS.get(os.path.splitext(outputfile)[1].lower(), 'csv')
+    if fmt not in FORMATS:
+        raise ValueError('Unknown output format: %s' % fmt)
+    return fmt
+
+
+def allocation_arrays(allocations):
+    """
+    The AllocationTable as typed arrays, resources sorted by name.
+
+    Returns
+    -------
+    resources : numpy.ndarray of str
+    periods : numpy.ndarray of datetime64[D]
+    hours : numpy.ndarray of float64, resources x periods
+    assigned : numpy.ndarray of bool, resources x periods
+    """
+    periods = np.array(allocations.periods(), dtype='datetime64[D]')
+    names = sorted(allocations)
+    resources = np.array(names, dtype=str)
+    if not len(periods):
+        return (resources, periods,
+                np.zeros((len(names), 0)), np.zeros((len(names), 0), bool))
+    # The table rows are in insertion order, with spare columns on
+    # both sides of the span.
+    shape = (len(allocations.resources), allocations.ncolumns)
+    first = allocations.first - allocations.origin
+    columns = slice(first, first + len(periods))
+    rows = [allocations.resource_ids[name] for name in names]
+    hours = np.frombuffer(allocations.hours, dtype=np.float64)
+    assigned = np.frombuffer(allocations.assigned, dtype=np.int8)
+    return (resources, periods,
+            hours.reshape(shape)[rows, columns],
+            assigned.reshape(shape)[rows, columns].astype(bool))
+
+
+def write_npz(allocations, outputfile):
+    """
+    Write the allocations to a NumPy .npz archive.
+    """
+    (resources, periods, hours, assigned) = allocation_arrays(allocations)
+    # np.savez appends .npz to names without it; write to a handle instead.
+    with open(outputfile, mode='wb') as filehandle:
+        np.savez(filehandle, resources=resources, periods=periods,
+                 hours=hours, assigned=assigned,
+                 granularity=np.array(allocations.granularity))
+
+
+def load_npz(inputfile):
+    """
+    Read an .npz written by write_npz.
+
+    Returns
+    -------
+    dict
+        'resources', 'periods', 'hours', 'assigned' arrays and the
+        'granularity' string.
+    """
+    with np.load(inputfile) as archive:
+        content = dict((key, archive[key]) for key in archive.files)
+    content['granularity'] = str(content['granularity'])
+    return content
+
+
+def sidecar_file(outputfile):
+    """
+    JSON file describing a raw output.
+    """
+    return outputfile + '.json'
+
+
+def write_raw(allocations, outputfile):
+    """
+    Write the matrices as raw arrays, and a JSON sidecar with the axes,
+    dtypes and offsets needed to memory-map them.
+    """
+    (resources, periods, hours, assigned) = allocation_arrays(allocations)
+    hours = np.ascontiguousarray(hours, dtype='<f8')
+    assigned = np.ascontiguousarray(assigned, dtype='|b1')
+    with open(outputfile, mode='wb') as filehandle:
+        filehandle.write(hours.tobytes())
+        filehandle.write(assigned.tobytes())
+    description = {
+        'format': RAW_FORMAT,
+        'version': RAW_VERSION,
+        'granularity': allocations.granularity,
+        'shape': list(hours.shape),
+        'order': 'C',
+        'hours': {'dtype': hours.dtype.str, 'offset': 0},
+        'assigned': {'dtype': assigned.dtype.str, 'offset': hours.nbytes},
+        'resources': resources.tolist(),
+        'periods': [str(period) for period in periods],
+    }
+    with open(sidecar_file(outputfile), mode='w',
+              encoding='utf-8') as filehandle:
+        filehandle.write(json.dumps(description, indent=1))
+
+
+def load_raw(inputfile, mode='r'):
+    """
+    Memory-map a raw output written by write_raw.
+
+    Parameters
+    ----------
+    inputfile : str
+        The raw file; its sidecar is found next to it.
+    mode : str
+        numpy.memmap mode, read-only by default.
+
+    Returns
+    -------
+    dict
+        Same keys as load_npz; 'hours' and 'assigned' are memory maps.
+    """
+    with open(sidecar_file(inputfile), encoding='utf-8') as filehandle:
+        description = json.load(filehandle)
+    if description.get('format') != RAW_FORMAT or \
+            description.get('version') != RAW_VERSION:
+        raise ValueError('Not a raw allocation output: %s' % inputfile)
+    shape = tuple(description['shape'])
+    content = {
+        'granularity': description['granularity'],
+        'resources': np.array(description['resources'], dtype=str),
+        'periods': np.array(description['periods'], dtype='datetime64[D]'),
+    }
+    for key in ('hours', 'assigned'):
+        if 0 in shape:
+            content[key] = np.zeros(shape, dtype=description[key]['dtype'])
+            continue
+        content[key] = np.memmap(inputfile, mode=mode,
+                                 dtype=description[key]['dtype'],
+                                 offset=description[key]['offset'],
+                                 shape=shape, order=description['order'])
+    return content
+
+
+def write_parquet(allocations, outputfile):
+    """
+    Write the filled cells as a (resource, period, hours) Parquet table.
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet output requires pyarrow')
+    (resources, periods, hours, assigned) = allocation_arrays(allocations)
+    (rows, columns) = np.nonzero(assigned)
+    table = pyarrow.table({
+        'resource': pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(rows.astype(np.int32)),
+            pyarrow.array(resources.tolist(), type=pyarrow.string())),
+        'period': pyarrow.array(periods[columns], type=pyarrow.date32()),
+        'hours': pyarrow.array(hours[rows, columns], type=pyarrow.float64()),
+    })
+    table = table.replace_schema_metadata(
+        {'granularity': allocations.granularity})
+    pyarrow.parquet.write_table(table, outputfile)
+
+
+def write(allocations, outputfile, fmt=None):
+    """
+    Write the allocations in the format given or implied by the file
+    extension.
+    """
+    fmt = output_format(outputfile, fmt)
+    WRITERS[fmt](allocations, outputfile)
+
+
+WRITERS = {'csv': omniplan.write_allocations,
+           'npz': write_npz,
+           'raw': write_raw,
+           'parquet': write_parquet}
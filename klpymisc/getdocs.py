@@ -22,8 +22,6 @@ will copy the documentation to /your/preferred/path/klpymisc.
 
 """
 
-from pkg_resources import Requirement, resource_filename
-import shutil
 import os
 import sys
 import argparse
@@ -54,6 +52,29 @@ def parse_args(command_line_args):
 
     return args
 
+def docs_directory():
+    """
+    Where the documentation of the installed distribution is.
+
+    Returns
+    -------
+    str
+        The 'share/klpymisc' directory of the distribution, or of the
+        Python prefix.
+    """
+    # importlib.metadata rather than pkg_resources, which scans every
+    # installed distribution on import.
+    from importlib import metadata
+
+    relative = os.path.join('share', 'klpymisc')
+    try:
+        dirname = str(metadata.distribution('klpymisc').locate_file(relative))
+    except metadata.PackageNotFoundError:
+        dirname = None
+    if dirname is None or not os.path.isdir(dirname):
+        dirname = os.path.join(sys.prefix, relative)
+    return dirname
+
 def move_docs(destination):
     """
     Copy the documentation to a new destination
@@ -65,8 +86,9 @@ def move_docs(destination):
         copied to 'destination/share/klpymisc'
     """
 
-    dirname = resource_filename(Requirement.parse('klpymisc'),
-                            os.path.join('share', 'klpymisc'))
+    import shutil
+
+    dirname = docs_directory()
     sub_destination = os.path.join(destination, 'klpymisc')
 
     if os.path.isdir(os.path.join(sub_destination)):
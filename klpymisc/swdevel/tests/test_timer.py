@@ -11,6 +11,7 @@ To run:
 __author__ = 'Kathleen Labrie'
 
 import os
+import time
 from klpymisc.swdevel import timer
 from io import open
 
@@ -65,6 +66,37 @@ class TestTimer(object):
         t.__exit__(exception_type, exception_value, traceback)
         assert type(t.secs) == float
 
+    def test_counters(self):
+        """
+        Test the nanosecond counters and the secs, start and end they
+        agree with.
+        """
+        with timer.Timer() as t:
+            time.sleep(0.01)
+        assert all(isinstance(ns, int)
+                   for ns in (t.wall_ns, t.cpu_ns, t.thread_ns))
+        assert t.secs == t.wall_ns / 1e9
+        assert t.secs >= 0.01
+        assert t.end - t.start >= 0.
+        assert t.cpu_secs == t.cpu_ns / 1e9
+        assert t.thread_secs == t.thread_ns / 1e9
+
+    def test_ratios(self):
+        """
+        Test that a block waiting has a low CPU ratio, a busy one a high
+        one.
+        """
+        assert timer.Timer().cpu_ratio is None
+        with timer.Timer() as idle:
+            time.sleep(0.05)
+        assert idle.cpu_ratio < 0.5
+        with timer.Timer() as busy:
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+        assert busy.thread_ratio > 0.3
+        assert busy.cpu_ratio > idle.cpu_ratio
+
     def test_writelog(self):
         """
         Test the basic functionality of Timer.writelog.
@@ -89,3 +121,19 @@ class TestTimer(object):
         logstr = line.split()
         tsec = logstr.pop(4)
         assert (logstr == expected_logstr) and (float(tsec) < expected_maxtime)
+
+    def test_writelog_cpu(self, tmpdir):
+        """
+        Test the CPU line of Timer.writelog.
+        """
+        logname = str(tmpdir.join('test.log'))
+        with timer.Timer() as t:
+            time.sleep(0.01)
+        t.writelog('TEST', logname, cpu=True)
+        with open(logname, mode='r', encoding='utf-8') as fhdl:
+            lines = fhdl.readlines()
+        assert lines[0].split()[:4] == ['Elapse', 'time', 'for', 'TEST:']
+        logstr = lines[1].split()
+        assert logstr[:4] == ['CPU', 'time', 'for', 'TEST:']
+        assert float(logstr[4]) == t.cpu_secs
+        assert float(logstr[-1]) == t.cpu_ratio
@@ -15,6 +15,13 @@ class Timer(object):
     The Timer wraps the code to be timed.  The timer starts when Timer
     is initiazed and ends when the block is exited.
 
+    The elapsed time is measured on the monotonic, high resolution
+    performance counter, not on the wall clock, which can be coarse and
+    can jump when the clock is adjusted.  The CPU time of the process and
+    of the thread are measured too: a block whose CPU time is close to
+    its elapsed time is CPU-bound, one whose CPU time is much shorter is
+    waiting, on I/O for example.
+
     Parameters
     ----------
     verbose : boolean
@@ -25,13 +32,31 @@ class Timer(object):
     secs : float
         Number of seconds from entering to exiting.
     start : float
-        Time in second when Timer was launched.
+        Time in second when Timer was launched, since the epoch.
     end : float
-        Time in second when Timer was stopped.
+        Time in second when Timer was stopped, since the epoch.
+    wall_ns : int
+        Nanoseconds from entering to exiting, from time.perf_counter_ns.
+    cpu_ns : int
+        CPU nanoseconds of the process, all threads, system and user,
+        from time.process_time_ns.
+    thread_ns : int
+        CPU nanoseconds of the thread that ran the block, from
+        time.thread_time_ns.
+    cpu_secs : float
+        cpu_ns in seconds.
+    thread_secs : float
+        thread_ns in seconds.
+    cpu_ratio : float
+        cpu_ns / wall_ns.  About 1 for a CPU-bound block, close to 0 for
+        a block waiting on I/O, more than 1 with several threads busy.
+        None if no time elapsed.
+    thread_ratio : float
+        thread_ns / wall_ns, None if no time elapsed.
 
     Methods
     -------
-    writelogs(name, logname)
+    writelogs(name, logname, cpu)
         Write the results to a logfile on disk.  'name' simply identifies the
         block being times, to keep track of what's what.  'logname' is the
         name of the file to write to.
@@ -60,18 +85,61 @@ class Timer(object):
         self.start = None
         self.end = None
         self.secs = None
+        self.wall_ns = None
+        self.cpu_ns = None
+        self.thread_ns = None
+        self._counters = None
 
     def __enter__(self):
         self.start = time.time()
+        self._counters = (time.perf_counter_ns(), time.process_time_ns(),
+                          time.thread_time_ns())
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
+        counters = (time.perf_counter_ns(), time.process_time_ns(),
+                    time.thread_time_ns())
         self.end = time.time()
-        self.secs = self.end - self.start
+        (self.wall_ns, self.cpu_ns, self.thread_ns) = \
+            [stop - start for (start, stop) in zip(self._counters, counters)]
+        self.secs = self.wall_ns / 1e9
         if self.verbose:
-            print("elapse time: %f seconds" % self.secs)
+            print("elapse time: %f seconds, cpu time: %f seconds" %
+                  (self.secs, self.cpu_secs))
+
+    @property
+    def cpu_secs(self):
+        """
+        CPU seconds of the process.
+        """
+        return None if self.cpu_ns is None else self.cpu_ns / 1e9
+
+    @property
+    def thread_secs(self):
+        """
+        CPU seconds of the thread.
+        """
+        return None if self.thread_ns is None else self.thread_ns / 1e9
 
-    def writelog(self, name, logname):
+    @property
+    def cpu_ratio(self):
+        """
+        CPU time of the process over elapsed time.
+        """
+        if not self.wall_ns:
+            return None
+        return self.cpu_ns / self.wall_ns
+
+    @property
+    def thread_ratio(self):
+        """
+        CPU time of the thread over elapsed time.
+        """
+        if not self.wall_ns:
+            return None
+        return self.thread_ns / self.wall_ns
+
+    def writelog(self, name, logname, cpu=False):
         """
         Write the results to a logfile on disk.
 
@@ -81,6 +149,9 @@ class Timer(object):
             Identifies the block being times, to keep track of what's what.
         logname : string
             Name of the file to write the results to.
+        cpu : boolean
+            Also write the CPU time and the CPU-to-elapsed ratio, on a
+            second line.  Default False.
 
         Returns
         -------
@@ -95,5 +166,7 @@ class Timer(object):
         fhdl.write(u"Elapse time for {}: {} secs\n".format(name, self.secs))
         #fhdl.write("Elapse time for " + name + ": " + str(self.secs) +
         #           " secs\n")
+        if cpu:
+            fhdl.write(u"CPU time for {}: {} secs, ratio {}\n".format(
+                name, self.cpu_secs, self.cpu_ratio))
         fhdl.close()
-
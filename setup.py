@@ -39,7 +39,12 @@ setup(
                     'License :: OSI Approved :: ISC License (ISCL)',
                     'Operating System :: Mac OS :: MacOS X',
                     'Operating System :: POSIX :: Linux',
-                    'Programming Language :: Python :: 2.7',
+                    'Programming Language :: Python :: 3',
+                    'Programming Language :: Python :: 3 :: Only',
+                    'Programming Language :: Python :: 3.9',
+                    'Programming Language :: Python :: 3.10',
+                    'Programming Language :: Python :: 3.11',
+                    'Programming Language :: Python :: 3.12',
                     'Topic :: Scientific/Engineering :: Astronomy'
                     ],
       
@@ -47,6 +52,8 @@ setup(
       
       packages = find_packages(exclude=['docs']),
       
+      python_requires = '>=3.9',
+      
       #install_requires = ['']
       #extras_require = {
       #  'dev': [''],
@@ -60,6 +67,7 @@ setup(
       
       scripts = [
                  'klpymisc/admin/scripts/omniplan2alloc.py',
+                 'klpymisc/admin/scripts/allocserver.py',
                  'klpymisc/admin/scripts/towebtimesheet.py'
                  ],
       